@@ -0,0 +1,16 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
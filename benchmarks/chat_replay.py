@@ -0,0 +1,188 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Chat throughput and latency benchmark for Snookey3.
+
+Replays synthetic or recorded chat frames through Chat, ChatModel and ChatView, exactly as a live
+broadcast would feed them, on the Qt offscreen platform. Usage:
+
+    python -m benchmarks.chat_replay [--rate N] [--duration S] [--size N] [--burstiness CV]
+                                     [--speed X] [--recording PATH | --archive ID] [--filters PATH]
+                                     [--json]
+
+Reports the sustained message rate, how long comments waited before reaching the model (GUI latency),
+how late the GUI event loop ran its timers (GUI stalls) and how much the process grew. With --filters,
+comments go through the given filter rules and the cost of each filter stage is reported too.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+from time import monotonic
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+
+# How often the event loop lag is sampled, in milliseconds.
+PROBE_INTERVAL = 10
+
+
+def _rss() -> int:
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+def _percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+    summary = {'p50': values[len(values) // 2],
+               'p95': values[min(int(len(values) * 0.95), len(values) - 1)],
+               'p99': values[min(int(len(values) * 0.99), len(values) - 1)],
+               'max': values[-1],
+               'mean': statistics.mean(values)}
+    return {key: round(value * 1000, 2) for key, value in summary.items()}
+
+
+def _frames(args):
+    from snookey3.core import replay
+
+    if args.recording:
+        return replay.recorded_frames(args.recording)
+    if args.archive:
+        return replay.archived_frames(args.archive)
+    return replay.synthetic_frames(args.rate, args.duration, args.size, args.burstiness, seed=args.seed)
+
+
+def run(args) -> dict:
+    qapp = QApplication.instance() or QApplication(sys.argv)
+
+    from snookey3.gui.chat import Chat, ChatModel, ChatView
+
+    filters = None
+    if args.filters:
+        from snookey3.core.filters import FilterEngine, RuleFile
+        filters = FilterEngine(RuleFile(args.filters))
+
+    chat = Chat(filters=filters)
+    model = ChatModel(args.history)
+    view = ChatView(model)
+    view.resize(400, 600)
+    view.show()
+
+    latencies = []
+    lags = []
+    rss_samples = []
+
+    def on_comments_received(comments):
+        model.append_messages(comments)
+        now = monotonic()
+        latencies.extend(now - comment.received for comment in comments)
+
+    chat.comments_received.connect(on_comments_received)
+
+    last_probe = [monotonic()]
+
+    def probe():
+        now = monotonic()
+        lags.append(max(now - last_probe[0] - PROBE_INTERVAL / 1000, 0))
+        last_probe[0] = now
+        if len(lags) % 100 == 0:
+            rss_samples.append(_rss())
+
+    probe_timer = QTimer()
+    probe_timer.setInterval(PROBE_INTERVAL)
+    probe_timer.timeout.connect(probe)
+
+    timings = {}
+
+    def finish():
+        chat.deliver()
+        qapp.processEvents()
+        timings['finished'] = monotonic()
+        probe_timer.stop()
+        qapp.quit()
+
+    rss_before = _rss()
+    timings['started'] = monotonic()
+    worker = chat.replay(_frames(args), args.speed)
+    # Whatever is still queued is handed over by the next batch; give it time to arrive.
+    worker.finished.connect(lambda: QTimer.singleShot(200, finish))
+    probe_timer.start()
+    qapp.exec()
+    rss_after = _rss()
+
+    stats = chat.stats()
+    chat.stop()
+    view.close()
+
+    elapsed = timings['finished'] - timings['started']
+    results = {'delivered': stats['delivered'],
+               'dropped': stats['dropped'],
+               'batches': stats['batches'],
+               'elapsed_s': round(elapsed, 2),
+               'messages_per_s': round(stats['delivered'] / elapsed, 1) if elapsed else 0,
+               'gui_latency_ms': _percentiles(latencies),
+               'gui_stall_ms': _percentiles(lags),
+               'rss_before_mb': round(rss_before / 2 ** 20, 1),
+               'rss_after_mb': round(rss_after / 2 ** 20, 1),
+               'rss_peak_mb': round(max(rss_samples + [rss_after]) / 2 ** 20, 1),
+               'rss_growth_mb': round((rss_after - rss_before) / 2 ** 20, 1)}
+    if filters is not None:
+        results['filtered'] = stats['filtered']
+        for stage, stage_stats in stats['filters']['stages'].items():
+            results[f'{stage}_us'] = {'mean': stage_stats['mean_us'], 'max': stage_stats['max_us']}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure Snookey3 chat throughput, GUI latency and memory.')
+    parser.add_argument('--rate', type=float, default=200, help='synthetic comments per second')
+    parser.add_argument('--duration', type=float, default=30, help='synthetic replay length in seconds')
+    parser.add_argument('--size', type=int, default=40, help='average synthetic comment length')
+    parser.add_argument('--burstiness', type=float, default=1.0,
+                        help='coefficient of variation of the gaps between comments; 0 is even, 1 is Poisson')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed multiplier; 0 replays unthrottled')
+    parser.add_argument('--history', type=int, default=2000, help='rows kept by the chat model')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--recording', help='replay a recording of raw frames (JSON lines with t and frame)')
+    source.add_argument('--archive', help='replay the chat archive of a broadcast id')
+    parser.add_argument('--filters', help='apply the chat filter rules in this file (see snookey3.core.filters)')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    results = run(args)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for key, value in results.items():
+        if isinstance(value, dict):
+            print(f'{key:<16} ' + '   '.join(f'{name} {number:.2f}' for name, number in value.items()))
+        else:
+            print(f'{key:<16} {value}')
+
+
+if __name__ == '__main__':
+    main()
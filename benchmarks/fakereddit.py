@@ -0,0 +1,412 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+A local stand-in for the Reddit and strapi APIs Snookey3 talks to, for load and latency testing
+without network access or a Reddit account.
+
+It serves the token, authorize, me, comment, broadcasts and videos endpoints from one Flask app on
+waitress, and pushes synthetic chat to live comment websockets from a minimal RFC 6455 server.
+Latency, random 500s, 503s from the broadcasts endpoint (at random or for given subreddits) and
+X-Ratelimit headers are configurable.
+Usage:
+
+    python -m benchmarks.fakereddit [--port N] [--latency MS] [--jitter MS] [--error-rate P]
+                                    [--unavailable-rate P] [--ratelimit N] [--ratelimit-period S]
+                                    [--chat-rate N]
+
+and point the client at it with the ENDPOINTS section it prints for config.json.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import socket
+import socketserver
+import struct
+import urllib.parse
+import uuid
+from threading import Lock, Thread, Event
+from time import sleep, time
+
+import waitress
+from flask import Flask, request, jsonify, redirect, abort, g
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class Faults:
+
+    def __init__(self, latency: float = 0, jitter: float = 0, error_rate: float = 0, unavailable_rate: float = 0,
+                 ratelimit: int = 600, ratelimit_period: float = 600, unavailable_subreddits: tuple = ()):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.unavailable_rate = unavailable_rate
+        self.ratelimit = ratelimit
+        self.ratelimit_period = ratelimit_period
+        self.unavailable_subreddits = {subreddit.lower() for subreddit in unavailable_subreddits}
+
+
+class _Window:
+
+    def __init__(self, period: float):
+        self.period = period
+        self.started = time()
+        self.used = 0
+
+    def charge(self) -> float:
+        """Counts a request and returns the seconds until the window resets."""
+        now = time()
+        if now - self.started >= self.period:
+            self.started = now
+            self.used = 0
+        self.used += 1
+        return self.period - (now - self.started)
+
+
+def _encode_frame(payload: bytes, opcode: int = 0x1) -> bytes:
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 2 ** 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def _read_exactly(connection: socket.socket, count: int) -> bytes:
+    data = b''
+    while len(data) < count:
+        chunk = connection.recv(count - len(data))
+        if not chunk:
+            raise ConnectionError('The websocket client went away.')
+        data += chunk
+    return data
+
+
+def _read_frame(connection: socket.socket):
+    first, second = _read_exactly(connection, 2)
+    opcode = first & 0x0f
+    length = second & 0x7f
+    if length == 126:
+        length, = struct.unpack('!H', _read_exactly(connection, 2))
+    elif length == 127:
+        length, = struct.unpack('!Q', _read_exactly(connection, 8))
+    mask = _read_exactly(connection, 4) if second & 0x80 else None
+    payload = _read_exactly(connection, length)
+    if mask:
+        payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+    return opcode, payload
+
+
+class _WebSocketClient:
+
+    def __init__(self, connection: socket.socket):
+        self.connection = connection
+        self.lock = Lock()
+
+    def send(self, payload: bytes, opcode: int = 0x1):
+        with self.lock:
+            self.connection.sendall(_encode_frame(payload, opcode))
+
+
+class _WebSocketHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        fake = self.server.fake
+        request_head = b''
+        while b'\r\n\r\n' not in request_head:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return
+            request_head += chunk
+
+        lines = request_head.decode('latin-1').split('\r\n')
+        path = lines[0].split(' ')[1]
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        stream_id = path.rstrip('/').rsplit('/', 1)[-1]
+        if stream_id not in fake.broadcasts or 'sec-websocket-key' not in headers:
+            self.request.sendall(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+            return
+
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()).digest())
+        self.request.sendall(b'HTTP/1.1 101 Switching Protocols\r\n'
+                             b'Upgrade: websocket\r\n'
+                             b'Connection: Upgrade\r\n'
+                             b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+
+        client = _WebSocketClient(self.request)
+        fake.add_listener(stream_id, client)
+        try:
+            while True:
+                opcode, payload = _read_frame(self.request)
+                if opcode == 0x8:
+                    client.send(payload[:2], 0x8)
+                    return
+                if opcode == 0x9:
+                    client.send(payload, 0xA)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            fake.remove_listener(stream_id, client)
+
+
+class _WebSocketServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeReddit:
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, faults: Faults = None, chat_rate: float = 0,
+                 threads: int = 8):
+        self.host = host
+        self.port = port
+        self.faults = faults or Faults()
+        self.chat_rate = chat_rate
+        self.threads = threads
+        self.broadcasts = {}
+        self.requests = 0
+        self._tokens = {}
+        self._windows = {}
+        self._listeners = {}
+        self._comments = 0
+        self._lock = Lock()
+        self._stopped = Event()
+        self._random = random.Random()
+        self.app = self._create_app()
+        self._server = None
+        self._websocket_server = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self._server.effective_port}'
+
+    @property
+    def websocket_url(self) -> str:
+        return f'ws://{self.host}:{self._websocket_server.server_address[1]}'
+
+    def start(self) -> str:
+        self._websocket_server = _WebSocketServer((self.host, 0), _WebSocketHandler)
+        self._websocket_server.fake = self
+        Thread(target=self._websocket_server.serve_forever, name='FakeRedditWebSocket', daemon=True).start()
+
+        self._server = waitress.create_server(self.app, host=self.host, port=self.port, threads=self.threads)
+        Thread(target=self._server.run, name='FakeReddit', daemon=True).start()
+
+        if self.chat_rate > 0:
+            Thread(target=self._chat, name='FakeRedditChat', daemon=True).start()
+        return self.url
+
+    def stop(self):
+        self._stopped.set()
+        if self._server is not None:
+            self._server.close()
+        if self._websocket_server is not None:
+            self._websocket_server.shutdown()
+            self._websocket_server.server_close()
+
+    def add_listener(self, stream_id: str, client: _WebSocketClient):
+        with self._lock:
+            self._listeners.setdefault(stream_id, []).append(client)
+
+    def remove_listener(self, stream_id: str, client: _WebSocketClient):
+        with self._lock:
+            listeners = self._listeners.get(stream_id, [])
+            if client in listeners:
+                listeners.remove(client)
+
+    def push_comment(self, stream_id: str, author: str, body: str) -> dict:
+        with self._lock:
+            self._comments += 1
+            comment = {'_id36': f'c{self._comments}', 'author': author, 'body': body, 'created_utc': time()}
+            listeners = list(self._listeners.get(stream_id, ()))
+        frame = json.dumps({'type': 'new_comment', 'payload': comment}).encode()
+        for client in listeners:
+            try:
+                client.send(frame)
+            except OSError:
+                self.remove_listener(stream_id, client)
+        return comment
+
+    def _chat(self):
+        while not self._stopped.wait(self._random.expovariate(self.chat_rate)):
+            for stream_id in list(self.broadcasts):
+                self.push_comment(stream_id, f'user{self._random.randrange(100)}',
+                                  f'synthetic comment {self._random.randrange(10 ** 6)}')
+
+    def _username(self):
+        authorization = request.headers.get('Authorization', '')
+        token = authorization[len('Bearer '):] if authorization.startswith('Bearer ') else None
+        return self._tokens.get(token)
+
+    def _create_app(self) -> Flask:
+        app = Flask('fakereddit')
+        faults = self.faults
+
+        @app.before_request
+        def inject_faults():
+            with self._lock:
+                self.requests += 1
+                client = request.headers.get('Authorization') or request.remote_addr
+                window = self._windows.setdefault(client, _Window(faults.ratelimit_period))
+                reset = window.charge()
+                g.ratelimit = (max(faults.ratelimit - window.used, 0), min(window.used, faults.ratelimit), reset)
+                roll = self._random.random()
+                delay = max(self._random.gauss(faults.latency, faults.jitter), 0) if faults.latency else 0
+
+            if delay:
+                sleep(delay)
+            if window.used > faults.ratelimit:
+                response = jsonify({'message': 'Too Many Requests', 'error': 429})
+                response.status_code = 429
+                return response
+            if roll < faults.error_rate:
+                abort(500)
+
+        @app.after_request
+        def add_ratelimit_headers(response):
+            ratelimit = g.get('ratelimit')
+            if ratelimit is not None:
+                remaining, used, reset = ratelimit
+                response.headers['X-Ratelimit-Remaining'] = str(remaining)
+                response.headers['X-Ratelimit-Used'] = str(used)
+                response.headers['X-Ratelimit-Reset'] = str(math.ceil(reset))
+            return response
+
+        @app.route('/api/v1/authorize')
+        def authorize():
+            params = {'state': request.args.get('state', ''), 'code': uuid.uuid4().hex}
+            return redirect(request.args['redirect_uri'] + '?' + urllib.parse.urlencode(params))
+
+        @app.route('/api/v1/access_token', methods=['POST'])
+        def access_token():
+            grant_type = request.form.get('grant_type')
+            if grant_type == 'authorization_code':
+                refresh_token = uuid.uuid4().hex
+            elif grant_type == 'refresh_token':
+                refresh_token = request.form.get('refresh_token')
+            else:
+                return jsonify({'error': 'unsupported_grant_type'}), 400
+
+            access_token = uuid.uuid4().hex
+            with self._lock:
+                self._tokens[access_token] = 'fake_' + (refresh_token or '')[:8]
+            return jsonify({'access_token': access_token,
+                            'token_type': 'bearer',
+                            'expires_in': 3600,
+                            'refresh_token': refresh_token,
+                            'scope': '*'})
+
+        @app.route('/api/v1/me')
+        def me():
+            username = self._username()
+            if username is None:
+                abort(401)
+            return jsonify({'name': username})
+
+        @app.route('/r/<subreddit>/broadcasts', methods=['POST'])
+        def broadcasts(subreddit):
+            if self._username() is None:
+                abort(401)
+            if subreddit.lower() in faults.unavailable_subreddits or self._random.random() < faults.unavailable_rate:
+                return jsonify({'status': 'failure', 'data': {'message': 'No broadcast slots available.'}}), 503
+
+            stream_id = 't3_' + uuid.uuid4().hex[:6]
+            self.broadcasts[stream_id] = {'subreddit': subreddit, 'title': request.args.get('title', '')}
+            return jsonify({'status': 'success',
+                            'data': {'streamer_key': uuid.uuid4().hex,
+                                     'post': {'id': stream_id,
+                                              'url': f'{self.url}/rpan/r/{subreddit}/{stream_id[3:]}'}}})
+
+        @app.route('/videos/<stream_id>')
+        def videos(stream_id):
+            broadcast = self.broadcasts.get(stream_id)
+            if broadcast is None:
+                abort(404)
+            with self._lock:
+                viewers = len(self._listeners.get(stream_id, ()))
+            response = jsonify({'status': 'success',
+                                'data': {'post': {'id': stream_id,
+                                                  'title': broadcast['title'],
+                                                  'liveCommentsWebsocket': f'{self.websocket_url}/live/{stream_id}'},
+                                         'stream': {'state': 'IS_LIVE'},
+                                         'continuous_watchers': viewers}})
+            # Unchanged videos are answered with a 304 when the client sends the ETag back.
+            response.add_etag()
+            return response.make_conditional(request)
+
+        @app.route('/api/comment/', methods=['POST'])
+        def comment():
+            username = self._username()
+            if username is None:
+                abort(401)
+            stream_id = request.args.get('thing_id') or request.form.get('thing_id')
+            text = request.args.get('text') or request.form.get('text', '')
+            if stream_id not in self.broadcasts:
+                return jsonify({'json': {'errors': [['NOT_FOUND', 'That post does not exist.', 'thing_id']]}})
+
+            comment = self.push_comment(stream_id, username, text)
+            return jsonify({'json': {'errors': [],
+                                     'data': {'things': [{'kind': 't1',
+                                                          'data': {'id': comment['_id36'],
+                                                                   'author': username,
+                                                                   'body': text}}]}}})
+
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the Reddit APIs used by Snookey3.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0, help='mean added latency in milliseconds')
+    parser.add_argument('--jitter', type=float, default=0, help='standard deviation of the latency in milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of requests answered with a 500')
+    parser.add_argument('--unavailable-rate', type=float, default=0,
+                        help='share of broadcast creations answered with a 503')
+    parser.add_argument('--unavailable-subreddit', action='append', default=[],
+                        help='a subreddit that never accepts broadcasts; may be repeated')
+    parser.add_argument('--ratelimit', type=int, default=600, help='requests allowed per client and window')
+    parser.add_argument('--ratelimit-period', type=float, default=600, help='rate limit window in seconds')
+    parser.add_argument('--chat-rate', type=float, default=5, help='synthetic comments per second per broadcast')
+    args = parser.parse_args()
+
+    faults = Faults(args.latency / 1000, args.jitter / 1000, args.error_rate, args.unavailable_rate,
+                    args.ratelimit, args.ratelimit_period, args.unavailable_subreddit)
+    fake = FakeReddit(args.host, args.port, faults, args.chat_rate)
+    url = fake.start()
+    print('Serving on', url)
+    print(json.dumps({'ENDPOINTS': {'OAUTH': url, 'STRAPI': url, 'TOKEN': url, 'AUTHORIZE': url}}, indent=2))
+    try:
+        fake._stopped.wait()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Throughput and tail latency benchmark for the Reddit clients, run against the local stand-in server
+in benchmarks.fakereddit. Usage:
+
+    python -m benchmarks.reddit_load [--clients N] [--duration S] [--latency MS] [--jitter MS]
+                                     [--error-rate P] [--ratelimit N] [--async] [--json]
+
+A number of concurrent clients share one authorized client and repeatedly poll the broadcast,
+fetch the account and post comments, through the same transport and rate limiter the app uses.
+"""
+
+import argparse
+import asyncio
+import json
+from collections import defaultdict
+from threading import Thread
+from time import monotonic
+
+from benchmarks.fakereddit import FakeReddit, Faults
+
+# Relative weights of the operations each client performs.
+MIX = (('video', 6), ('me', 2), ('comment', 2))
+
+
+def _operations(seed: int):
+    import random
+
+    generator = random.Random(seed)
+    names = [name for name, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    while True:
+        yield generator.choices(names, weights)[0]
+
+
+def _percentiles(values: list) -> dict:
+    values = sorted(values)
+    if not values:
+        return {}
+    summary = {'p50': values[len(values) // 2],
+               'p95': values[min(int(len(values) * 0.95), len(values) - 1)],
+               'p99': values[min(int(len(values) * 0.99), len(values) - 1)],
+               'max': values[-1]}
+    return {key: round(value * 1000, 2) for key, value in summary.items()}
+
+
+class Results:
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, operation: str, started: float, error: str = None):
+        self.latencies[operation].append(monotonic() - started)
+        if error is not None:
+            self.errors[f'{operation}: {error}'] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        total = sum(len(values) for values in self.latencies.values())
+        return {'requests': total,
+                'elapsed_s': round(elapsed, 2),
+                'requests_per_s': round(total / elapsed, 1) if elapsed else 0,
+                'latency_ms': {operation: _percentiles(values) for operation, values in self.latencies.items()},
+                'errors': dict(self.errors)}
+
+
+def run_sync(url: str, args) -> dict:
+    from snookey3.core.endpoints import Endpoints
+    from snookey3.core.exceptions import UnsuccessfulRequestException
+    from snookey3.core.reddit import Reddit
+    from snookey3.core.transport import Transport
+
+    reddit = Reddit('benchmark', 'http://localhost/callback', 'Snookey3 benchmark',
+                    transport=Transport(pool_maxsize=args.clients), endpoints=Endpoints.local(url))
+    reddit.auth.authorize('benchmark')
+    broadcast = reddit.broadcast.post('benchmark', 'pan')
+    results = Results()
+    deadline = monotonic() + args.duration
+
+    def client(seed: int):
+        for operation in _operations(seed):
+            if monotonic() >= deadline:
+                return
+            started = monotonic()
+            try:
+                if operation == 'video':
+                    broadcast.live_comments_websocket()
+                elif operation == 'me':
+                    reddit.username()
+                else:
+                    broadcast.post_comment('benchmark comment')
+            except UnsuccessfulRequestException as e:
+                results.record(operation, started, str(e.status_code))
+            except Exception as e:
+                results.record(operation, started, type(e).__name__)
+            else:
+                results.record(operation, started)
+
+    started = monotonic()
+    threads = [Thread(target=client, args=(seed,)) for seed in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = results.summary(monotonic() - started)
+    summary['ratelimit'] = reddit.ratelimit.budget()
+    reddit.close()
+    return summary
+
+
+async def _run_async(url: str, args) -> dict:
+    from snookey3.core.aioreddit import AsyncReddit
+    from snookey3.core.endpoints import Endpoints
+    from snookey3.core.exceptions import UnsuccessfulRequestException
+
+    async with AsyncReddit('benchmark', 'http://localhost/callback', 'Snookey3 benchmark',
+                           endpoints=Endpoints.local(url)) as reddit:
+        await reddit.auth.authorize('benchmark')
+        broadcast = await reddit.broadcast.post('benchmark', 'pan')
+        results = Results()
+        deadline = monotonic() + args.duration
+
+        async def client(seed: int):
+            for operation in _operations(seed):
+                if monotonic() >= deadline:
+                    return
+                started = monotonic()
+                try:
+                    if operation == 'video':
+                        await broadcast.live_comments_websocket()
+                    elif operation == 'me':
+                        await reddit.username()
+                    else:
+                        await broadcast.post_comment('benchmark comment')
+                except UnsuccessfulRequestException as e:
+                    results.record(operation, started, str(e.status_code))
+                except Exception as e:
+                    results.record(operation, started, type(e).__name__)
+                else:
+                    results.record(operation, started)
+
+        started = monotonic()
+        await asyncio.gather(*(client(seed) for seed in range(args.clients)))
+        summary = results.summary(monotonic() - started)
+        summary['ratelimit'] = reddit.ratelimit.budget()
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure Reddit client throughput and latency against a local server.')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=10, help='benchmark length in seconds')
+    parser.add_argument('--latency', type=float, default=20, help='mean server latency in milliseconds')
+    parser.add_argument('--jitter', type=float, default=10, help='standard deviation of the latency in milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of requests answered with a 500')
+    parser.add_argument('--ratelimit', type=int, default=100000, help='requests allowed per rate limit window')
+    parser.add_argument('--ratelimit-period', type=float, default=600, help='rate limit window in seconds')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='benchmark the asyncio client')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    faults = Faults(args.latency / 1000, args.jitter / 1000, args.error_rate, 0, args.ratelimit, args.ratelimit_period)
+    fake = FakeReddit(faults=faults, threads=max(args.clients, 4))
+    url = fake.start()
+    try:
+        if args.use_async:
+            results = asyncio.run(_run_async(url, args))
+        else:
+            results = run_sync(url, args)
+    finally:
+        fake.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{results['requests']} requests in {results['elapsed_s']} s, {results['requests_per_s']} requests/s")
+    for operation, latency in results['latency_ms'].items():
+        print(f'  {operation:<8} ' + '   '.join(f'{name} {value:>8.2f} ms' for name, value in latency.items()))
+    for error, count in results['errors'].items():
+        print(f'  error    {error}: {count}')
+    print('  ratelimit', results['ratelimit'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Cold and warm startup benchmark for Snookey3.
+
+Every run launches a fresh interpreter which imports the GUI, builds the MainWindow on the Qt offscreen
+platform and exits on its first paint. Cold runs compile into an empty bytecode cache, warm runs reuse
+one that has been primed. Usage:
+
+    python -m benchmarks.startup [--runs N] [--budget MS] [--json]
+
+With --budget the benchmark exits with status 1 when the warm median time-to-first-paint exceeds MS.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import sys, time
+started = time.time()
+import snookey3.gui.main
+imported = time.time()
+
+from PyQt5.QtCore import QObject, QEvent
+from snookey3.__main__ import create_application
+from snookey3.gui.main import MainWindow
+
+
+class FirstPaint(QObject):
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint:
+            print(started, imported, time.time())
+            sys.stdout.flush()
+            qapp.quit()
+        return False
+
+
+qapp = create_application()
+window = MainWindow()
+first_paint = FirstPaint()
+window.installEventFilter(first_paint)
+window.show()
+qapp.exec()
+'''
+
+
+def _run_once(pycache_dir: str, home_dir: str) -> dict:
+    env = dict(os.environ,
+               QT_QPA_PLATFORM='offscreen',
+               PYTHONPYCACHEPREFIX=pycache_dir,
+               PYTHONPATH=REPO_DIR,
+               HOME=home_dir,
+               USERPROFILE=home_dir)
+    launched = time.time()
+    output = subprocess.run([sys.executable, '-c', CHILD], env=env, cwd=REPO_DIR,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+    started, imported, painted = (float(value) for value in output.split()[-3:])
+    return {'interpreter_ms': (started - launched) * 1000,
+            'import_ms': (imported - started) * 1000,
+            'first_paint_ms': (painted - launched) * 1000}
+
+
+def _summarize(runs: list) -> dict:
+    summary = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs]
+        summary[key] = {'median': round(statistics.median(values), 1),
+                        'min': round(min(values), 1),
+                        'max': round(max(values), 1)}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure Snookey3 cold and warm startup latency.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=None,
+                        help='fail if the warm median time-to-first-paint exceeds this many milliseconds')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        home_dir = os.path.join(temp_dir, 'home')
+        os.makedirs(home_dir)
+
+        cold = []
+        for i in range(args.runs):
+            cold.append(_run_once(os.path.join(temp_dir, f'cold-{i}'), home_dir))
+
+        warm_cache = os.path.join(temp_dir, 'warm')
+        _run_once(warm_cache, home_dir)
+        warm = [_run_once(warm_cache, home_dir) for _ in range(args.runs)]
+
+    results = {'cold': _summarize(cold), 'warm': _summarize(warm)}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for mode, summary in results.items():
+            print(mode)
+            for key, values in summary.items():
+                print(f"  {key:<16} median {values['median']:>8.1f} ms   "
+                      f"min {values['min']:>8.1f} ms   max {values['max']:>8.1f} ms")
+
+    if args.budget is not None and results['warm']['first_paint_ms']['median'] > args.budget:
+        print(f"Warm time-to-first-paint exceeds the budget of {args.budget} ms.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -19,13 +19,12 @@ import os
 import sys
 from datetime import date
 
-import requests
-
 from .utils import fjson
 from .version import __version__, __title__
 
 ROOT_DIR = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
 HOME_DIR = os.path.expanduser('~')
+DATA_DIR = os.path.join(HOME_DIR, '.Snookey3')
 
 
 def _init_logger():
@@ -34,7 +33,7 @@ def _init_logger():
 
     c_handler = logging.StreamHandler()
     c_handler.setLevel(logging.DEBUG)
-    logs_dir = os.path.join(HOME_DIR, '.Snookey3', 'logs')
+    logs_dir = os.path.join(DATA_DIR, 'logs')
     if not os.path.exists(logs_dir):
         os.makedirs(logs_dir)
     log_filename = str(date.today()) + '.log'
@@ -64,27 +63,7 @@ def _init_logger():
     return logger
 
 
-def _pull_subreddits_from_github():
-    try:
-        response = requests.get('https://raw.githubusercontent.com/warpspeedchic/Snookey3/master/subreddits',
-                                headers={'User-agent': config.get('USER_AGENT')})
-    except:
-        return None
-
-    if response.status_code == 200:
-        return [subreddit.strip() for subreddit in response.text.splitlines()]
-    return None
-
-
 _logger = _init_logger()
 
 with open(os.path.join(ROOT_DIR, 'config.json')) as config_file:
     config = fjson.load(config_file, title=__title__, version=__version__)
-
-if config['PULL_SUBREDDITS_FROM_GITHUB']:
-    subreddits = _pull_subreddits_from_github()
-    if subreddits:
-        config['SUBREDDITS'] = subreddits
-        _logger.info('Using online subreddit list.')
-    else:
-        _logger.info('Using local subreddit list.')
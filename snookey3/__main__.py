@@ -20,17 +20,13 @@ import sys
 logger = logging.getLogger(__name__)
 
 
-def main():
-    from snookey3.version import __title__, __version__
-    logger.info('%s - v%s', __title__, __version__)
-
+def create_application():
     from PyQt5.QtGui import QIcon
-    from PyQt5.QtWidgets import QApplication, QMessageBox
-    from snookey3.core import server
+    from PyQt5.QtWidgets import QApplication
+    from snookey3.version import __title__
     from snookey3.utils import files
-    from snookey3.core.exceptions import PortOccupiedException
     from snookey3.gui import fonts
-    from snookey3.gui.main import MainWindow
+    from snookey3.gui.bridge import get_bridge
 
     qapp = QApplication([])
 
@@ -42,18 +38,51 @@ def main():
     with open(files.get_path('resources', 'styles', 'default.qss')) as stylesheet_file:
         qapp.setStyleSheet(stylesheet_file.read())
     fonts.load()
+    get_bridge()
+
+    return qapp
+
+
+def start_server():
+    from PyQt5.QtWidgets import QMessageBox
+    from snookey3.core import server
+    from snookey3.core.exceptions import PortOccupiedException
+
     try:
         server.run()
     except PortOccupiedException as e:
+        process_name = e.process.name() if e.process else 'another application'
         QMessageBox.warning(None, 'Port occupied',
                             "This app requires a specific local port to be open\n"
-                            f"but it seems to be occupied by {e.process.name()}.\n"
-                            f"If it's safe to do so, close {e.process.name()} and try again.")
+                            f"but it seems to be occupied by {process_name}.\n"
+                            f"If it's safe to do so, close {process_name} and try again.")
         sys.exit(-1)
 
+
+def main():
+    if '--headless' in sys.argv[1:]:
+        from snookey3 import daemon
+        daemon.main()
+        return
+
+    from snookey3.version import __title__, __version__
+    logger.info('%s - v%s', __title__, __version__)
+
+    from PyQt5.QtCore import QTimer
+    from snookey3.core import subreddits
+    from snookey3.core.reddit import r
+    from snookey3.gui.main import MainWindow
+
+    qapp = create_application()
+    subreddits.start()
+
     main_window = MainWindow()
     main_window.show()
-    sys.exit(qapp.exec())
+    # The callback server is only needed once the user authorizes, so it starts after the first paint.
+    QTimer.singleShot(0, start_server)
+    exit_code = qapp.exec()
+    r.close()
+    sys.exit(exit_code)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,304 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides an asyncio-native twin of the Reddit client in snookey3.core.reddit.
+"""
+
+import asyncio
+import logging
+import urllib.parse
+from time import time
+
+import aiohttp
+
+from snookey3 import config
+from .endpoints import Endpoints
+from .exceptions import UnsuccessfulRequestException
+from .ratelimit import RateLimiter, Priority
+from .reddit import DEFAULT_EXPIRES_IN, EXPIRY_MARGIN
+from .refresher import refresh_delay, is_rejected, RETRY_AFTER
+from .transport import DEFAULT_POOL_MAXSIZE, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncReddit:
+
+    def __init__(self, client_id: str, redirect_uri: str, user_agent: str, session: aiohttp.ClientSession = None,
+                 endpoints: Endpoints = None):
+        self.client_id = client_id
+        self.redirect_uri = redirect_uri
+        self.user_agent = user_agent
+        self.endpoints = endpoints or Endpoints.from_config(config.get('ENDPOINTS'))
+        self._owns_session = session is None
+        self._session = session
+        self.ratelimit = RateLimiter()
+        self.auth = AsyncAuth(self)
+        self.broadcast = AsyncBroadcastManager(self)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # The session has to be created inside a running event loop, hence the lazy construction.
+        if self._session is None:
+            transport_config = config.get('TRANSPORT') or {}
+            connector = aiohttp.TCPConnector(limit=0,
+                                             limit_per_host=transport_config.get('POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE))
+            timeout = aiohttp.ClientTimeout(sock_connect=transport_config.get('CONNECT_TIMEOUT',
+                                                                              DEFAULT_CONNECT_TIMEOUT),
+                                            sock_read=transport_config.get('READ_TIMEOUT', DEFAULT_READ_TIMEOUT))
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    def headers(self):
+        headers = {'User-agent': self.user_agent}
+
+        if self.auth.access_token:
+            headers['Authorization'] = 'Bearer ' + self.auth.access_token
+
+        return headers
+
+    async def request(self, method: str, url: str, priority: Priority = Priority.POLL,
+                      **kwargs) -> aiohttp.ClientResponse:
+        await self.ratelimit.acquire_async(priority)
+        try:
+            response = await self.session.request(method, url, **kwargs)
+            try:
+                # Reading the whole body returns the connection to the pool, while keeping response.read()
+                # and response.json() usable for the caller. Releasing the response explicitly would make
+                # newer aiohttp versions refuse to hand out the body again.
+                await response.read()
+            except BaseException:
+                response.close()
+                raise
+        except BaseException:
+            self.ratelimit.release()
+            raise
+        self.ratelimit.release(response.headers, response.status)
+        return response
+
+    async def get(self, url: str, params: dict = None, data: dict = None,
+                  priority: Priority = Priority.POLL) -> aiohttp.ClientResponse:
+        await self.auth.ensure_fresh()
+        return await self.request('GET', url, priority, params=params, headers=self.headers(), data=data)
+
+    async def post(self, url: str, params: dict = None, data: dict = None,
+                   priority: Priority = Priority.COMMENT) -> aiohttp.ClientResponse:
+        await self.auth.ensure_fresh()
+        return await self.request('POST', url, priority, params=params, headers=self.headers(), data=data)
+
+    async def close(self):
+        self.auth.cancel_refresh()
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def username(self):
+        response = await self.get(self.endpoints.me_url())
+
+        try:
+            username = (await response.json(content_type=None))['name']
+        except (ValueError, KeyError, TypeError):
+            return None
+        else:
+            return username
+
+
+class AsyncAuth:
+
+    def __init__(self, reddit: AsyncReddit):
+        self.reddit = reddit
+        self.access_token = None
+        self.refresh_token = None
+        self.authorized_time = None
+        self.expires_in = DEFAULT_EXPIRES_IN
+        self._refresh_lock = None
+        self._refresh_task = None
+        self._generation = 0
+
+    @property
+    def expires_at(self):
+        if not self.authorized_time:
+            return None
+        return self.authorized_time + self.expires_in
+
+    @property
+    def refresh_lock(self) -> asyncio.Lock:
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        return self._refresh_lock
+
+    def url(self, state: str) -> str:
+        params = {'client_id': self.reddit.client_id,
+                  'response_type': 'code',
+                  'state': state,
+                  'redirect_uri': self.reddit.redirect_uri,
+                  'scope': '*',
+                  'duration': 'permanent'}
+        url = self.reddit.endpoints.authorize_url() + '?' + urllib.parse.urlencode(params)
+        return url
+
+    async def _request_token(self, data: dict) -> aiohttp.ClientResponse:
+        return await self.reddit.request('POST', self.reddit.endpoints.access_token_url(), Priority.REFRESH,
+                                         auth=aiohttp.BasicAuth(self.reddit.client_id, ''),
+                                         data=data,
+                                         headers={'User-agent': self.reddit.user_agent})
+
+    def _update(self, token: dict, refresh_token: str):
+        self.access_token = token['access_token']
+        self.refresh_token = refresh_token
+        self.expires_in = token.get('expires_in', DEFAULT_EXPIRES_IN)
+        self.authorized_time = time()
+        self._generation += 1
+        self.schedule_refresh(refresh_delay(self.expires_in))
+
+    async def authorize(self, code):
+        data = {'grant_type': 'authorization_code',
+                'code': code,
+                'redirect_uri': self.reddit.redirect_uri}
+
+        async with self.refresh_lock:
+            response = await self._request_token(data)
+            try:
+                token = await response.json(content_type=None)
+                self._update(token, token['refresh_token'])
+            except (KeyError, ValueError, TypeError):
+                raise UnsuccessfulRequestException(response.status, await response.read())
+
+    async def refresh(self):
+        generation = self._generation
+
+        async with self.refresh_lock:
+            if not self.refresh_token:
+                return
+            if self._generation != generation:
+                # Another task refreshed the token while this one was waiting for the lock.
+                return
+
+            logger.info('Refreshing the token.')
+            data = {'grant_type': 'refresh_token',
+                    'refresh_token': self.refresh_token}
+            response = await self._request_token(data)
+            try:
+                token = await response.json(content_type=None)
+                # Reddit may rotate the refresh token, in which case the old one stops working.
+                self._update(token, token.get('refresh_token', self.refresh_token))
+            except (KeyError, ValueError, TypeError):
+                raise UnsuccessfulRequestException(response.status, await response.read())
+
+    async def ensure_fresh(self):
+        if self.authorized_time and time() >= self.expires_at - EXPIRY_MARGIN:
+            await self.refresh()
+
+    def forget(self):
+        self.access_token = None
+        self.refresh_token = None
+        self.authorized_time = None
+        self._generation += 1
+        self.cancel_refresh()
+
+    def schedule_refresh(self, delay: float):
+        self.cancel_refresh()
+        self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_later(delay))
+
+    def cancel_refresh(self):
+        if self._refresh_task is not None and self._refresh_task is not asyncio.current_task():
+            self._refresh_task.cancel()
+        self._refresh_task = None
+
+    async def _refresh_later(self, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await self.refresh()
+        except UnsuccessfulRequestException as e:
+            logger.error('Background token refresh failed. Status code: %i. Response: %s',
+                         e.status_code, e.response_content)
+            if is_rejected(e):
+                # Retrying a revoked or invalid refresh token can't succeed; the user has to authorize again.
+                logger.warning('The refresh token was rejected, forgetting the credentials.')
+                self.forget()
+            else:
+                self.schedule_refresh(RETRY_AFTER)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            logger.exception('Background token refresh failed.')
+            self.schedule_refresh(RETRY_AFTER)
+
+
+class AsyncBroadcastManager:
+
+    def __init__(self, reddit: AsyncReddit):
+        self.reddit = reddit
+
+    async def post(self, title: str, subreddit: str):
+        title = urllib.parse.quote(title)
+        url = f'{self.reddit.endpoints.broadcasts_url(subreddit)}?title={title}'
+        response = await self.reddit.post(url, data={}, priority=Priority.BROADCAST)
+
+        try:
+            data = (await response.json(content_type=None))['data']
+            streamer_key = data['streamer_key']
+            stream_url = data['post']['url']
+            stream_id = data['post']['id']
+        except (KeyError, ValueError, TypeError):
+            raise UnsuccessfulRequestException(response.status, await response.read())
+        else:
+            return AsyncBroadcast(self.reddit, stream_id, streamer_key, stream_url, subreddit)
+
+
+class AsyncBroadcast:
+
+    def __init__(self, reddit: AsyncReddit, stream_id: str, streamer_key: str, stream_url: str, subreddit: str = None):
+        self.reddit = reddit
+        self.stream_id = stream_id
+        self.streamer_key = streamer_key
+        self.stream_url = stream_url
+        self.subreddit = subreddit
+
+    async def live_comments_websocket(self):
+        response = await self.reddit.get(self.reddit.endpoints.video_url(self.stream_id))
+        try:
+            live_comments_websocket = (await response.json(content_type=None))['data']['post']['liveCommentsWebsocket']
+        except (KeyError, ValueError, TypeError):
+            raise UnsuccessfulRequestException(response.status, await response.read())
+
+        return live_comments_websocket
+
+    async def post_comment(self, text: str):
+        params = {'api_type': 'json',
+                  'text': text,
+                  'thing_id': self.stream_id}
+        url = self.reddit.endpoints.comment_url()
+        response = await self.reddit.post(url, params=params, priority=Priority.COMMENT)
+        if response.status != 200:
+            raise UnsuccessfulRequestException(response.status, await response.read())
+
+        try:
+            result = (await response.json(content_type=None))['json']
+        except (KeyError, ValueError, TypeError):
+            return None
+        if result.get('errors'):
+            raise UnsuccessfulRequestException(response.status, await response.read())
+        try:
+            return result['data']['things'][0]['data']
+        except (KeyError, IndexError, TypeError):
+            return None
@@ -0,0 +1,252 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides rolling chat analytics in fixed memory.
+
+Comments are counted in one-second buckets for message rates, and in 30-second buckets of
+HyperLogLog sketches (unique authors) and Misra-Gries summaries (frequent terms). Adding a comment
+only touches the current buckets; the windows are put together when a snapshot is taken. Unique
+author counts and top terms are estimates, and their windows are only as precise as the buckets.
+"""
+
+import math
+import re
+from array import array
+from threading import Lock
+from time import monotonic
+
+RATE_WINDOWS = (10, 60, 300)
+SKETCH_BUCKET = 30
+HLL_PRECISION = 10
+TOP_TERMS_CAPACITY = 64
+TERM_PATTERN = re.compile(r"[^\W\d_][\w']{2,}")
+STOPWORDS = frozenset((
+    'the', 'and', 'you', 'that', 'this', 'for', 'are', 'was', 'with', 'have', 'but', 'not', 'your',
+    'what', 'just', 'can', 'its', "it's", 'all', 'get', 'how', 'out', 'they', 'will', 'one', 'from',
+    'there', 'about', 'like', 'she', 'her', 'him', 'his', 'has', 'had', 'who', 'why', 'did', 'don',
+    "don't", 'i\'m', 'yes', 'now', 'too', 'our', 'any', 'been', 'were', 'then', 'them', 'than', 'when',
+))
+
+MASK64 = (1 << 64) - 1
+INVERSE_POWERS = tuple(2.0 ** -rank for rank in range(65))
+
+
+class HyperLogLog:
+    """
+    Cardinality sketch with 2^precision one-byte registers. Hashes come from hash(), so sketches can
+    only be compared and merged within a single process.
+    """
+
+    __slots__ = ('precision', 'registers')
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, item: str):
+        x = hash(item) & MASK64
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def clear(self):
+        self.registers[:] = bytes(len(self.registers))
+
+    def merge(self, other: 'HyperLogLog'):
+        self.registers[:] = bytes(map(max, self.registers, other.registers))
+
+    def copy(self) -> 'HyperLogLog':
+        sketch = HyperLogLog(self.precision)
+        sketch.registers[:] = self.registers
+        return sketch
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / math.fsum(map(INVERSE_POWERS.__getitem__, self.registers))
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while most registers are still empty.
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class MisraGries:
+    """Heavy-hitters summary keeping at most capacity counters; counts are lower bounds."""
+
+    __slots__ = ('capacity', 'counters')
+
+    def __init__(self, capacity: int = TOP_TERMS_CAPACITY):
+        self.capacity = capacity
+        self.counters = {}
+
+    def add(self, item: str):
+        counters = self.counters
+        if item in counters:
+            counters[item] += 1
+        elif len(counters) < self.capacity:
+            counters[item] = 1
+        else:
+            # Each decrement pays for an earlier increment, so this stays O(1) amortized.
+            for key in list(counters):
+                if counters[key] == 1:
+                    del counters[key]
+                else:
+                    counters[key] -= 1
+
+    def clear(self):
+        self.counters.clear()
+
+    def merge(self, other: 'MisraGries'):
+        counters = self.counters
+        for key, count in other.counters.items():
+            counters[key] = counters.get(key, 0) + count
+        if len(counters) > self.capacity:
+            threshold = sorted(counters.values(), reverse=True)[self.capacity]
+            self.counters = {key: count - threshold for key, count in counters.items() if count > threshold}
+
+    def copy(self) -> 'MisraGries':
+        summary = MisraGries(self.capacity)
+        summary.counters = dict(self.counters)
+        return summary
+
+    def top(self, count: int) -> list:
+        return sorted(self.counters.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+def label(window: int) -> str:
+    if window % 60 == 0:
+        return f'{window // 60}m'
+    return f'{window}s'
+
+
+def terms(text: str) -> set:
+    return {term for term in TERM_PATTERN.findall(text.lower()) if term not in STOPWORDS}
+
+
+class ChatAnalytics:
+
+    def __init__(self, windows: tuple = RATE_WINDOWS, sketch_bucket: int = SKETCH_BUCKET,
+                 top_terms_capacity: int = TOP_TERMS_CAPACITY):
+        self.windows = tuple(sorted(windows))
+        self.sketch_bucket = sketch_bucket
+        span = self.windows[-1]
+        # One slot more than the longest window, for the second that is still being counted.
+        self._counts = array('I', [0]) * (span + 1)
+        self._second = None
+        sketch_buckets = -(-span // sketch_bucket)
+        self._authors = [HyperLogLog() for _ in range(sketch_buckets)]
+        self._terms = [MisraGries(top_terms_capacity) for _ in range(sketch_buckets)]
+        self._bucket = None
+        self._all_authors = HyperLogLog()
+        self._started = None
+        self._lock = Lock()
+        self.total = 0
+
+    def _advance(self, now: float):
+        second = int(now)
+        if self._second is None:
+            self._started = now
+            self._second = second
+            self._bucket = second // self.sketch_bucket
+        elif second > self._second:
+            for stale in range(self._second + 1, min(second, self._second + len(self._counts)) + 1):
+                self._counts[stale % len(self._counts)] = 0
+            self._second = second
+
+        bucket = second // self.sketch_bucket
+        if bucket > self._bucket:
+            for stale in range(self._bucket + 1, min(bucket, self._bucket + len(self._authors)) + 1):
+                self._authors[stale % len(self._authors)].clear()
+                self._terms[stale % len(self._terms)].clear()
+            self._bucket = bucket
+
+    def add(self, messages: list, now: float = None):
+        """Counts a batch of comments. now defaults to the time the first of them was received."""
+        if not messages:
+            return
+        if now is None:
+            now = messages[0].received
+        with self._lock:
+            self._advance(now)
+            second = self._second % len(self._counts)
+            bucket = self._bucket % len(self._authors)
+            authors = self._authors[bucket]
+            summary = self._terms[bucket]
+            for message in messages:
+                self._counts[second] += 1
+                authors.add(message.author)
+                self._all_authors.add(message.author)
+                for term in terms(message.body):
+                    summary.add(term)
+            self.total += len(messages)
+
+    def snapshot(self, top: int = 10, now: float = None) -> dict:
+        """Rates in messages per second and unique authors for each window, labelled like '1m', and top terms."""
+        if now is None:
+            now = monotonic()
+        with self._lock:
+            if self._second is None:
+                return {'total': 0,
+                        'rates': {label(window): 0.0 for window in self.windows},
+                        'unique_authors': {'total': 0},
+                        'top_terms': []}
+            self._advance(now)
+            counts = array('I', self._counts)
+            second = self._second
+            bucket = self._bucket
+            authors = [sketch.copy() for sketch in self._authors]
+            summaries = [summary.copy() for summary in self._terms]
+            all_authors = self._all_authors.copy()
+            started = self._started
+            total = self.total
+
+        # Rates only count complete seconds, so they don't dip at the start of every second. Early in a
+        # stream they are averaged over the time since the first comment rather than the whole window.
+        covered = second - started
+        rates = {}
+        for window in self.windows:
+            count = sum(counts[(second - offset) % len(counts)] for offset in range(1, window + 1))
+            rates[label(window)] = round(count / max(min(window, covered), 1), 2)
+
+        # Buckets are merged from the newest back, taking an estimate whenever a window is covered.
+        # Windows shorter than a bucket would be dominated by older comments in it, and are skipped.
+        unique_authors = {}
+        merged = HyperLogLog(all_authors.precision)
+        merged_buckets = 0
+        for window in self.windows:
+            if window < self.sketch_bucket:
+                continue
+            while merged_buckets * self.sketch_bucket < window:
+                sketch = authors[(bucket - merged_buckets) % len(authors)]
+                if any(sketch.registers):
+                    merged.merge(sketch)
+                merged_buckets += 1
+            unique_authors[label(window)] = merged.estimate()
+        unique_authors['total'] = all_authors.estimate()
+
+        top_terms = summaries[bucket % len(summaries)]
+        for offset in range(1, len(summaries)):
+            top_terms.merge(summaries[(bucket - offset) % len(summaries)])
+
+        return {'total': total,
+                'rates': rates,
+                'unique_authors': unique_authors,
+                'top_terms': top_terms.top(top)}
@@ -0,0 +1,284 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides the JSON control API served by the headless daemon next to the OAuth callback.
+
+    GET    /api/health                       liveness and whether the client is authorized
+    GET    /api/metrics                      rate limit budget, chat and process statistics
+    GET    /api/auth                         authorization status and the URL to authorize at
+    GET    /api/accounts                     the accounts and whether they are authorized
+    POST   /api/accounts                     {"name": ...} adds an account, GET /api/auth?account=... authorizes it
+    DELETE /api/accounts/<name>              removes an account, and its stored credentials with ?forget=1
+    GET    /api/subreddits                   which of the configured subreddits recently accepted broadcasts
+    POST   /api/broadcasts                   {"title": ..., "subreddit": ..., "account": ...} creates a broadcast,
+                                             {"subreddits": [...]} in the first of them that accepts it
+    GET    /api/broadcasts/<id>              streamer key, RTMP URL and stream URL
+    DELETE /api/broadcasts/<id>              stops following a broadcast's chat
+    GET    /api/broadcasts/<id>/chat         the chat as server-sent events, resumable with Last-Event-ID
+    GET    /api/broadcasts/<id>/stats        stream state and audience, with the samples after ?since
+    GET    /api/broadcasts/<id>/analytics    chat rates, unique chatters and top terms
+    POST   /api/broadcasts/<id>/comments     {"text": ...} posts a comment
+
+Requests without an account act on the default one.
+When SERVER.API_TOKEN is set in config.json, every request has to carry it as a bearer token.
+Each chat stream holds a server thread while it is open, so at most SERVER.MAX_STREAMS of them are served
+at once (by default SERVER.THREADS minus a few kept for everything else); more are answered with a 503.
+"""
+
+import hmac
+import json
+import logging
+from threading import Lock
+from time import monotonic
+
+from flask import Blueprint, Response, abort, jsonify, request
+
+from snookey3 import config
+from .availability import get_cache
+from .exceptions import UnsuccessfulRequestException
+from .server import DEFAULT_API_THREADS, RESERVED_THREADS
+from .sessions import Account, BroadcastSession, get_manager
+from .states import store
+
+logger = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments on idle event streams.
+KEEPALIVE_INTERVAL = 15
+
+blueprint = Blueprint('api', __name__, url_prefix='/api')
+started = monotonic()
+_streams = 0
+_streams_lock = Lock()
+
+
+def _get_session(stream_id: str) -> BroadcastSession:
+    session = get_manager().broadcasts.get(stream_id)
+    if session is None:
+        abort(404)
+    return session
+
+
+def _get_account(name: str) -> Account:
+    account = get_manager().accounts.get(name)
+    if account is None:
+        abort(404)
+    return account
+
+
+def _max_streams() -> int:
+    server = config['SERVER']
+    return server.get('MAX_STREAMS', max(server.get('THREADS', DEFAULT_API_THREADS) - RESERVED_THREADS, 1))
+
+
+def _error(status_code: int, message: str, **details):
+    response = jsonify(dict(error=message, **details))
+    response.status_code = status_code
+    return response
+
+
+@blueprint.before_request
+def check_token():
+    token = config['SERVER'].get('API_TOKEN')
+    if not token:
+        return None
+    authorization = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(authorization, 'Bearer ' + token):
+        return _error(401, 'Missing or invalid API token.')
+    return None
+
+
+@blueprint.route('/health')
+def health():
+    manager = get_manager()
+    return jsonify({'status': 'ok',
+                    'authorized': manager.accounts[None].authorized,
+                    'uptime': round(monotonic() - started, 3),
+                    'accounts': len(manager.accounts),
+                    'broadcasts': len(manager.broadcasts)})
+
+
+@blueprint.route('/metrics')
+def metrics():
+    import psutil
+
+    process = psutil.Process()
+    metrics = get_manager().stats()
+    metrics.update({'process': {'rss': process.memory_info().rss,
+                                'threads': process.num_threads(),
+                                'cpu_times': process.cpu_times()._asdict()}})
+    return jsonify(metrics)
+
+
+@blueprint.route('/auth')
+def auth():
+    account = _get_account(request.args.get('account'))
+    # The state remembers the account, so the callback knows whose token it received.
+    return jsonify({'account': account.name,
+                    'authorized': account.authorized,
+                    'url': None if account.authorized else account.reddit.auth.url(store.create(account.name))})
+
+
+@blueprint.route('/accounts')
+def list_accounts():
+    return jsonify([account.as_dict() for account in get_manager().accounts.values()])
+
+
+@blueprint.route('/accounts', methods=['POST'])
+def add_account():
+    body = request.get_json(silent=True) or {}
+    name = body.get('name')
+    if not name:
+        return _error(400, 'The account name is required.')
+
+    account = get_manager().account(name)
+    response = jsonify(dict(account.as_dict(),
+                            url=None if account.authorized else account.reddit.auth.url(store.create(name))))
+    response.status_code = 201
+    return response
+
+
+@blueprint.route('/accounts/<name>', methods=['DELETE'])
+def remove_account(name):
+    _get_account(name)
+    get_manager().remove_account(name, forget=request.args.get('forget') == '1')
+    return '', 204
+
+
+@blueprint.route('/subreddits')
+def subreddits():
+    cache = get_cache()
+    return jsonify({subreddit: cache.get(subreddit) for subreddit in config['SUBREDDITS']})
+
+
+@blueprint.route('/broadcasts', methods=['POST'])
+def create_broadcast():
+    body = request.get_json(silent=True) or {}
+    account = _get_account(body.get('account'))
+    if not account.authorized:
+        return _error(409, 'Not authorized yet, see /api/auth.')
+    title = body.get('title')
+    subreddits = body.get('subreddits') or body.get('subreddit')
+    if not title or not subreddits:
+        return _error(400, 'Both title and subreddit are required.')
+
+    try:
+        session = get_manager().create_broadcast(title, subreddits, account.name)
+    except UnsuccessfulRequestException as e:
+        logger.error('Could not create the broadcast. Status code: %i. Response: %s',
+                     e.status_code, e.response_content)
+        return _error(502, 'Reddit refused to create the broadcast.', status_code=e.status_code)
+
+    response = jsonify(session.as_dict())
+    response.status_code = 201
+    return response
+
+
+@blueprint.route('/broadcasts/<stream_id>')
+def get_broadcast(stream_id):
+    return jsonify(_get_session(stream_id).as_dict())
+
+
+@blueprint.route('/broadcasts/<stream_id>', methods=['DELETE'])
+def delete_broadcast(stream_id):
+    if not get_manager().close_broadcast(stream_id):
+        abort(404)
+    return '', 204
+
+
+@blueprint.route('/broadcasts/<stream_id>/comments', methods=['POST'])
+def post_comment(stream_id):
+    session = _get_session(stream_id)
+    body = request.get_json(silent=True) or {}
+    text = (body.get('text') or '').strip()
+    if not text:
+        return _error(400, 'The comment text is required.')
+
+    try:
+        comment = session.broadcast.post_comment(text)
+    except UnsuccessfulRequestException as e:
+        return _error(502, 'Reddit refused the comment.', status_code=e.status_code)
+
+    response = jsonify({'comment': comment})
+    response.status_code = 201
+    return response
+
+
+@blueprint.route('/broadcasts/<stream_id>/stats')
+def get_stats(stream_id):
+    session = _get_session(stream_id)
+    stats = session.stats.as_dict()
+    try:
+        since = float(request.args.get('since', 0))
+    except ValueError:
+        return _error(400, 'since has to be a timestamp.')
+    stats['series'] = session.stats.series.since(since)
+    return jsonify(stats)
+
+
+@blueprint.route('/broadcasts/<stream_id>/analytics')
+def get_analytics(stream_id):
+    session = _get_session(stream_id)
+    if session.analytics is None:
+        return _error(404, 'Chat analytics are disabled.')
+    try:
+        top = min(int(request.args.get('top', 10)), 50)
+    except ValueError:
+        return _error(400, 'top has to be a number.')
+    return jsonify(session.analytics.snapshot(top))
+
+
+@blueprint.route('/broadcasts/<stream_id>/chat')
+def chat(stream_id):
+    global _streams
+    session = _get_session(stream_id)
+    # Without a position to resume from, a new reader only gets comments from now on.
+    after = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        after = int(after) if after is not None else session.feed.sequence
+    except ValueError:
+        abort(400)
+
+    with _streams_lock:
+        if _streams >= _max_streams():
+            response = _error(503, 'Too many open chat streams.')
+            response.headers['Retry-After'] = '10'
+            return response
+        _streams += 1
+
+    def release():
+        global _streams
+        with _streams_lock:
+            _streams -= 1
+
+    def events(after: int):
+        yield 'retry: 3000\n\n'
+        while not session.closed:
+            entries = session.feed.read(after, KEEPALIVE_INTERVAL)
+            if not entries:
+                yield ': keep-alive\n\n'
+                continue
+            for sequence, message in entries:
+                yield f'id: {sequence}\nevent: comment\ndata: {json.dumps(message.to_dict())}\n\n'
+            after = entries[-1][0]
+        yield 'event: end\ndata: {}\n\n'
+
+    response = Response(events(after), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the server closes the response, also if the client left before the first event.
+    response.call_on_close(release)
+    return response
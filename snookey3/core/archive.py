@@ -0,0 +1,264 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides an append-only on-disk archive of a broadcast's chat.
+
+Each broadcast gets a directory under ~/.Snookey3/archive holding three files:
+
+    meta.json   the broadcast id and the time the archive was started
+    chat.log    a sequence of segments; each is a SEGMENT header followed by a (optionally zlib
+                compressed) payload of length-prefixed records, one JSON array per comment
+    chat.idx    one fixed-size INDEX entry per segment: the segment's first timestamp and its offset
+
+Segments are written by a background thread, which batches comments and only fsyncs every few
+seconds. Readers memory-map the index and binary search it, so seeking to a point in a long
+broadcast only decodes the segment it falls into.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+from queue import Queue, Empty
+from threading import Thread
+from time import monotonic, time
+
+from snookey3 import DATA_DIR
+from .chat import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.path.join(DATA_DIR, 'archive')
+
+# payload length, flags, record count, first timestamp
+SEGMENT = struct.Struct('<IBId')
+# first timestamp, segment offset
+INDEX = struct.Struct('<dQ')
+RECORD_LENGTH = struct.Struct('<I')
+
+COMPRESSED = 1
+
+DEFAULT_SEGMENT_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_FSYNC_INTERVAL = 5.0
+
+
+def _encode(message: ChatMessage) -> bytes:
+    record = json.dumps([message.id, message.author, message.body, message.created],
+                        separators=(',', ':'), ensure_ascii=False).encode()
+    return RECORD_LENGTH.pack(len(record)) + record
+
+
+def _decode(payload: bytes):
+    offset = 0
+    while offset < len(payload):
+        length, = RECORD_LENGTH.unpack_from(payload, offset)
+        offset += RECORD_LENGTH.size
+        comment_id, author, body, created = json.loads(payload[offset:offset + length])
+        offset += length
+        yield ChatMessage(comment_id, author, body, created)
+
+
+class ChatArchive:
+
+    def __init__(self, broadcast_id: str, directory: str = ARCHIVE_DIR, compress: bool = True,
+                 segment_size: int = DEFAULT_SEGMENT_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        self.broadcast_id = broadcast_id
+        self.directory = os.path.join(directory, broadcast_id)
+        self.compress = compress
+        self.segment_size = segment_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.written = 0
+        self.segments = 0
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        meta_path = os.path.join(self.directory, 'meta.json')
+        if not os.path.exists(meta_path):
+            with open(meta_path, 'w') as meta_file:
+                json.dump({'broadcast_id': broadcast_id, 'started': time()}, meta_file)
+
+        self._log = open(os.path.join(self.directory, 'chat.log'), 'ab')
+        self._index = open(os.path.join(self.directory, 'chat.idx'), 'ab')
+        self._last_timestamp = 0.0
+        self._queue = Queue()
+        self._thread = Thread(target=self._run, name='ChatArchive', daemon=True)
+        self._thread.start()
+
+    def append(self, messages: list):
+        """Queues messages for writing. Never blocks on disk."""
+        if messages:
+            self._queue.put(messages)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write_segment(self, batch: list):
+        # The index has to be sorted for binary search, even if comment timestamps aren't.
+        first_timestamp = max(batch[0].created, self._last_timestamp)
+        self._last_timestamp = max(first_timestamp, max(message.created for message in batch))
+
+        payload = b''.join(_encode(message) for message in batch)
+        flags = 0
+        if self.compress:
+            compressed = zlib.compress(payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+                flags |= COMPRESSED
+
+        offset = self._log.tell()
+        self._log.write(SEGMENT.pack(len(payload), flags, len(batch), first_timestamp))
+        self._log.write(payload)
+        # The index entry is written after the segment, so readers never find an entry pointing past the log.
+        self._log.flush()
+        self._index.write(INDEX.pack(first_timestamp, offset))
+        self._index.flush()
+
+        self.written += len(batch)
+        self.segments += 1
+
+    def _sync(self):
+        os.fsync(self._log.fileno())
+        os.fsync(self._index.fileno())
+
+    def _run(self):
+        batch = []
+        closing = False
+        batch_started = monotonic()
+        last_sync = monotonic()
+
+        while not closing:
+            try:
+                messages = self._queue.get(timeout=self.flush_interval)
+            except Empty:
+                messages = []
+            if messages is None:
+                closing = True
+            elif messages:
+                if not batch:
+                    batch_started = monotonic()
+                batch.extend(messages)
+
+            now = monotonic()
+            if batch and (closing or len(batch) >= self.segment_size or now - batch_started >= self.flush_interval):
+                try:
+                    for start in range(0, len(batch), self.segment_size):
+                        self._write_segment(batch[start:start + self.segment_size])
+                    if closing or now - last_sync >= self.fsync_interval:
+                        self._sync()
+                        last_sync = now
+                except OSError:
+                    logger.exception('Could not write to the chat archive.')
+                batch = []
+
+        try:
+            self._sync()
+        except OSError:
+            logger.exception('Could not sync the chat archive.')
+        self._log.close()
+        self._index.close()
+
+
+class ChatArchiveReader:
+
+    def __init__(self, broadcast_id: str, directory: str = ARCHIVE_DIR):
+        self.directory = os.path.join(directory, broadcast_id)
+        with open(os.path.join(self.directory, 'meta.json')) as meta_file:
+            self.meta = json.load(meta_file)
+        self._log = open(os.path.join(self.directory, 'chat.log'), 'rb')
+        self._index_file = open(os.path.join(self.directory, 'chat.idx'), 'rb')
+        self._index = None
+        self._load_index()
+
+    def _load_index(self):
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        size = os.fstat(self._index_file.fileno()).st_size
+        # A crash can leave a partially written entry at the end, which is ignored.
+        self.segments = size // INDEX.size
+        if self.segments:
+            self._index = mmap.mmap(self._index_file.fileno(), self.segments * INDEX.size, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self._index is not None:
+            self._index.close()
+        self._index_file.close()
+        self._log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def started(self) -> float:
+        return self.meta['started']
+
+    def _entry(self, segment: int):
+        return INDEX.unpack_from(self._index, segment * INDEX.size)
+
+    def _find_segment(self, timestamp: float) -> int:
+        """Returns the last segment starting at or before timestamp."""
+        low, high = 0, self.segments
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] <= timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return max(low - 1, 0)
+
+    def _read_segment(self, offset: int) -> list:
+        self._log.seek(offset)
+        header = self._log.read(SEGMENT.size)
+        if len(header) < SEGMENT.size:
+            return []
+        length, flags, count, _ = SEGMENT.unpack(header)
+        payload = self._log.read(length)
+        if len(payload) < length:
+            return []
+        if flags & COMPRESSED:
+            payload = zlib.decompress(payload)
+        return list(_decode(payload))
+
+    def read(self, start: float = 0, end: float = None):
+        """Yields the comments posted between start and end, in seconds since the archive was started."""
+        self._load_index()
+        if not self.segments:
+            return
+
+        start_timestamp = self.started + start
+        end_timestamp = self.started + end if end is not None else None
+        for segment in range(self._find_segment(start_timestamp), self.segments):
+            timestamp, offset = self._entry(segment)
+            if end_timestamp is not None and timestamp > end_timestamp:
+                return
+            for message in self._read_segment(offset):
+                if message.created < start_timestamp:
+                    continue
+                if end_timestamp is not None and message.created > end_timestamp:
+                    return
+                yield message
@@ -0,0 +1,127 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module keeps track of which subreddits currently accept broadcasts.
+
+Reddit answers a broadcast creation with a 503 when a subreddit isn't accepting broadcasts at the
+moment. That is the only signal known to be reliable, and there is no way to ask without creating a
+broadcast, so availability is learned from creation attempts alone. Given several subreddits, they are
+tried one at a time until one accepts the broadcast. Results are cached briefly, available subreddits
+for a short while and unavailable ones a little longer, since a full subreddit rarely frees up within
+seconds; subreddits that recently turned a broadcast down are tried last.
+"""
+
+import logging
+from threading import Lock
+from time import monotonic
+
+from snookey3 import config
+from .exceptions import UnsuccessfulRequestException
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 30
+DEFAULT_NEGATIVE_TTL = 120
+
+
+class AvailabilityCache:
+
+    def __init__(self, ttl: float = DEFAULT_TTL, negative_ttl: float = DEFAULT_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = {}
+        self._lock = Lock()
+
+    def get(self, subreddit: str):
+        """Returns True or False while a result is cached, None otherwise."""
+        with self._lock:
+            entry = self._entries.get(subreddit.lower())
+            if entry is None:
+                return None
+            available, expires = entry
+            if expires <= monotonic():
+                del self._entries[subreddit.lower()]
+                return None
+            return available
+
+    def put(self, subreddit: str, available: bool):
+        ttl = self.ttl if available else self.negative_ttl
+        with self._lock:
+            self._entries[subreddit.lower()] = (available, monotonic() + ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class AvailabilityTracker:
+
+    def __init__(self, reddit, cache: AvailabilityCache = None):
+        self.reddit = reddit
+        self.cache = cache if cache is not None else get_cache()
+
+    def unavailable(self, subreddits: list) -> set:
+        """Returns the subreddits that turned a broadcast down recently."""
+        return {subreddit for subreddit in subreddits if self.cache.get(subreddit) is False}
+
+    def post(self, title: str, subreddit: str):
+        """Creates a broadcast like BroadcastManager.post, caching whether the subreddit accepted it."""
+        try:
+            broadcast = self.reddit.broadcast.post(title, subreddit)
+        except UnsuccessfulRequestException as e:
+            if e.status_code == 503:
+                self.cache.put(subreddit, False)
+            raise
+        self.cache.put(subreddit, True)
+        return broadcast
+
+    def post_first_available(self, title: str, subreddits: list):
+        """
+        Creates a broadcast in the first subreddit of the ordered list that accepts it. Subreddits that
+        recently turned a broadcast down are only tried after all the others. Raises the last
+        UnsuccessfulRequestException if none of them worked.
+        """
+        unavailable = self.unavailable(subreddits)
+        candidates = [subreddit for subreddit in subreddits if subreddit not in unavailable] + \
+                     [subreddit for subreddit in subreddits if subreddit in unavailable]
+
+        error = None
+        for subreddit in candidates:
+            try:
+                return self.post(title, subreddit)
+            except UnsuccessfulRequestException as e:
+                if e.status_code != 503:
+                    raise
+                logger.info('r/%s is unavailable, trying the next subreddit.', subreddit)
+                error = e
+        if error is None:
+            raise UnsuccessfulRequestException(400, b'No subreddit was given.')
+        raise error
+
+
+_cache = None
+_cache_lock = Lock()
+
+
+def get_cache() -> AvailabilityCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AvailabilityCache(config.get('AVAILABILITY_TTL', DEFAULT_TTL),
+                                       config.get('AVAILABILITY_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL))
+    return _cache
@@ -15,13 +15,13 @@
 #  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
 
 import logging
-from uuid import uuid4
 
 from flask import Flask, request, abort
 
 from snookey3.version import __title__
 from .reddit import r
 from .exceptions import UnsuccessfulRequestException
+from .states import store
 
 logger = logging.getLogger(__name__)
 
@@ -34,14 +34,21 @@ def callback():
     if error:
         logger.error(error)
     state = request.args.get('state', '')
-    if not is_valid_state(state):
+    try:
+        account = store.claim(state)
+    except KeyError:
         logger.warning('Received invalid state: %s', state)
         abort(403)
 
     code = request.args.get('code')
+    reddit = r
+    if account is not None:
+        # Only set for states handed out for additional accounts, see snookey3.core.sessions.
+        from .sessions import get_manager
+        reddit = get_manager().account(account).reddit
 
     try:
-        r.auth.authorize(code)
+        reddit.auth.authorize(code)
     except UnsuccessfulRequestException as e:
         logger.error('Token not found. Status code: %i. Response: %s', e.status_code, e.response_content)
         message = "Couldn't obtain a token."
@@ -66,16 +73,9 @@ def callback():
     <body>{__title__.replace("3", "<span style='color: #488cfa'>3</span>")} - {message}</body>"""
 
 
-valid_states = []
-
-
 def is_valid_state(state: str) -> bool:
-    if state in valid_states:
-        return True
-    return False
+    return store.consume(state)
 
 
 def create_state() -> str:
-    state = str(uuid4())
-    valid_states.append(state)
-    return state
+    return store.create()
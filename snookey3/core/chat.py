@@ -0,0 +1,229 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides the Qt-independent part of the chat ingestion pipeline.
+
+Websocket frames are fed in by whichever thread receives them, parsed and filtered there, and queued
+until the consumer drains them in batches. The queue is bounded; when the consumer falls behind, the
+oldest comments are dropped rather than letting memory grow.
+"""
+
+import json
+import logging
+from collections import deque, OrderedDict
+from threading import Lock
+from time import monotonic, time
+from typing import TYPE_CHECKING
+
+from .analytics import ChatAnalytics
+
+if TYPE_CHECKING:
+    from .filters import FilterEngine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PENDING = 5000
+DEFAULT_DEDUPE_WINDOW = 1000
+
+
+class ChatMessage:
+
+    __slots__ = ('id', 'author', 'body', 'created', 'received', 'flags', 'status', 'height', 'layout_width')
+
+    HIGHLIGHTED = 1
+    OWN = 2
+
+    def __init__(self, id: str, author: str, body: str, created: float = None, flags: int = 0, status: str = None):
+        self.id = id
+        self.author = author
+        self.body = body
+        self.created = created if created is not None else time()
+        self.received = monotonic()
+        self.flags = flags
+        self.status = status
+        # Render cache, filled in by the view: the row height for the width it was laid out at.
+        self.height = 0
+        self.layout_width = 0
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> 'ChatMessage':
+        comment_id = payload.get('_id36') or payload.get('id') or payload.get('name')
+        created = payload.get('created_utc')
+        return cls(str(comment_id) if comment_id else None,
+                   str(payload['author']),
+                   str(payload['body']),
+                   float(created) if created else None)
+
+    @property
+    def key(self):
+        if self.id is not None:
+            return self.id
+        return self.author, self.body, self.created
+
+    def to_dict(self) -> dict:
+        return {'id': self.id, 'author': self.author, 'body': self.body, 'created': self.created}
+
+
+class ConnectionStats:
+
+    def __init__(self):
+        self.connects = 0
+        self.reconnects = 0
+        self.stalls = 0
+        self.connected_since = None
+        self.disconnected_since = monotonic()
+        self.downtime = 0.0
+        self.last_activity = None
+
+    @property
+    def connected(self) -> bool:
+        return self.connected_since is not None
+
+    def on_connected(self):
+        now = monotonic()
+        if self.connects:
+            self.reconnects += 1
+            self.downtime += now - self.disconnected_since
+        self.connects += 1
+        self.connected_since = now
+        self.disconnected_since = None
+        self.last_activity = now
+
+    def on_disconnected(self):
+        if self.connected_since is None:
+            return
+        self.connected_since = None
+        self.disconnected_since = monotonic()
+
+    def on_activity(self):
+        self.last_activity = monotonic()
+
+    def as_dict(self) -> dict:
+        now = monotonic()
+        downtime = self.downtime
+        if self.connects and self.disconnected_since is not None:
+            downtime += now - self.disconnected_since
+        return {'connected': self.connected,
+                'connects': self.connects,
+                'reconnects': self.reconnects,
+                'stalls': self.stalls,
+                'downtime': round(downtime, 3),
+                'uptime': round(now - self.connected_since, 3) if self.connected_since is not None else 0}
+
+
+class ChatPipeline:
+
+    def __init__(self, max_pending: int = DEFAULT_MAX_PENDING, dedupe_window: int = DEFAULT_DEDUPE_WINDOW,
+                 analytics: ChatAnalytics = None, filters: 'FilterEngine' = None):
+        self.max_pending = max_pending
+        self.dedupe_window = dedupe_window
+        # Both run on the feeding thread, so neither costs the consumer anything.
+        self.analytics = analytics
+        self.filters = filters
+        self._pending = deque()
+        self._seen = OrderedDict()
+        self._lock = Lock()
+        self.received = 0
+        self.malformed = 0
+        self.ignored = 0
+        self.duplicates = 0
+        self.filtered = 0
+        self.dropped = 0
+        self.delivered = 0
+        self.batches = 0
+
+    def parse(self, frame: str):
+        try:
+            message = json.loads(frame)
+        except ValueError:
+            self.malformed += 1
+            logger.warning('Received a malformed chat frame.')
+            return None
+
+        if not isinstance(message, dict) or message.get('type') != 'new_comment':
+            self.ignored += 1
+            return None
+
+        try:
+            return ChatMessage.from_payload(message['payload'])
+        except (KeyError, TypeError, ValueError):
+            self.malformed += 1
+            logger.warning('Received a chat comment without the expected payload.')
+            return None
+
+    def feed(self, frame: str) -> bool:
+        """Parses a frame and queues it. Returns True if the queue was empty before, i.e. a drain is due."""
+        self.received += 1
+        comment = self.parse(frame)
+        if comment is None:
+            return False
+        return self.put(comment)
+
+    def _is_duplicate(self, comment: ChatMessage) -> bool:
+        # Comments replayed by the server after a reconnect have been seen already.
+        key = comment.key
+        if key in self._seen:
+            return True
+        self._seen[key] = None
+        if len(self._seen) > self.dedupe_window:
+            self._seen.popitem(last=False)
+        return False
+
+    def put(self, comment: ChatMessage) -> bool:
+        if self.filters is not None and not self.filters.apply(comment):
+            self.filtered += 1
+            return False
+        with self._lock:
+            if self._is_duplicate(comment):
+                self.duplicates += 1
+                return False
+            was_empty = not self._pending
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+            self._pending.append(comment)
+        if self.analytics is not None:
+            self.analytics.add((comment,))
+        return was_empty
+
+    def drain(self) -> list:
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+        if batch:
+            self.delivered += len(batch)
+            self.batches += 1
+        return batch
+
+    def stats(self) -> dict:
+        with self._lock:
+            queue_depth = len(self._pending)
+        stats = {'received': self.received,
+                 'malformed': self.malformed,
+                 'ignored': self.ignored,
+                 'duplicates': self.duplicates,
+                 'filtered': self.filtered,
+                 'queue_depth': queue_depth,
+                 'dropped': self.dropped,
+                 'delivered': self.delivered,
+                 'batches': self.batches,
+                 # Comments that shared a batch with others instead of costing their own GUI update.
+                 'coalesced': self.delivered - self.batches}
+        if self.filters is not None:
+            stats['filters'] = self.filters.stats()
+        return stats
@@ -0,0 +1,119 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides an encrypted on-disk store for refresh tokens.
+
+Tokens are encrypted with a key kept in a separate, owner-only file next to them, which keeps them
+out of plain sight in backups and logs. All reads and writes happen under a file lock, so several
+running instances can share the store.
+"""
+
+import json
+import logging
+import os
+from time import time
+
+from snookey3 import DATA_DIR
+from snookey3.utils.filelock import FileLock
+
+logger = logging.getLogger(__name__)
+
+
+class CredentialStore:
+
+    def __init__(self, directory: str = os.path.join(DATA_DIR, 'credentials')):
+        self.directory = directory
+        self.path = os.path.join(directory, 'tokens.bin')
+        self.key_path = os.path.join(directory, 'tokens.key')
+        self.lock = FileLock(os.path.join(directory, 'tokens.lock'))
+        self._fernet = None
+
+    def _ensure_directory(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, mode=0o700)
+
+    def _get_fernet(self):
+        if self._fernet is not None:
+            return self._fernet
+
+        from cryptography.fernet import Fernet
+
+        if os.path.exists(self.key_path):
+            with open(self.key_path, 'rb') as key_file:
+                key = key_file.read()
+        else:
+            key = Fernet.generate_key()
+            fd = os.open(self.key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as key_file:
+                key_file.write(key)
+
+        self._fernet = Fernet(key)
+        return self._fernet
+
+    def _read(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+
+        from cryptography.fernet import InvalidToken
+
+        with open(self.path, 'rb') as tokens_file:
+            encrypted = tokens_file.read()
+        try:
+            return json.loads(self._get_fernet().decrypt(encrypted))
+        except (InvalidToken, ValueError):
+            logger.warning('Stored credentials could not be decrypted, ignoring them.')
+            return {}
+
+    def _write(self, tokens: dict):
+        encrypted = self._get_fernet().encrypt(json.dumps(tokens).encode())
+        temp_path = self.path + '.tmp'
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as tokens_file:
+            tokens_file.write(encrypted)
+            tokens_file.flush()
+            os.fsync(tokens_file.fileno())
+        os.replace(temp_path, self.path)
+
+    def load(self, key: str) -> dict:
+        if not os.path.exists(self.path):
+            return None
+        with self.lock:
+            return self._read().get(key)
+
+    def keys(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        with self.lock:
+            return list(self._read())
+
+    def save(self, key: str, refresh_token: str):
+        self._ensure_directory()
+        with self.lock:
+            tokens = self._read()
+            tokens[key] = {'refresh_token': refresh_token, 'saved_time': time()}
+            self._write(tokens)
+        logger.debug('Saved credentials.')
+
+    def delete(self, key: str):
+        if not os.path.exists(self.path):
+            return
+        with self.lock:
+            tokens = self._read()
+            if tokens.pop(key, None) is not None:
+                self._write(tokens)
+        logger.debug('Deleted stored credentials.')
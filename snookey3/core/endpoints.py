@@ -0,0 +1,75 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides the base URLs of the Reddit APIs used by the clients.
+
+They default to Reddit's production hosts and can be pointed elsewhere, e.g. at the stand-in server
+in benchmarks.fakereddit, with an ENDPOINTS section in config.json:
+
+    "ENDPOINTS": {"OAUTH": "http://localhost:8080", "STRAPI": "http://localhost:8080",
+                  "TOKEN": "http://localhost:8080", "AUTHORIZE": "http://localhost:8080"}
+"""
+
+DEFAULT_OAUTH = 'https://oauth.reddit.com'
+DEFAULT_STRAPI = 'https://strapi.reddit.com'
+DEFAULT_TOKEN = 'https://ssl.reddit.com'
+DEFAULT_AUTHORIZE = 'https://www.reddit.com'
+
+
+class Endpoints:
+
+    def __init__(self,
+                 oauth: str = DEFAULT_OAUTH,
+                 strapi: str = DEFAULT_STRAPI,
+                 token: str = DEFAULT_TOKEN,
+                 authorize: str = DEFAULT_AUTHORIZE):
+        self.oauth = oauth.rstrip('/')
+        self.strapi = strapi.rstrip('/')
+        self.token = token.rstrip('/')
+        self.authorize = authorize.rstrip('/')
+
+    @classmethod
+    def from_config(cls, endpoints_config: dict = None) -> 'Endpoints':
+        endpoints_config = endpoints_config or {}
+        return cls(oauth=endpoints_config.get('OAUTH', DEFAULT_OAUTH),
+                   strapi=endpoints_config.get('STRAPI', DEFAULT_STRAPI),
+                   token=endpoints_config.get('TOKEN', DEFAULT_TOKEN),
+                   authorize=endpoints_config.get('AUTHORIZE', DEFAULT_AUTHORIZE))
+
+    @classmethod
+    def local(cls, base_url: str) -> 'Endpoints':
+        """Serves every API from one host, as the stand-in server does."""
+        return cls(base_url, base_url, base_url, base_url)
+
+    def access_token_url(self) -> str:
+        return self.token + '/api/v1/access_token'
+
+    def authorize_url(self) -> str:
+        return self.authorize + '/api/v1/authorize'
+
+    def me_url(self) -> str:
+        return self.oauth + '/api/v1/me'
+
+    def comment_url(self) -> str:
+        return self.oauth + '/api/comment/'
+
+    def broadcasts_url(self, subreddit: str) -> str:
+        return f'{self.strapi}/r/{subreddit}/broadcasts'
+
+    def video_url(self, stream_id: str) -> str:
+        return f'{self.strapi}/videos/{stream_id}'
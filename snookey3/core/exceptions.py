@@ -14,7 +14,10 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
 
-import psutil
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import psutil
 
 
 class UnsuccessfulRequestException(Exception):
@@ -24,5 +27,5 @@ class UnsuccessfulRequestException(Exception):
 
 
 class PortOccupiedException(Exception):
-    def __init__(self, process: psutil.Process):
+    def __init__(self, process: 'psutil.Process'):
         self.process = process
@@ -0,0 +1,301 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides the chat filters: muted authors, blocked keywords and patterns, and highlights.
+
+Rules are read from ~/.Snookey3/filters.json, for example
+
+    {"mute": ["someone"],
+     "block": {"keywords": ["spoiler"], "patterns": ["https?://\\\\S+"]},
+     "highlight": {"keywords": ["question"], "patterns": ["^!"], "authors": ["moderator"]}}
+
+and reloaded by a background thread whenever the file changes. Keywords match whole words, and both
+keywords and patterns ignore case. Each kind of rule is compiled into a single Matcher, so the cost of
+checking a message barely depends on how many rules there are.
+"""
+
+import json
+import logging
+import os
+import re
+from threading import Lock, Thread, Event as ThreadingEvent
+from time import perf_counter_ns, time
+
+from snookey3 import config, DATA_DIR
+from .chat import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+FILTERS_PATH = os.path.join(DATA_DIR, 'filters.json')
+RELOAD_INTERVAL = 2
+MAX_KEYWORD_LENGTH = 200
+STAGES = ('mute', 'block', 'highlight')
+WORD_PATTERN = re.compile(r'\w+')
+LEADING_FLAGS = re.compile(r'\(\?([aiLmsux]+)\)')
+# Backreferences and conditionals, which refer to groups by number or name.
+GROUP_REFERENCE = re.compile(r'\\[1-9]|\\g<|\(\?P=|\(\?\(')
+
+
+def _trie_pattern(node: dict) -> str:
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        pattern = '(?:' + pattern + ')?'
+    return pattern
+
+
+def _normalize_pattern(pattern: str) -> str:
+    """Wraps a pattern so it can be joined with others: leading inline flags become a scoped group."""
+    flags = LEADING_FLAGS.match(pattern)
+    if flags:
+        pattern = pattern[flags.end():]
+        scoped = 'i' + flags.group(1).replace('i', '')
+    else:
+        scoped = 'i'
+    # In verbose mode a trailing comment would swallow the closing parenthesis.
+    end = '\n)' if 'x' in scoped else ')'
+    return f'(?{scoped}:{pattern}{end}'
+
+
+class Matcher:
+    """
+    Matches a message against many keywords and patterns at once. Single-word keywords are looked up
+    in a set; the other keywords, factored into a trie, and the patterns make up one regular expression.
+    Patterns relying on their own group numbers or names are kept as separate expressions, since joining
+    would break them. Like keywords, patterns ignore case.
+    """
+
+    __slots__ = ('words', 'pattern', 'patterns')
+
+    def __init__(self, keywords: list = (), patterns: list = ()):
+        words = set()
+        trie = {}
+        for keyword in keywords:
+            keyword = str(keyword).strip().lower()
+            if not keyword or len(keyword) > MAX_KEYWORD_LENGTH:
+                continue
+            if WORD_PATTERN.fullmatch(keyword):
+                words.add(keyword)
+                continue
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = None
+
+        alternatives = []
+        separate = []
+        if trie:
+            alternatives.append(r'(?i:(?<!\w)' + _trie_pattern(trie) + r'(?!\w))')
+        for pattern in patterns:
+            try:
+                # Checked on its own first, so a stray parenthesis can't escape the group it is put in.
+                re.compile(pattern)
+                alternative = _normalize_pattern(pattern)
+                compiled = re.compile(alternative)
+            except (re.error, TypeError) as e:
+                logger.warning('Skipping the invalid filter pattern %r: %s', pattern, e)
+                continue
+            if compiled.groupindex or GROUP_REFERENCE.search(pattern):
+                separate.append(compiled)
+            else:
+                alternatives.append(alternative)
+
+        combined = None
+        if alternatives:
+            try:
+                combined = re.compile('|'.join(alternatives))
+            except (re.error, RecursionError, OverflowError) as e:
+                logger.warning('Could not combine the filter patterns, matching them one by one: %s', e)
+                separate.extend(re.compile(alternative) for alternative in alternatives)
+
+        self.words = frozenset(words)
+        self.pattern = combined
+        self.patterns = tuple(separate)
+
+    def __bool__(self):
+        return bool(self.words) or self.pattern is not None or bool(self.patterns)
+
+    def matches(self, text: str, words: list) -> bool:
+        """words are the lowercased words of text, as found by WORD_PATTERN."""
+        if self.words and not self.words.isdisjoint(words):
+            return True
+        if self.pattern is not None and self.pattern.search(text) is not None:
+            return True
+        return any(pattern.search(text) is not None for pattern in self.patterns)
+
+
+class FilterRules:
+
+    def __init__(self, muted: set = frozenset(), blocked: Matcher = Matcher(), highlighted: Matcher = Matcher(),
+                 highlighted_authors: set = frozenset(), size: int = 0, loaded: float = None):
+        self.muted = muted
+        self.blocked = blocked
+        self.highlighted = highlighted
+        self.highlighted_authors = highlighted_authors
+        self.size = size
+        self.loaded = loaded
+        self.tokenize = bool(blocked.words or highlighted.words)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'FilterRules':
+        block = data.get('block') or {}
+        highlight = data.get('highlight') or {}
+        lists = (data.get('mute') or [], block.get('keywords') or [], block.get('patterns') or [],
+                 highlight.get('keywords') or [], highlight.get('patterns') or [], highlight.get('authors') or [])
+        # Reddit usernames are case-insensitive.
+        return cls(muted=frozenset(str(author).lower() for author in lists[0]),
+                   blocked=Matcher(lists[1], lists[2]),
+                   highlighted=Matcher(lists[3], lists[4]),
+                   highlighted_authors=frozenset(str(author).lower() for author in lists[5]),
+                   size=sum(len(rules) for rules in lists),
+                   loaded=time())
+
+
+class RuleFile:
+    """Keeps the compiled rules of a file current. Rules are swapped as a whole, so readers need no lock."""
+
+    def __init__(self, path: str = FILTERS_PATH, reload_interval: float = RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.rules = FilterRules()
+        self.version = 0
+        self._mtime = None
+        self._thread = None
+        self._stopped = ThreadingEvent()
+        self.reload()
+
+    def reload(self) -> bool:
+        """Loads the file if it changed since the last load. Broken files leave the current rules in place."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        if mtime is None:
+            rules = FilterRules()
+        else:
+            try:
+                with open(self.path, encoding='utf-8') as rules_file:
+                    data = json.load(rules_file)
+                rules = FilterRules.from_dict(data)
+            except (OSError, ValueError, AttributeError, re.error, RecursionError) as e:
+                logger.warning('Could not load the chat filters from %s: %s', self.path, e)
+                return False
+        self.rules = rules
+        self.version += 1
+        logger.info('Loaded %i chat filter rules.', rules.size)
+        return True
+
+    def start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._watch, name='FilterWatcher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _watch(self):
+        while not self._stopped.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception:
+                logger.exception('Reloading the chat filters failed.')
+
+
+class StageStats:
+
+    __slots__ = ('messages', 'matched', 'total_ns', 'max_ns')
+
+    def __init__(self):
+        self.messages = 0
+        self.matched = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, elapsed_ns: int, matched: bool):
+        self.messages += 1
+        self.matched += matched
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+    def as_dict(self) -> dict:
+        return {'messages': self.messages,
+                'matched': self.matched,
+                'mean_us': round(self.total_ns / self.messages / 1000, 2) if self.messages else 0,
+                'max_us': round(self.max_ns / 1000, 2)}
+
+
+class FilterEngine:
+    """Applies the rules of a RuleFile to comments, timing every stage. Meant to be used by one thread."""
+
+    def __init__(self, rule_file: RuleFile = None):
+        self.rule_file = rule_file or get_rule_file()
+        self.stages = {stage: StageStats() for stage in STAGES}
+
+    def apply(self, message: ChatMessage) -> bool:
+        """Returns False if the message should be dropped, and flags it if it should be highlighted."""
+        rules = self.rule_file.rules
+        author = message.author.lower()
+
+        started = perf_counter_ns()
+        muted = author in rules.muted
+        mute_done = perf_counter_ns()
+        self.stages['mute'].record(mute_done - started, muted)
+        if muted:
+            return False
+
+        # Splitting the body into words is paid for once, by the first stage that needs them.
+        body = message.body
+        words = WORD_PATTERN.findall(body.lower()) if rules.tokenize else ()
+        blocked = bool(rules.blocked) and rules.blocked.matches(body, words)
+        block_done = perf_counter_ns()
+        self.stages['block'].record(block_done - mute_done, blocked)
+        if blocked:
+            return False
+
+        highlighted = author in rules.highlighted_authors or \
+            (bool(rules.highlighted) and rules.highlighted.matches(body, words))
+        if highlighted:
+            message.flags |= ChatMessage.HIGHLIGHTED
+        self.stages['highlight'].record(perf_counter_ns() - block_done, highlighted)
+        return True
+
+    def stats(self) -> dict:
+        rules = self.rule_file.rules
+        return {'rules': rules.size,
+                'version': self.rule_file.version,
+                'stages': {stage: stats.as_dict() for stage, stats in self.stages.items()}}
+
+
+_rule_file = None
+_rule_file_lock = Lock()
+
+
+def get_rule_file() -> RuleFile:
+    global _rule_file
+    with _rule_file_lock:
+        if _rule_file is None:
+            _rule_file = RuleFile(config.get('FILTERS_PATH', FILTERS_PATH))
+            _rule_file.start()
+    return _rule_file
@@ -0,0 +1,186 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides a Qt-free live chat client for headless use.
+
+LiveChat keeps a broadcast's comment websocket connected from a background event loop, using aiohttp,
+and feeds frames into the same ChatPipeline as the GUI. Many LiveChats can share one EventLoopThread,
+so following a fleet of broadcasts takes a single thread and connection pool. ChatFeed keeps the most recent comments
+numbered in a ring buffer, so any number of readers can follow the chat at their own pace and
+resume from the last comment they saw.
+"""
+
+import asyncio
+import logging
+from threading import Thread, Condition
+
+from snookey3.utils.backoff import Backoff
+from snookey3.utils.events import Event
+from snookey3.utils.ringbuffer import RingBuffer
+from .chat import ChatPipeline, ConnectionStats
+
+logger = logging.getLogger(__name__)
+
+# Seconds between websocket pings; a missing pong drops the connection.
+HEARTBEAT = 10
+DEFAULT_HISTORY = 2000
+
+
+class EventLoopThread:
+    """Runs an asyncio event loop, and an aiohttp session on it, in a daemon thread."""
+
+    def __init__(self, name: str = 'LiveChat'):
+        self.loop = asyncio.new_event_loop()
+        self._session = None
+        self._thread = Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def session(self):
+        # Has to be created on the loop's own thread, i.e. from a coroutine running on it.
+        if self._session is None:
+            import aiohttp
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def stop(self):
+        if self._session is not None:
+            self.submit(self._session.close()).result()
+            self._session = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+class LiveChat:
+
+    def __init__(self, broadcast, pipeline: ChatPipeline = None, loop_thread: EventLoopThread = None):
+        self.broadcast = broadcast
+        self.pipeline = pipeline or ChatPipeline()
+        self.connection_stats = ConnectionStats()
+        # Emitted from the chat thread when comments are waiting in the pipeline.
+        self.pending = Event()
+        self.backoff = Backoff()
+        self._owns_loop_thread = loop_thread is None
+        self.loop_thread = loop_thread
+        self._task = None
+
+    def start(self):
+        if self.loop_thread is None:
+            self.loop_thread = EventLoopThread()
+        self.loop_thread.submit(self._start()).result()
+
+    def stop(self):
+        """Disconnects and waits until the connection is closed."""
+        if self._task is not None:
+            self.loop_thread.submit(self._stop()).result()
+            self._task = None
+        if self._owns_loop_thread and self.loop_thread is not None:
+            self.loop_thread.stop()
+            self.loop_thread = None
+
+    def stats(self) -> dict:
+        stats = self.pipeline.stats()
+        stats.update(self.connection_stats.as_dict())
+        return stats
+
+    async def _start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _fetch_url(self) -> str:
+        return await self.loop_thread.loop.run_in_executor(None, self.broadcast.live_comments_websocket)
+
+    async def _run(self):
+        url = None
+        failed_attempts = 0
+        session = self.loop_thread.session
+        while True:
+            try:
+                if url is None or failed_attempts:
+                    # The address itself may have rotated, so a failed attempt asks Reddit for a fresh one.
+                    url = await self._fetch_url()
+                async with session.ws_connect(url, heartbeat=HEARTBEAT) as websocket:
+                    self.connection_stats.on_connected()
+                    self.backoff.reset()
+                    failed_attempts = 0
+                    logger.info('Chat connected.')
+                    await self._receive(websocket)
+            except asyncio.CancelledError:
+                self.connection_stats.on_disconnected()
+                raise
+            except Exception:
+                logger.warning('Chat connection failed.', exc_info=True)
+                if not self.connection_stats.connected:
+                    failed_attempts += 1
+
+            self.connection_stats.on_disconnected()
+            delay = self.backoff.next()
+            logger.warning('Chat disconnected, reconnecting in %.1fs.', delay)
+            await asyncio.sleep(delay)
+
+    async def _receive(self, websocket):
+        import aiohttp
+
+        async for message in websocket:
+            self.connection_stats.on_activity()
+            if message.type == aiohttp.WSMsgType.TEXT:
+                if self.pipeline.feed(message.data):
+                    # Deferred, so frames that arrived together are delivered as one batch.
+                    self.loop_thread.loop.call_soon(self.pending.emit)
+            elif message.type == aiohttp.WSMsgType.ERROR:
+                break
+
+
+class ChatFeed:
+
+    def __init__(self, history: int = DEFAULT_HISTORY):
+        self.history = RingBuffer(history)
+        self.sequence = 0
+        self._condition = Condition()
+
+    def publish(self, messages: list):
+        with self._condition:
+            for message in messages:
+                self.sequence += 1
+                self.history.append((self.sequence, message))
+            self._condition.notify_all()
+
+    def read(self, after: int = 0, timeout: float = None) -> list:
+        """
+        Returns the (sequence, message) pairs published after the given sequence number, waiting up to
+        timeout seconds for new ones. Readers that fell behind the history skip to its oldest entry.
+        A sequence number ahead of the feed comes from before a restart, and reads from the start.
+        """
+        with self._condition:
+            if after > self.sequence:
+                after = 0
+            if self.sequence <= after and timeout:
+                self._condition.wait(timeout)
+            oldest = self.sequence - len(self.history) + 1
+            start = max(after + 1 - oldest, 0)
+            return [self.history[index] for index in range(start, len(self.history))]
@@ -0,0 +1,150 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides a queue that posts chat comments from a background thread.
+
+Submitting a comment returns immediately with an OutgoingMessage whose status is updated as it is
+sent. Posting a comment isn't idempotent, so only failures where Reddit certainly didn't take the comment
+are retried with backoff: rate limiting, and connections that couldn't be established. Server errors and
+timeouts after the request went out fail the message, and the user can send it again.
+"""
+
+import logging
+import sys
+from itertools import count
+from queue import Queue
+from threading import Thread, Event as ThreadingEvent
+
+from snookey3.utils.backoff import Backoff
+from snookey3.utils.events import Event
+from .exceptions import UnsuccessfulRequestException
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+
+RETRYABLE_STATUS_CODES = (429,)
+DEFAULT_MAX_ATTEMPTS = 4
+
+_local_ids = count(1)
+
+
+def _is_connect_error(error: Exception) -> bool:
+    """Whether the request failed before it was sent, i.e. while connecting."""
+    # The HTTP libraries are imported lazily elsewhere; an error can only come from one that is loaded.
+    requests = sys.modules.get('requests')
+    if requests is not None:
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(error, requests.exceptions.ConnectionError):
+            # Aborted connections are ConnectionErrors too, but the request may have gone out already.
+            from urllib3.exceptions import NewConnectionError
+            reason = error.args[0] if error.args else None
+            return isinstance(getattr(reason, 'reason', reason), NewConnectionError)
+    aiohttp = sys.modules.get('aiohttp')
+    if aiohttp is not None:
+        # Connection timeouts only got their own type in aiohttp 3.10.
+        connect_errors = (aiohttp.ClientConnectorError, getattr(aiohttp, 'ConnectionTimeoutError', ()))
+        return isinstance(error, connect_errors)
+    return False
+
+
+class OutgoingMessage:
+
+    __slots__ = ('local_id', 'text', 'status', 'attempts', 'comment', 'error')
+
+    def __init__(self, text: str):
+        self.local_id = next(_local_ids)
+        self.text = text
+        self.status = PENDING
+        self.attempts = 0
+        # The comment as returned by Reddit once it has been posted.
+        self.comment = None
+        self.error = None
+
+
+class Outbox:
+
+    def __init__(self, broadcast, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.broadcast = broadcast
+        self.max_attempts = max_attempts
+        self.status_changed = Event()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self._queue = Queue()
+        self._stopped = ThreadingEvent()
+        self._thread = Thread(target=self._run, name='Outbox', daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> OutgoingMessage:
+        message = OutgoingMessage(text)
+        self._queue.put(message)
+        return message
+
+    def stop(self):
+        self._stopped.set()
+        self._queue.put(None)
+
+    def stats(self) -> dict:
+        return {'queued': self._queue.qsize(), 'sent': self.sent, 'failed': self.failed, 'retried': self.retried}
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, UnsuccessfulRequestException):
+            return error.status_code in RETRYABLE_STATUS_CODES or b'RATELIMIT' in (error.response_content or b'')
+        return _is_connect_error(error)
+
+    def _send(self, message: OutgoingMessage):
+        backoff = Backoff(initial=2, maximum=30)
+        while not self._stopped.is_set():
+            message.attempts += 1
+            try:
+                # Rate limiting is taken care of by the client's governor, which holds comments back
+                # while the budget is exhausted.
+                message.comment = self.broadcast.post_comment(message.text)
+            except Exception as e:
+                message.error = e
+                if message.attempts < self.max_attempts and self._is_retryable(e):
+                    self.retried += 1
+                    delay = backoff.next()
+                    logger.warning('Comment could not be posted (%r), retrying in %.1fs.', e, delay)
+                    self._stopped.wait(delay)
+                    continue
+                if isinstance(e, UnsuccessfulRequestException):
+                    logger.warning('Comment could not be posted. Status code: %i. Response: %s',
+                                   e.status_code, e.response_content)
+                else:
+                    logger.exception('Comment could not be posted.')
+                message.status = FAILED
+                self.failed += 1
+            else:
+                message.error = None
+                message.status = SENT
+                self.sent += 1
+            self.status_changed.emit(message)
+            return
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            if message is None or self._stopped.is_set():
+                return
+            self._send(message)
@@ -0,0 +1,159 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides a priority-aware request governor driven by Reddit's X-Ratelimit headers.
+
+Reddit grants every OAuth client a number of requests per window and reports the remaining budget
+with each response. The governor treats that budget as a token bucket which refills when the window
+resets, and hands tokens to the most important waiting request first. Lower priorities have to leave
+a reserve in the bucket, so polling can never starve a token refresh or a broadcast creation.
+"""
+
+import logging
+from enum import IntEnum
+from threading import Condition
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 600
+DEFAULT_PERIOD = 600
+DEFAULT_BACKOFF = 10
+
+
+class Priority(IntEnum):
+    REFRESH = 0
+    BROADCAST = 1
+    COMMENT = 2
+    POLL = 3
+
+
+# Share of the window's budget that has to stay untouched for requests of a given priority to go through.
+RESERVES = {Priority.REFRESH: 0.0,
+            Priority.BROADCAST: 0.0,
+            Priority.COMMENT: 0.02,
+            Priority.POLL: 0.1}
+
+
+class RateLimiter:
+
+    def __init__(self, limit: int = DEFAULT_LIMIT, period: float = DEFAULT_PERIOD, reserves: dict = None):
+        self.limit = limit
+        self.period = period
+        self.reserves = dict(RESERVES if reserves is None else reserves)
+        self._remaining = float(limit)
+        self._reset_at = monotonic() + period
+        self._in_flight = 0
+        self._waiting = [0] * len(Priority)
+        self._condition = Condition()
+
+    def _refill(self, now: float):
+        if now >= self._reset_at:
+            self._remaining = float(self.limit)
+            self._reset_at = now + self.period
+
+    def _delay(self, priority: Priority, now: float) -> float:
+        """Returns 0 if a request of the given priority may go now, otherwise how long to wait."""
+        self._refill(now)
+        if any(self._waiting[:priority]):
+            return self._reset_at - now
+        if self._remaining - self.limit * self.reserves.get(priority, 0.0) >= 1:
+            return 0
+        return self._reset_at - now
+
+    def _take(self):
+        self._remaining -= 1
+        self._in_flight += 1
+
+    def acquire(self, priority: Priority = Priority.POLL):
+        with self._condition:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    delay = self._delay(priority, monotonic())
+                    if delay <= 0:
+                        self._take()
+                        return
+                    logger.debug('Rate limited, %s request waiting up to %.1fs.', priority.name, delay)
+                    self._condition.wait(delay)
+            finally:
+                self._waiting[priority] -= 1
+                self._condition.notify_all()
+
+    async def acquire_async(self, priority: Priority = Priority.POLL):
+        import asyncio
+
+        with self._condition:
+            self._waiting[priority] += 1
+        try:
+            while True:
+                with self._condition:
+                    delay = self._delay(priority, monotonic())
+                    if delay <= 0:
+                        self._take()
+                        return
+                # Event loops can't block on the condition, so poll it at a short interval instead.
+                await asyncio.sleep(min(delay, 0.05))
+        finally:
+            with self._condition:
+                self._waiting[priority] -= 1
+                self._condition.notify_all()
+
+    def release(self, headers=None, status_code: int = None):
+        with self._condition:
+            self._in_flight = max(self._in_flight - 1, 0)
+            if headers is not None:
+                self._learn(headers, status_code)
+            self._condition.notify_all()
+
+    def _learn(self, headers, status_code: int):
+        now = monotonic()
+        remaining = headers.get('X-Ratelimit-Remaining')
+        reset = headers.get('X-Ratelimit-Reset')
+        used = headers.get('X-Ratelimit-Used')
+
+        try:
+            if reset is not None:
+                self._reset_at = now + float(reset)
+            if remaining is not None:
+                # Requests still in flight were already charged locally but may not be counted by the server yet.
+                self._remaining = max(float(remaining) - self._in_flight, 0.0)
+                if used is not None:
+                    self.limit = int(float(remaining) + float(used))
+        except ValueError:
+            logger.warning('Malformed rate limit headers: remaining=%s, reset=%s, used=%s', remaining, reset, used)
+
+        if status_code == 429:
+            self._remaining = 0.0
+            if reset is None:
+                retry_after = headers.get('Retry-After')
+                try:
+                    self._reset_at = now + float(retry_after)
+                except (TypeError, ValueError):
+                    self._reset_at = now + DEFAULT_BACKOFF
+            logger.warning('Received 429, holding requests for %.1fs.', self._reset_at - now)
+
+    def budget(self) -> dict:
+        with self._condition:
+            now = monotonic()
+            self._refill(now)
+            return {'limit': self.limit,
+                    'remaining': int(self._remaining),
+                    'reset_in': round(self._reset_at - now, 3),
+                    'in_flight': self._in_flight,
+                    'waiting': {priority.name: self._waiting[priority] for priority in Priority}}
@@ -16,26 +16,51 @@
 
 import logging
 import urllib.parse
-from time import time
-
-import requests
-import requests.auth
+from threading import Lock
+from time import monotonic, time
+from typing import TYPE_CHECKING
 
 from snookey3 import config
+from snookey3.utils.events import Event
+from .credentials import CredentialStore
+from .endpoints import Endpoints
 from .exceptions import UnsuccessfulRequestException
+from .ratelimit import RateLimiter, Priority
+from .refresher import TokenRefresher, RETRY_AFTER, is_rejected
+from .transport import Transport
+
+if TYPE_CHECKING:
+    import requests
 
 logger = logging.getLogger(__name__)
 
 
-REFRESH_AFTER = 2700
+DEFAULT_EXPIRES_IN = 3600
+RTMP_URL = 'rtmp://ingest.redd.it/inbound/'
+# Requests only refresh the token themselves when the background refresher hasn't managed to in time.
+EXPIRY_MARGIN = 60
+# How long the account profile (username, karma, ...) is reused before it is fetched again.
+PROFILE_TTL = 15 * 60
 
 
 class Reddit:
 
-    def __init__(self, client_id: str, redirect_uri: str, user_agent: str):
+    def __init__(self, client_id: str, redirect_uri: str, user_agent: str, transport: Transport = None,
+                 refresher: TokenRefresher = None, credentials: CredentialStore = None, endpoints: Endpoints = None):
         self.client_id = client_id
         self.redirect_uri = redirect_uri
         self.user_agent = user_agent
+        self.endpoints = endpoints or Endpoints.from_config(config.get('ENDPOINTS'))
+        self.credentials = credentials
+        self._owns_transport = transport is None
+        self.transport = transport or Transport.from_config(config.get('TRANSPORT'))
+        self._owns_refresher = refresher is None
+        self.refresher = refresher or TokenRefresher()
+        self.ratelimit = RateLimiter()
+        self.profile_ttl = config.get('PROFILE_TTL', PROFILE_TTL)
+        self._profile = None
+        self._profile_time = 0
+        self._profile_lock = Lock()
         self.auth = Auth(self)
         self.broadcast = BroadcastManager(self)
 
@@ -47,35 +72,80 @@ class Reddit:
 
         return headers
 
-    def get(self, url: str, params: dict = None, data: dict = None) -> requests.models.Response:
-        if self.auth.authorized_time and (time() - self.auth.authorized_time >= REFRESH_AFTER):
-            self.auth.refresh()
-            logger.info('Refreshing the token.')
+    def request(self, method: str, url: str, priority: Priority = Priority.POLL,
+                **kwargs) -> 'requests.models.Response':
+        self.ratelimit.acquire(priority)
+        try:
+            response = self.transport.request(method, url, **kwargs)
+        except BaseException:
+            self.ratelimit.release()
+            raise
+        self.ratelimit.release(response.headers, response.status_code)
+        return response
 
-        headers = self.headers()
-        response = requests.get(url, params=params, headers=headers, data=data)
+    def get(self, url: str, params: dict = None, data: dict = None,
+            priority: Priority = Priority.POLL, headers: dict = None) -> 'requests.models.Response':
+        self.auth.ensure_fresh()
+        headers = dict(self.headers(), **(headers or {}))
+        response = self.request('GET', url, priority, params=params, headers=headers, data=data)
 
         return response
 
-    def post(self, url: str, params: dict = None, data: dict = None) -> requests.models.Response:
-        if self.auth.authorized_time and (time() - self.auth.authorized_time >= REFRESH_AFTER):
-            self.auth.refresh()
-            logger.info('Refreshing the token.')
-
+    def post(self, url: str, params: dict = None, data: dict = None,
+             priority: Priority = Priority.COMMENT) -> 'requests.models.Response':
+        self.auth.ensure_fresh()
         headers = self.headers()
-        response = requests.post(url, params=params, headers=headers, data=data)
+        response = self.request('POST', url, priority, params=params, headers=headers, data=data)
 
         return response
 
-    def username(self):
-        response = self.get('https://oauth.reddit.com/api/v1/me')
+    def close(self):
+        if self._owns_refresher:
+            self.refresher.stop()
+        else:
+            self.refresher.cancel(self.auth)
+        if self._owns_transport:
+            self.transport.close()
+
+    def cached_profile(self):
+        """Returns the account profile if a fresh one is cached, without any request."""
+        if self._profile is not None and monotonic() - self._profile_time < self.profile_ttl:
+            return self._profile
+        return None
+
+    def profile(self) -> dict:
+        """Returns the /api/v1/me data of the authorized account, cached until it expires or the grant changes."""
+        profile = self.cached_profile()
+        if profile is not None:
+            return profile
+
+        with self._profile_lock:
+            # Callers that waited for the lock get the profile the first one fetched.
+            profile = self.cached_profile()
+            if profile is not None:
+                return profile
+
+            generation = self.auth.grant
+            response = self.get(self.endpoints.me_url())
+            try:
+                profile = response.json()
+            except ValueError:
+                profile = None
+            if not isinstance(profile, dict) or 'name' not in profile:
+                raise UnsuccessfulRequestException(response.status_code, response.content)
+            if generation == self.auth.grant:
+                self._profile = profile
+                self._profile_time = monotonic()
+            return profile
+
+    def invalidate_profile(self):
+        self._profile = None
 
+    def username(self):
         try:
-            username = response.json()['name']
-        except (ValueError, KeyError):
+            return self.profile()['name']
+        except UnsuccessfulRequestException:
             return None
-        else:
-            return username
 
 
 class Auth:
@@ -85,6 +155,19 @@ class Auth:
         self.access_token = None
         self.refresh_token = None
         self.authorized_time = None
+        self.expires_in = DEFAULT_EXPIRES_IN
+        self.credentials_key = reddit.client_id
+        self.authorized = Event()
+        # Counts grants, i.e. authorizations, restores and forgets, which may change the account behind the token.
+        self.grant = 0
+        self._refresh_lock = Lock()
+        self._generation = 0
+
+    @property
+    def expires_at(self):
+        if not self.authorized_time:
+            return None
+        return self.authorized_time + self.expires_in
 
     def url(self, state: str) -> str:
         params = {'client_id': self.reddit.client_id,
@@ -93,46 +176,139 @@ class Auth:
                   'redirect_uri': self.reddit.redirect_uri,
                   'scope': '*',
                   'duration': 'permanent'}
-        url = 'https://www.reddit.com/api/v1/authorize?' + urllib.parse.urlencode(params)
+        url = self.reddit.endpoints.authorize_url() + '?' + urllib.parse.urlencode(params)
         return url
 
+    def _request_token(self, data: dict) -> 'requests.models.Response':
+        from requests.auth import HTTPBasicAuth
+
+        auth = HTTPBasicAuth(self.reddit.client_id, '')
+        headers = {'User-agent': self.reddit.user_agent}
+        return self.reddit.request('POST', self.reddit.endpoints.access_token_url(), Priority.REFRESH,
+                                   auth=auth,
+                                   data=data,
+                                   headers=headers)
+
+    def _update(self, token: dict, refresh_token: str):
+        self.access_token = token['access_token']
+        refresh_token_changed = refresh_token != self.refresh_token
+        self.refresh_token = refresh_token
+        self.expires_in = token.get('expires_in', DEFAULT_EXPIRES_IN)
+        self.authorized_time = time()
+        self._generation += 1
+        self.reddit.refresher.schedule(self)
+
+        if refresh_token_changed and self.reddit.credentials:
+            try:
+                self.reddit.credentials.save(self.credentials_key, refresh_token)
+            except OSError:
+                logger.exception('Could not save the credentials.')
+
     def authorize(self, code):
-        auth = requests.auth.HTTPBasicAuth(self.reddit.client_id, '')
         data = {'grant_type': 'authorization_code',
                 'code': code,
                 'redirect_uri': self.reddit.redirect_uri}
-        headers = {'User-agent': self.reddit.user_agent}
-        response = requests.post('https://ssl.reddit.com/api/v1/access_token',
-                                 auth=auth,
-                                 data=data,
-                                 headers=headers)
 
-        try:
-            self.access_token = response.json()['access_token']
-            self.refresh_token = response.json()['refresh_token']
-        except (KeyError, ValueError):
-            raise UnsuccessfulRequestException(response.status_code, response.content)
-        else:
-            self.authorized_time = time()
+        with self._refresh_lock:
+            response = self._request_token(data)
+            try:
+                token = response.json()
+                self._update(token, token['refresh_token'])
+            except (KeyError, ValueError, TypeError):
+                raise UnsuccessfulRequestException(response.status_code, response.content)
+            self._new_grant()
+
+        self.authorized.emit()
+
+    def _new_grant(self):
+        self.grant += 1
+        self.reddit.invalidate_profile()
 
     def refresh(self):
-        if not self.refresh_token:
-            return
-        auth = requests.auth.HTTPBasicAuth(self.reddit.client_id, '')
-        data = {'grant_type': 'refresh_token',
-                'refresh_token': self.refresh_token}
-        headers = {'User-agent': self.reddit.user_agent}
-        response = requests.post('https://ssl.reddit.com/api/v1/access_token',
-                                 auth=auth,
-                                 data=data,
-                                 headers=headers)
+        generation = self._generation
 
+        with self._refresh_lock:
+            if not self.refresh_token:
+                return
+            if self._generation != generation:
+                # Another thread refreshed the token while this one was waiting for the lock.
+                return
+
+            logger.info('Refreshing the token.')
+            # Without an access token, this is the first refresh of restored credentials.
+            restoring = self.access_token is None
+            data = {'grant_type': 'refresh_token',
+                    'refresh_token': self.refresh_token}
+            response = self._request_token(data)
+            try:
+                token = response.json()
+                # Reddit may rotate the refresh token, in which case the old one stops working.
+                self._update(token, token.get('refresh_token', self.refresh_token))
+            except (KeyError, ValueError, TypeError):
+                raise UnsuccessfulRequestException(response.status_code, response.content)
+
+        if restoring:
+            logger.info('Restored the stored credentials.')
+            self.authorized.emit()
+
+    def ensure_fresh(self):
+        if self.authorized_time and time() >= self.expires_at - EXPIRY_MARGIN:
+            self.refresh()
+
+    def has_stored_credentials(self) -> bool:
+        if not self.reddit.credentials:
+            return False
         try:
-            self.access_token = response.json()['access_token']
-        except (KeyError, ValueError):
-            raise UnsuccessfulRequestException(response.status_code, response.content)
-        else:
-            self.authorized_time = time()
+            return self.reddit.credentials.load(self.credentials_key) is not None
+        except OSError:
+            logger.exception('Could not read the stored credentials.')
+            return False
+
+    def restore(self) -> bool:
+        if not self.reddit.credentials:
+            return False
+        try:
+            stored = self.reddit.credentials.load(self.credentials_key)
+        except OSError:
+            logger.exception('Could not read the stored credentials.')
+            return False
+        if not stored:
+            return False
+
+        with self._refresh_lock:
+            self.refresh_token = stored['refresh_token']
+            self._new_grant()
+        try:
+            self.refresh()
+        except UnsuccessfulRequestException as e:
+            if is_rejected(e):
+                logger.warning('Stored credentials were rejected. Status code: %i. Response: %s',
+                               e.status_code, e.response_content)
+                self.forget()
+                return False
+            logger.warning('Could not restore the stored credentials, retrying in %is. Status code: %i.',
+                           RETRY_AFTER, e.status_code)
+            self.reddit.refresher.schedule(self, RETRY_AFTER)
+            return False
+        except OSError:
+            # Reddit couldn't be reached. The refresh token is kept, and authorized fires once a retry succeeds.
+            logger.warning('Could not reach Reddit to restore the stored credentials, retrying in %is.',
+                           RETRY_AFTER, exc_info=True)
+            self.reddit.refresher.schedule(self, RETRY_AFTER)
+            return False
+
+        return self.access_token is not None
+
+    def forget(self):
+        with self._refresh_lock:
+            self.access_token = None
+            self.refresh_token = None
+            self.authorized_time = None
+            self._generation += 1
+            self._new_grant()
+        self.reddit.refresher.cancel(self)
+        if self.reddit.credentials:
+            self.reddit.credentials.delete(self.credentials_key)
 
 
 class BroadcastManager:
@@ -142,8 +318,8 @@ class BroadcastManager:
 
     def post(self, title: str, subreddit: str):
         title = urllib.parse.quote(title)
-        url = f'https://strapi.reddit.com/r/{subreddit}/broadcasts?title={title}'
-        response = self.reddit.post(url, data={})
+        url = f'{self.reddit.endpoints.broadcasts_url(subreddit)}?title={title}'
+        response = self.reddit.post(url, data={}, priority=Priority.BROADCAST)
 
         try:
             data = response.json()['data']
@@ -153,19 +329,20 @@ class BroadcastManager:
         except (KeyError, ValueError):
             raise UnsuccessfulRequestException(response.status_code, response.content)
         else:
-            return Broadcast(self.reddit, stream_id, streamer_key, stream_url)
+            return Broadcast(self.reddit, stream_id, streamer_key, stream_url, subreddit)
 
 
 class Broadcast(object):
 
-    def __init__(self, reddit: Reddit, stream_id: str, streamer_key: str, stream_url: str):
+    def __init__(self, reddit: Reddit, stream_id: str, streamer_key: str, stream_url: str, subreddit: str = None):
         self.reddit = reddit
         self.stream_id = stream_id
         self.streamer_key = streamer_key
         self.stream_url = stream_url
+        self.subreddit = subreddit
 
     def live_comments_websocket(self):
-        response = self.reddit.get(f'https://strapi.reddit.com/videos/{self.stream_id}')
+        response = self.reddit.get(self.reddit.endpoints.video_url(self.stream_id))
         try:
             live_comments_websocket = response.json()['data']['post']['liveCommentsWebsocket']
         except (KeyError, ValueError):
@@ -177,13 +354,40 @@ class Broadcast(object):
         params = {'api_type': 'json',
                   'text': text,
                   'thing_id': self.stream_id}
-        url = 'https://oauth.reddit.com/api/comment/'
-        response = self.reddit.post(url, params=params)
+        url = self.reddit.endpoints.comment_url()
+        response = self.reddit.post(url, params=params, priority=Priority.COMMENT)
         if response.status_code != 200:
-            print(response.url)
             raise UnsuccessfulRequestException(response.status_code, response.content)
 
+        try:
+            result = response.json()['json']
+        except (KeyError, ValueError, TypeError):
+            return None
+        if result.get('errors'):
+            raise UnsuccessfulRequestException(response.status_code, response.content)
+        try:
+            return result['data']['things'][0]['data']
+        except (KeyError, IndexError, TypeError):
+            return None
+
+
+_default = None
+_default_lock = Lock()
+
+
+def get_default() -> Reddit:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Reddit(config['REDDIT']['CLIENT_ID'],
+                              config['REDDIT']['REDIRECT_URI'],
+                              config['USER_AGENT'],
+                              credentials=CredentialStore() if config.get('REMEMBER_CREDENTIALS', True) else None)
+    return _default
+
 
-r = Reddit(config['REDDIT']['CLIENT_ID'],
-           config['REDDIT']['REDIRECT_URI'],
-           config['USER_AGENT'])
+def __getattr__(name: str):
+    # The module-level client is built on first access instead of at import time.
+    if name == 'r':
+        return get_default()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
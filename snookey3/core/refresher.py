@@ -0,0 +1,128 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides a background scheduler that renews access tokens ahead of their expiry.
+"""
+
+import heapq
+import itertools
+import logging
+import random
+from threading import Condition, Thread
+from time import time
+
+from .exceptions import UnsuccessfulRequestException
+
+logger = logging.getLogger(__name__)
+
+# Share of a token's lifetime left unused when it gets renewed, and the random spread applied on top of it.
+REFRESH_AHEAD = 0.25
+REFRESH_JITTER = 0.05
+RETRY_AFTER = 30
+REJECTED_STATUS_CODES = (400, 401, 403)
+
+
+def is_rejected(error: UnsuccessfulRequestException) -> bool:
+    """Whether Reddit turned the refresh token down for good, as opposed to failing for the time being."""
+    return error.status_code in REJECTED_STATUS_CODES or b'invalid_grant' in (error.response_content or b'')
+
+
+def refresh_delay(expires_in: float) -> float:
+    lead = expires_in * (REFRESH_AHEAD + random.uniform(0, REFRESH_JITTER))
+    return max(expires_in - lead, 0)
+
+
+class TokenRefresher:
+
+    def __init__(self):
+        self._queue = []
+        self._due = {}
+        self._counter = itertools.count()
+        self._condition = Condition()
+        self._thread = None
+        self._stopped = False
+
+    def schedule(self, auth, delay: float = None):
+        if delay is None:
+            delay = refresh_delay(auth.expires_in) - (time() - auth.authorized_time)
+        due = time() + max(delay, 0)
+
+        with self._condition:
+            if self._stopped:
+                return
+            self._due[auth] = due
+            heapq.heappush(self._queue, (due, next(self._counter), auth))
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='TokenRefresher', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        logger.debug('Token refresh scheduled in %.0fs.', max(delay, 0))
+
+    def cancel(self, auth):
+        with self._condition:
+            self._due.pop(auth, None)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._queue.clear()
+            self._due.clear()
+            self._condition.notify()
+
+    def _next(self):
+        with self._condition:
+            while not self._stopped:
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+                due, _, auth = self._queue[0]
+                if self._due.get(auth) != due:
+                    # Superseded by a newer schedule() or cancelled.
+                    heapq.heappop(self._queue)
+                    continue
+                now = time()
+                if due > now:
+                    self._condition.wait(due - now)
+                    continue
+                heapq.heappop(self._queue)
+                del self._due[auth]
+                return auth
+            return None
+
+    def _run(self):
+        while True:
+            auth = self._next()
+            if auth is None:
+                return
+
+            try:
+                # A successful refresh reschedules the auth by itself.
+                auth.refresh()
+            except UnsuccessfulRequestException as e:
+                logger.error('Background token refresh failed. Status code: %i. Response: %s',
+                             e.status_code, e.response_content)
+                if is_rejected(e):
+                    # Retrying a revoked or invalid refresh token can't succeed; the user has to authorize again.
+                    logger.warning('The refresh token was rejected, forgetting the credentials.')
+                    auth.forget()
+                else:
+                    self.schedule(auth, RETRY_AFTER)
+            except Exception:
+                # Network errors.
+                logger.exception('Background token refresh failed.')
+                self.schedule(auth, RETRY_AFTER)
@@ -0,0 +1,89 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides offline sources of chat frames, for replaying a broadcast's chat without a
+live stream and for load testing the chat pipeline.
+
+Every source yields (offset, frame) pairs: the time in seconds since the start of the replay at
+which the frame arrives, and the frame as it would come off the websocket.
+"""
+
+import json
+import random
+import string
+from time import time
+
+from .archive import ARCHIVE_DIR, ChatArchiveReader
+from .chat import ChatMessage
+
+
+def frame_for(message: ChatMessage) -> str:
+    return json.dumps({'type': 'new_comment',
+                       'payload': {'_id36': message.id,
+                                   'author': message.author,
+                                   'body': message.body,
+                                   'created_utc': message.created}})
+
+
+def synthetic_frames(rate: float = 50, duration: float = 60, size: int = 40, burstiness: float = 1.0,
+                     authors: int = 200, seed: int = None):
+    """
+    Generates comments arriving at an average of rate per second for duration seconds.
+
+    Gaps between comments are gamma distributed with a coefficient of variation of burstiness:
+    0 gives evenly spaced comments, 1 a Poisson process, and larger values increasingly clustered bursts.
+    Comment bodies average size characters.
+    """
+    generator = random.Random(seed)
+    mean_gap = 1 / rate
+    started = time()
+    offset = 0.0
+    count = 0
+    while True:
+        if burstiness > 0:
+            shape = 1 / burstiness ** 2
+            offset += generator.gammavariate(shape, mean_gap / shape)
+        else:
+            offset += mean_gap
+        if offset > duration:
+            return
+
+        length = max(1, int(generator.expovariate(1 / size)))
+        body = ''.join(generator.choices(string.ascii_lowercase + ' ', k=length))
+        count += 1
+        yield offset, frame_for(ChatMessage(f'synthetic{count}', f'user{generator.randrange(authors)}', body,
+                                            started + offset))
+
+
+def recorded_frames(path: str):
+    """Reads a recording: one JSON object per line, with the offset in 't' and the raw frame in 'frame'."""
+    with open(path, encoding='utf-8') as recording:
+        for line in recording:
+            if line.strip():
+                entry = json.loads(line)
+                yield float(entry['t']), entry['frame']
+
+
+def archived_frames(broadcast_id: str, start: float = 0, end: float = None, directory: str = ARCHIVE_DIR):
+    """Replays a chat archive from start seconds into the broadcast, keeping the original pacing."""
+    with ChatArchiveReader(broadcast_id, directory) as reader:
+        first = None
+        for message in reader.read(start, end):
+            if first is None:
+                first = message.created
+            yield max(message.created - first, 0), frame_for(message)
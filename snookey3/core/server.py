@@ -14,30 +14,115 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
 
+import errno
 import logging
+import os
+import socket
+import urllib.parse
 from threading import Thread
 
-import psutil
-import waitress
-
 from snookey3 import config
-from . import callbacks
 from .exceptions import PortOccupiedException
 
 logger = logging.getLogger(__name__)
 
+ADDRESS_IN_USE = {errno.EADDRINUSE, getattr(errno, 'WSAEADDRINUSE', errno.EADDRINUSE)}
+DEFAULT_API_THREADS = 16
+# Worker threads that chat event streams can never take.
+RESERVED_THREADS = 4
+
+
+def _bind(host: str, port: int) -> list:
+    sockets = []
+    try:
+        for family, socktype, proto, _, address in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM):
+            sock = socket.socket(family, socktype, proto)
+            if family == socket.AF_INET6:
+                sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+            if os.name != 'nt':
+                # Lets the port be reused straight after a restart while it lingers in TIME_WAIT.
+                # On Windows the same option would allow stealing a port from a live process instead.
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                # An ephemeral port picked for the first address is reused for the others (IPv4 and IPv6 localhost).
+                sock.bind((address[0], port) + tuple(address[2:]))
+            except OSError as e:
+                sock.close()
+                if e.errno in (errno.EADDRNOTAVAIL, errno.EAFNOSUPPORT):
+                    # e.g. ::1 on a host without IPv6.
+                    continue
+                raise
+            sockets.append(sock)
+            port = sock.getsockname()[1]
+        if not sockets:
+            raise OSError(errno.EADDRNOTAVAIL, f'Could not bind to {host}.')
+    except OSError:
+        for sock in sockets:
+            sock.close()
+        raise
+    return sockets
+
+
+def _find_owner(port: int):
+    # Only walked when binding failed, since listing every connection is slow and may need privileges.
+    import psutil
+
+    try:
+        for connection in psutil.net_connections():
+            if connection.laddr and connection.laddr.port == port and connection.pid:
+                return psutil.Process(connection.pid)
+    except (psutil.AccessDenied, psutil.NoSuchProcess):
+        pass
+    return None
+
+
+def _with_port(url: str, port: int) -> str:
+    parts = urllib.parse.urlsplit(url)
+    return urllib.parse.urlunsplit(parts._replace(netloc=f'{parts.hostname}:{port}'))
+
+
+def run(ephemeral: bool = None, api: bool = False) -> int:
+    # Flask and waitress are only needed once the server starts, so they stay out of the import path.
+    import waitress
+    from . import callbacks, reddit
+
+    if ephemeral is None:
+        ephemeral = config['SERVER'].get('EPHEMERAL_PORT', False)
+    host = config['SERVER']['HOST']
+    port = 0 if ephemeral else config['SERVER']['PORT']
+
+    try:
+        sockets = _bind(host, port)
+    except OSError as e:
+        # Anything else, like a privileged port or a host that doesn't resolve, is a different problem.
+        if e.errno not in ADDRESS_IN_USE:
+            raise
+        logger.warning('Port occupied, raising PortOccupiedException.')
+        raise PortOccupiedException(_find_owner(port))
+
+    port = sockets[0].getsockname()[1]
+    if ephemeral:
+        # Reddit only redirects to the exact redirect URI registered for the app, so with the real API
+        # this mode works only if the app is registered for that port too. It is meant for local
+        # stand-ins such as benchmarks.fakereddit.
+        logger.warning('Using ephemeral port %i; authorization fails unless the app is registered for it.', port)
+        reddit.r.redirect_uri = _with_port(reddit.r.redirect_uri, port)
+
+    options = {}
+    if api:
+        from .api import blueprint
 
-def run():
-    for connection in psutil.net_connections():
-        if connection.laddr.port == 65010:
-            process = psutil.Process(connection.pid)
-            logger.warning('Port occupied, raising PortOccupiedException.')
-            raise PortOccupiedException(process)
+        if 'api' not in callbacks.app.blueprints:
+            callbacks.app.register_blueprint(blueprint)
+        # Every open chat event stream occupies a worker thread for as long as it is connected, so the
+        # API runs with more threads and caps the streams (SERVER.MAX_STREAMS) below SERVER.THREADS,
+        # keeping some free for JSON requests and the OAuth callback. Events have to go out as soon
+        # as they are written instead of waiting for a full send buffer.
+        options = {'threads': config['SERVER'].get('THREADS', DEFAULT_API_THREADS), 'send_bytes': 1}
 
-    thread = Thread(target=lambda: waitress.serve(callbacks.app,
-                                                  host=config['SERVER']['HOST'],
-                                                  port=config['SERVER']['PORT'],
-                                                  _quiet=True),
-                    daemon=True)
+    # Creating the server here puts the sockets into listening state before run() returns.
+    wsgi_server = waitress.create_server(callbacks.app, sockets=sockets, **options)
+    thread = Thread(target=wsgi_server.run, daemon=True)
     thread.start()
-    logger.info('Started the server thread.')
+    logger.info('Started the server thread on port %i.', port)
+    return port
@@ -0,0 +1,229 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides a manager for running many accounts and broadcasts in one process.
+
+Every account gets its own Reddit client, so tokens, stored credentials and rate limits stay separate,
+while all of them share the default client's connection pools and token refresher. Live chats of all
+broadcasts run on a single event loop thread.
+"""
+
+import logging
+from threading import Lock
+
+from snookey3 import config
+from .analytics import ChatAnalytics
+from .archive import ChatArchive
+from .availability import AvailabilityTracker
+from .chat import ChatPipeline
+from .filters import FilterEngine
+from .livechat import LiveChat, ChatFeed, EventLoopThread
+from .reddit import Reddit, Broadcast, RTMP_URL, get_default
+from .streamstats import get_poller
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY = 2000
+
+
+class BroadcastSession:
+
+    def __init__(self, account: 'Account', broadcast: Broadcast, loop_thread: EventLoopThread = None):
+        self.account = account
+        self.broadcast = broadcast
+        self.analytics = ChatAnalytics() if config.get('CHAT_ANALYTICS', True) else None
+        filters = FilterEngine() if config.get('CHAT_FILTERS', True) else None
+        self.live_chat = LiveChat(broadcast, ChatPipeline(analytics=self.analytics, filters=filters),
+                                  loop_thread=loop_thread)
+        self.feed = ChatFeed(config.get('CHAT_HISTORY', DEFAULT_HISTORY))
+        self.archive = None
+        self.closed = False
+        if config.get('ARCHIVE_CHAT', True):
+            try:
+                self.archive = ChatArchive(broadcast.stream_id)
+            except OSError:
+                logger.exception('Could not open the chat archive.')
+        self.live_chat.pending.subscribe(self.deliver)
+        self.stats = get_poller().watch(broadcast)
+
+    def start(self):
+        self.live_chat.start()
+
+    def deliver(self):
+        batch = self.live_chat.pipeline.drain()
+        if batch:
+            if self.archive is not None:
+                self.archive.append(batch)
+            self.feed.publish(batch)
+
+    def close(self):
+        self.closed = True
+        self.live_chat.pending.unsubscribe(self.deliver)
+        self.live_chat.stop()
+        get_poller().unwatch(self.broadcast)
+        self.deliver()
+        if self.archive is not None:
+            self.archive.close()
+        # Wakes up readers waiting on the feed so they notice the session is gone.
+        self.feed.publish([])
+
+    def as_dict(self) -> dict:
+        return {'id': self.broadcast.stream_id,
+                'account': self.account.name,
+                'subreddit': self.broadcast.subreddit,
+                'streamer_key': self.broadcast.streamer_key,
+                'rtmp_url': RTMP_URL,
+                'stream_url': self.broadcast.stream_url}
+
+
+class Account:
+
+    def __init__(self, name: str, reddit: Reddit):
+        self.name = name
+        self.reddit = reddit
+
+    @property
+    def authorized(self) -> bool:
+        return self.reddit.auth.access_token is not None
+
+    def as_dict(self) -> dict:
+        return {'name': self.name, 'authorized': self.authorized}
+
+
+class SessionManager:
+    """
+    Holds the accounts, keyed by name, and their live broadcasts, keyed by stream id. The account named
+    None is the default client from snookey3.core.reddit, which keeps its original credentials key.
+    """
+
+    def __init__(self, default: Reddit = None):
+        self.default = default or get_default()
+        self.credentials = self.default.credentials
+        self.accounts = {None: Account(None, self.default)}
+        self.broadcasts = {}
+        self._loop_thread = None
+        self._lock = Lock()
+
+    @property
+    def loop_thread(self) -> EventLoopThread:
+        with self._lock:
+            if self._loop_thread is None:
+                self._loop_thread = EventLoopThread()
+            return self._loop_thread
+
+    def _credentials_key(self, name: str) -> str:
+        return f'{self.default.client_id}:{name}'
+
+    def account(self, name: str = None) -> Account:
+        """Returns the named account, creating it if it doesn't exist yet."""
+        with self._lock:
+            account = self.accounts.get(name)
+            if account is not None:
+                return account
+
+            reddit = Reddit(self.default.client_id, self.default.redirect_uri, self.default.user_agent,
+                            transport=self.default.transport,
+                            refresher=self.default.refresher,
+                            credentials=self.credentials,
+                            endpoints=self.default.endpoints)
+            reddit.auth.credentials_key = self._credentials_key(name)
+            account = self.accounts[name] = Account(name, reddit)
+        logger.info('Added account %s.', name)
+        return account
+
+    def remove_account(self, name: str, forget: bool = False):
+        if name is None:
+            raise ValueError("The default account can't be removed.")
+        with self._lock:
+            account = self.accounts.pop(name, None)
+            sessions = [session for session in self.broadcasts.values() if session.account is account]
+        if account is None:
+            return
+        for session in sessions:
+            self.close_broadcast(session.broadcast.stream_id)
+        if forget:
+            account.reddit.auth.forget()
+        account.reddit.close()
+
+    def restore_accounts(self) -> list:
+        """Creates and authorizes every account with stored credentials. Returns the restored ones."""
+        if not self.credentials:
+            return []
+        prefix = self._credentials_key('')
+        try:
+            keys = self.credentials.keys()
+        except OSError:
+            logger.exception('Could not read the stored credentials.')
+            return []
+
+        restored = []
+        for key in keys:
+            if key.startswith(prefix):
+                account = self.account(key[len(prefix):])
+                if account.reddit.auth.restore():
+                    restored.append(account)
+        return restored
+
+    def create_broadcast(self, title: str, subreddits, account: str = None) -> BroadcastSession:
+        """Creates a broadcast in a subreddit, or in the first available one of an ordered list."""
+        availability = AvailabilityTracker(self.account(account).reddit)
+        if isinstance(subreddits, str):
+            broadcast = availability.post(title, subreddits)
+        else:
+            broadcast = availability.post_first_available(title, subreddits)
+        session = BroadcastSession(self.accounts[account], broadcast, self.loop_thread)
+        with self._lock:
+            self.broadcasts[broadcast.stream_id] = session
+        session.start()
+        logger.info('Created broadcast %s in r/%s.', broadcast.stream_id, broadcast.subreddit)
+        return session
+
+    def close_broadcast(self, stream_id: str) -> bool:
+        with self._lock:
+            session = self.broadcasts.pop(stream_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def stats(self) -> dict:
+        return {'accounts': {str(name): account.reddit.ratelimit.budget() for name, account in self.accounts.items()},
+                'broadcasts': {stream_id: session.live_chat.stats() for stream_id, session in self.broadcasts.items()}}
+
+    def close(self):
+        for stream_id in list(self.broadcasts):
+            self.close_broadcast(stream_id)
+        with self._lock:
+            accounts = [account for name, account in self.accounts.items() if name is not None]
+            loop_thread, self._loop_thread = self._loop_thread, None
+        for account in accounts:
+            account.reddit.close()
+        if loop_thread is not None:
+            loop_thread.stop()
+
+
+_manager = None
+_manager_lock = Lock()
+
+
+def get_manager() -> SessionManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SessionManager()
+    return _manager
@@ -0,0 +1,81 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides the store for OAuth state parameters handed out with authorization URLs.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+
+from snookey3 import config
+
+DEFAULT_TTL = 15 * 60
+DEFAULT_MAX_SIZE = 32
+
+
+class StateStore:
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_size: int = DEFAULT_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        # state -> (expiry, data). Every state lives for the same ttl, so insertion order is also expiry order.
+        self._states = OrderedDict()
+        self._lock = Lock()
+
+    def _prune(self, now: float):
+        while self._states:
+            state, (expires, _) = next(iter(self._states.items()))
+            if expires > now:
+                break
+            del self._states[state]
+
+    def create(self, data=None) -> str:
+        """Returns a new state. Data, e.g. the account being authorized, is handed back by claim()."""
+        state = str(uuid4())
+        with self._lock:
+            now = monotonic()
+            self._prune(now)
+            while len(self._states) >= self.max_size:
+                self._states.popitem(last=False)
+            self._states[state] = (now + self.ttl, data)
+        return state
+
+    def claim(self, state: str):
+        """Consumes a state and returns its data. Raises KeyError for unknown or expired states."""
+        with self._lock:
+            self._prune(monotonic())
+            # States are single-use, a replayed callback finds nothing.
+            _, data = self._states.pop(state)
+        return data
+
+    def consume(self, state: str) -> bool:
+        try:
+            self.claim(state)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        with self._lock:
+            self._prune(monotonic())
+            return len(self._states)
+
+
+store = StateStore(config.get('STATE_TTL', DEFAULT_TTL))
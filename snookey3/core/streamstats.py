@@ -0,0 +1,285 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides a poller for the health and audience of live broadcasts.
+
+A single background thread polls the video endpoint of every watched broadcast with conditional
+requests. Each broadcast is polled every few seconds while its numbers move, and less and less often
+while they hold still. Samples are kept in a compact time series that only grows when something
+changed, so readers never have to make requests of their own.
+"""
+
+import heapq
+import itertools
+import logging
+from array import array
+from threading import Condition, Lock, Thread
+from time import time
+
+from snookey3.utils.events import Event
+from .ratelimit import Priority
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL = 5
+MAX_INTERVAL = 60
+BACKOFF_FACTOR = 1.5
+DEFAULT_CAPACITY = 2048
+
+# Stream states reported by strapi, as stored in the series.
+STATES = ('UNKNOWN', 'IS_LIVE', 'DISCONNECTED', 'ENDED')
+FIELDS = ('viewers', 'unique_viewers', 'upvotes', 'downvotes', 'comments')
+
+
+def parse_video(data: dict) -> tuple:
+    """Turns a /videos/{id} response into a (state, viewers, unique_viewers, upvotes, downvotes, comments) tuple."""
+    data = data.get('data') or {}
+    post = data.get('post') or {}
+    stream = data.get('stream') or {}
+    state = stream.get('state', 'UNKNOWN')
+
+    def number(value) -> int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return -1
+
+    return (STATES.index(state) if state in STATES else 0,
+            number(data.get('continuous_watchers')),
+            number(data.get('unique_watchers')),
+            number(data.get('upvotes')),
+            number(data.get('downvotes')),
+            number(post.get('commentCount')))
+
+
+class StatsSeries:
+    """
+    Ring buffer of samples in parallel typed arrays, roughly 28 bytes per sample. A sample is only
+    appended when it differs from the previous one.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.times = array('d', [0.0]) * capacity
+        self.states = array('b', [0]) * capacity
+        self.values = [array('i', [0]) * capacity for _ in FIELDS]
+        self._start = 0
+        self._size = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _index(self, position: int) -> int:
+        return (self._start + position) % self.capacity
+
+    def _sample(self, index: int) -> dict:
+        sample = {'time': self.times[index], 'state': STATES[self.states[index]]}
+        for field, values in zip(FIELDS, self.values):
+            sample[field] = values[index] if values[index] >= 0 else None
+        return sample
+
+    def append(self, timestamp: float, sample: tuple) -> bool:
+        """Records a sample, returning False if it equals the latest one."""
+        with self._lock:
+            if self._size:
+                last = self._index(self._size - 1)
+                if sample == (self.states[last],) + tuple(values[last] for values in self.values):
+                    return False
+            if self._size == self.capacity:
+                index = self._start
+                self._start = (self._start + 1) % self.capacity
+            else:
+                index = self._index(self._size)
+                self._size += 1
+            self.times[index] = timestamp
+            self.states[index] = sample[0]
+            for values, value in zip(self.values, sample[1:]):
+                values[index] = value
+        return True
+
+    def latest(self):
+        with self._lock:
+            if not self._size:
+                return None
+            return self._sample(self._index(self._size - 1))
+
+    def since(self, timestamp: float = 0) -> list:
+        with self._lock:
+            return [self._sample(self._index(position)) for position in range(self._size)
+                    if self.times[self._index(position)] > timestamp]
+
+
+class StreamStats:
+
+    def __init__(self, broadcast, capacity: int = DEFAULT_CAPACITY):
+        self.broadcast = broadcast
+        self.series = StatsSeries(capacity)
+        self.interval = MIN_INTERVAL
+        self.checked = None
+        self.polls = 0
+        self.not_modified = 0
+        self.errors = 0
+        # Emitted from the poller thread whenever a sample differs from the previous one.
+        self.updated = Event()
+        self._etag = None
+        self._last_modified = None
+
+    def poll(self) -> bool:
+        """Polls once and returns whether anything changed."""
+        reddit = self.broadcast.reddit
+        headers = {}
+        if self._etag:
+            headers['If-None-Match'] = self._etag
+        if self._last_modified:
+            headers['If-Modified-Since'] = self._last_modified
+
+        self.polls += 1
+        response = reddit.get(reddit.endpoints.video_url(self.broadcast.stream_id),
+                              priority=Priority.POLL, headers=headers)
+        self.checked = time()
+        if response.status_code == 304:
+            self.not_modified += 1
+            return False
+        if response.status_code != 200:
+            self.errors += 1
+            logger.warning('Stream stats poll failed with status code %i.', response.status_code)
+            return False
+
+        self._etag = response.headers.get('ETag')
+        self._last_modified = response.headers.get('Last-Modified')
+        try:
+            sample = parse_video(response.json())
+        except (ValueError, AttributeError):
+            self.errors += 1
+            return False
+        return self.series.append(self.checked, sample)
+
+    def next_interval(self, changed: bool) -> float:
+        # Fast while things move, and backing off geometrically while they hold still.
+        if changed:
+            self.interval = MIN_INTERVAL
+        else:
+            self.interval = min(self.interval * BACKOFF_FACTOR, MAX_INTERVAL)
+        return self.interval
+
+    def as_dict(self) -> dict:
+        return {'latest': self.series.latest(),
+                'checked': self.checked,
+                'interval': round(self.interval, 1),
+                'samples': len(self.series),
+                'polls': self.polls,
+                'not_modified': self.not_modified,
+                'errors': self.errors}
+
+
+class StatsPoller:
+
+    def __init__(self):
+        self._watched = {}
+        # stream id -> number of watchers, a broadcast is polled until the last of them unwatches it.
+        self._watchers = {}
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = Condition()
+        self._thread = None
+        self._stopped = False
+
+    def watch(self, broadcast) -> StreamStats:
+        """Starts polling a broadcast, or shares the stats if it is already watched. Pair with unwatch()."""
+        with self._condition:
+            self._watchers[broadcast.stream_id] = self._watchers.get(broadcast.stream_id, 0) + 1
+            stats = self._watched.get(broadcast.stream_id)
+            if stats is None:
+                stats = self._watched[broadcast.stream_id] = StreamStats(broadcast)
+                heapq.heappush(self._queue, (time(), next(self._counter), stats))
+                if self._thread is None:
+                    self._thread = Thread(target=self._run, name='StatsPoller', daemon=True)
+                    self._thread.start()
+                self._condition.notify()
+            return stats
+
+    def unwatch(self, broadcast):
+        with self._condition:
+            watchers = self._watchers.get(broadcast.stream_id, 0) - 1
+            if watchers > 0:
+                self._watchers[broadcast.stream_id] = watchers
+                return
+            self._watchers.pop(broadcast.stream_id, None)
+            self._watched.pop(broadcast.stream_id, None)
+
+    def get(self, stream_id: str):
+        return self._watched.get(stream_id)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._queue.clear()
+            self._watched.clear()
+            self._watchers.clear()
+            self._condition.notify()
+
+    def _next(self):
+        with self._condition:
+            while not self._stopped:
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+                due, _, stats = self._queue[0]
+                if self._watched.get(stats.broadcast.stream_id) is not stats:
+                    heapq.heappop(self._queue)
+                    continue
+                now = time()
+                if due > now:
+                    self._condition.wait(due - now)
+                    continue
+                heapq.heappop(self._queue)
+                return stats
+            return None
+
+    def _run(self):
+        while True:
+            stats = self._next()
+            if stats is None:
+                return
+
+            try:
+                changed = stats.poll()
+            except Exception:
+                logger.warning('Stream stats poll failed.', exc_info=True)
+                stats.errors += 1
+                changed = False
+            if changed:
+                stats.updated.emit(stats)
+
+            with self._condition:
+                if self._watched.get(stats.broadcast.stream_id) is stats:
+                    due = time() + stats.next_interval(changed)
+                    heapq.heappush(self._queue, (due, next(self._counter), stats))
+
+
+_poller = None
+_poller_lock = Lock()
+
+
+def get_poller() -> StatsPoller:
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = StatsPoller()
+    return _poller
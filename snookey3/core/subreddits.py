@@ -0,0 +1,148 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module keeps config['SUBREDDITS'] in sync with the list published on GitHub.
+
+The last downloaded list is cached in ~/.Snookey3 and used straight away, while a background thread
+revalidates it with a conditional request whenever the cache gets older than its TTL, for as long as
+the application runs.
+"""
+
+import json
+import logging
+import os
+from threading import Thread, Event as ThreadingEvent
+from time import time
+
+from snookey3 import config, DATA_DIR
+from snookey3.utils.events import Event
+
+logger = logging.getLogger(__name__)
+
+SUBREDDITS_URL = 'https://raw.githubusercontent.com/warpspeedchic/Snookey3/master/subreddits'
+CACHE_PATH = os.path.join(DATA_DIR, 'subreddits.json')
+DEFAULT_TTL = 6 * 60 * 60
+TIMEOUT = 10
+RETRY_INTERVAL = 10 * 60
+
+updated = Event()
+_stopped = ThreadingEvent()
+
+
+def _read_cache() -> dict:
+    try:
+        with open(CACHE_PATH) as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(cache: dict):
+    if not os.path.exists(DATA_DIR):
+        os.makedirs(DATA_DIR)
+    temp_path = CACHE_PATH + '.tmp'
+    with open(temp_path, 'w') as cache_file:
+        json.dump(cache, cache_file)
+    os.replace(temp_path, CACHE_PATH)
+
+
+def _apply(subreddits: list):
+    if subreddits and subreddits != config['SUBREDDITS']:
+        config['SUBREDDITS'] = subreddits
+        updated.emit(subreddits)
+
+
+def load_cached() -> bool:
+    subreddits = _read_cache().get('subreddits')
+    if not subreddits:
+        logger.info('Using local subreddit list.')
+        return False
+    _apply(subreddits)
+    logger.info('Using cached online subreddit list.')
+    return True
+
+
+def refresh(force: bool = False) -> bool:
+    import requests
+
+    cache = _read_cache()
+    ttl = config.get('SUBREDDITS_TTL', DEFAULT_TTL)
+    if not force and cache.get('subreddits') and time() - cache.get('fetched_time', 0) < ttl:
+        return False
+
+    headers = {'User-agent': config.get('USER_AGENT')}
+    if cache.get('subreddits'):
+        if cache.get('etag'):
+            headers['If-None-Match'] = cache['etag']
+        if cache.get('last_modified'):
+            headers['If-Modified-Since'] = cache['last_modified']
+
+    try:
+        response = requests.get(SUBREDDITS_URL, headers=headers, timeout=TIMEOUT)
+    except requests.exceptions.RequestException:
+        logger.warning('Could not pull the subreddit list from GitHub.')
+        return False
+
+    if response.status_code == 304:
+        cache['fetched_time'] = time()
+    elif response.status_code == 200:
+        cache = {'subreddits': [subreddit.strip() for subreddit in response.text.splitlines() if subreddit.strip()],
+                 'etag': response.headers.get('ETag'),
+                 'last_modified': response.headers.get('Last-Modified'),
+                 'fetched_time': time()}
+    else:
+        logger.warning('Could not pull the subreddit list from GitHub. Status code: %i', response.status_code)
+        return False
+
+    try:
+        _write_cache(cache)
+    except OSError:
+        logger.exception('Could not cache the subreddit list.')
+
+    _apply(cache['subreddits'])
+    logger.info('Using online subreddit list.')
+    return True
+
+
+def _keep_fresh():
+    while True:
+        refresh()
+        ttl = config.get('SUBREDDITS_TTL', DEFAULT_TTL)
+        fetched_time = _read_cache().get('fetched_time')
+        if fetched_time is None or time() - fetched_time >= ttl:
+            # The last pull failed; try again sooner than a full TTL.
+            delay = min(RETRY_INTERVAL, ttl)
+        else:
+            delay = fetched_time + ttl - time()
+        if _stopped.wait(max(delay, 1)):
+            return
+
+
+def start():
+    if not config['PULL_SUBREDDITS_FROM_GITHUB']:
+        return None
+
+    load_cached()
+    _stopped.clear()
+    thread = Thread(target=_keep_fresh, name='SubredditRefresh', daemon=True)
+    thread.start()
+    return thread
+
+
+def stop():
+    _stopped.set()
@@ -0,0 +1,101 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides a pooled, keep-alive HTTP transport shared by the Reddit clients.
+"""
+
+import logging
+from threading import Lock
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+
+
+class Transport:
+
+    def __init__(self,
+                 pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+        self._session = None
+        self._lock = Lock()
+
+    @classmethod
+    def from_config(cls, transport_config: dict = None) -> 'Transport':
+        transport_config = transport_config or {}
+        return cls(pool_connections=transport_config.get('POOL_CONNECTIONS', DEFAULT_POOL_CONNECTIONS),
+                   pool_maxsize=transport_config.get('POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+                   connect_timeout=transport_config.get('CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+                   read_timeout=transport_config.get('READ_TIMEOUT', DEFAULT_READ_TIMEOUT))
+
+    @property
+    def session(self) -> 'requests.Session':
+        # Sessions are created lazily so that constructing a client never touches the network stack.
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self) -> 'requests.Session':
+        import requests
+        import requests.adapters
+
+        session = requests.Session()
+        # One pool per host (oauth, strapi, ssl), each keeping up to pool_maxsize warm connections.
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_connections,
+                                                pool_maxsize=self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        logger.debug('Created an HTTP session (pools: %i, pool size: %i).', self.pool_connections, self.pool_maxsize)
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> 'requests.models.Response':
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> 'requests.models.Response':
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> 'requests.models.Response':
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+                logger.debug('Closed the HTTP session.')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,72 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+Headless entry point: runs Snookey3 as a daemon controlled through the JSON API in snookey3.core.api,
+without importing Qt. Start it with:
+
+    python -m snookey3 --headless
+"""
+
+import logging
+import signal
+import sys
+from threading import Event
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    from snookey3.version import __title__, __version__
+    logger.info('%s - v%s (headless)', __title__, __version__)
+
+    from snookey3.core import server, subreddits
+    from snookey3.core.exceptions import PortOccupiedException
+    from snookey3.core.reddit import r
+    from snookey3.core.sessions import get_manager
+    from snookey3.core.states import store
+
+    subreddits.start()
+
+    try:
+        port = server.run(api=True)
+    except PortOccupiedException as e:
+        process_name = e.process.name() if e.process else 'another application'
+        logger.critical('The control API port is occupied by %s.', process_name)
+        sys.exit(-1)
+    logger.info('Control API listening on port %i.', port)
+
+    if not (r.auth.has_stored_credentials() and r.auth.restore()):
+        logger.info('Not authorized yet. Open this URL to authorize: %s', r.auth.url(store.create()))
+    manager = get_manager()
+    for account in manager.restore_accounts():
+        logger.info('Restored account %s.', account.name)
+
+    stopped = Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *args: stopped.set())
+    while not stopped.wait(1):
+        pass
+
+    logger.info('Shutting down.')
+    subreddits.stop()
+    manager.close()
+    r.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -14,91 +14,612 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
 
-import json
+import html
 import logging
+from collections import OrderedDict
+from time import monotonic
 
-from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot, QUrl
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot, QUrl, QThread, QTimer, QMetaObject, Qt, QCoreApplication, \
+    QAbstractListModel, QModelIndex, QSize, QPointF
+from PyQt5.QtGui import QStaticText, QTextOption, QPalette, QColor
 from PyQt5.QtWebSockets import QWebSocket
-from PyQt5.QtWidgets import QWidget, QGridLayout, QTextEdit, QLineEdit, QMessageBox
+from PyQt5.QtWidgets import QWidget, QGridLayout, QLineEdit, QListView, QStyledItemDelegate, QStyle, QAbstractItemView, \
+    QLabel, QVBoxLayout
 
-from snookey3.core.exceptions import UnsuccessfulRequestException
+from snookey3 import config
+from snookey3.core import outbox
+from snookey3.core.analytics import ChatAnalytics
+from snookey3.core.archive import ChatArchive
+from snookey3.core.chat import ChatPipeline, ChatMessage, ConnectionStats
+from snookey3.core.filters import FilterEngine
 from snookey3.core.reddit import Broadcast
+from snookey3.gui.tasks import run_task
+from snookey3.utils.backoff import Backoff
+from snookey3.utils.ringbuffer import RingBuffer
 
 logger = logging.getLogger(__name__)
 
+# Minimum time between two batches handed to the GUI thread, in milliseconds.
+BATCH_INTERVAL = 50
+# How often the connection is pinged, in milliseconds, and how long it may stay silent, in seconds.
+HEARTBEAT_INTERVAL = 10000
+STALL_TIMEOUT = 30
+DEFAULT_HISTORY = 2000
+# How often the analytics panel is refreshed, in milliseconds.
+ANALYTICS_INTERVAL = 250
+TOP_TERMS_SHOWN = 8
+ROW_PADDING = 2
+FAILED_COLOR = QColor('#e05252')
+HIGHLIGHTED_COLOR = QColor(255, 196, 0, 60)
 
-class Chat(QObject):
 
-    comment_received = pyqtSignal(dict)
+class ChatWorker(QObject):
+    """
+    Owns the websocket on a worker thread, so that frames are parsed off the GUI thread, and keeps
+    it connected: stalls are detected with pings, and dropped connections are re-established with
+    exponential backoff, fetching a fresh websocket address when the old one stops working.
+    """
 
-    def __init__(self):
-        super(Chat, self).__init__()
+    pending = pyqtSignal()
+
+    def __init__(self, pipeline: ChatPipeline, stats: ConnectionStats):
+        super(ChatWorker, self).__init__()
+        self.pipeline = pipeline
+        self.stats = stats
+        self.broadcast = None
+        self.url = None
+        self.websocket = None
+        self.heartbeat_timer = None
+        self.reconnect_timer = None
+        self.backoff = Backoff()
+        self._stopping = False
+        self._failed_attempts = 0
+
+    @pyqtSlot()
+    def start(self):
         self.websocket = QWebSocket()
         self.websocket.textMessageReceived.connect(self.on_text_message_received)
+        self.websocket.connected.connect(self.on_connected)
+        self.websocket.disconnected.connect(self.on_disconnected)
+        self.websocket.pong.connect(self.on_pong)
+
+        self.heartbeat_timer = QTimer(self)
+        self.heartbeat_timer.setInterval(HEARTBEAT_INTERVAL)
+        self.heartbeat_timer.timeout.connect(self.check_heartbeat)
+
+        self.reconnect_timer = QTimer(self)
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.timeout.connect(self.reconnect)
+
+    @pyqtSlot(object)
+    def connect_broadcast(self, broadcast: Broadcast):
+        self.broadcast = broadcast
+        self.url = None
+        self._stopping = False
+        self.reconnect()
+
+    @pyqtSlot()
+    def stop(self):
+        self._stopping = True
+        if self.websocket is not None:
+            self.heartbeat_timer.stop()
+            self.reconnect_timer.stop()
+            self.websocket.close()
+            self.websocket = None
+
+    @pyqtSlot()
+    def on_connected(self):
+        self.stats.on_connected()
+        self.backoff.reset()
+        self._failed_attempts = 0
+        self.heartbeat_timer.start()
+        logger.info('Chat connected.')
+
+    @pyqtSlot()
+    def on_disconnected(self):
+        self.heartbeat_timer.stop()
+        was_connected = self.stats.connected
+        self.stats.on_disconnected()
+        if self._stopping:
+            return
+
+        if not was_connected:
+            self._failed_attempts += 1
+        delay = self.backoff.next()
+        logger.warning('Chat disconnected, reconnecting in %.1fs.', delay)
+        self.reconnect_timer.start(int(delay * 1000))
+
+    @pyqtSlot('quint64', 'QByteArray')
+    def on_pong(self, elapsed_time, payload):
+        self.stats.on_activity()
+
+    @pyqtSlot()
+    def check_heartbeat(self):
+        if monotonic() - self.stats.last_activity > STALL_TIMEOUT:
+            self.stats.stalls += 1
+            logger.warning('Chat connection stalled, dropping it.')
+            self.websocket.abort()
+            return
+        self.websocket.ping()
+
+    @pyqtSlot()
+    def reconnect(self):
+        if self._stopping:
+            return
+
+        if self.url is None or self._failed_attempts:
+            # The address itself may have rotated, so a failed attempt asks Reddit for a fresh one.
+            try:
+                self.url = self.broadcast.live_comments_websocket()
+            except Exception:
+                logger.exception('Could not fetch the chat websocket address.')
+                self.reconnect_timer.start(int(self.backoff.next() * 1000))
+                return
+
+        logger.info('Connecting the chat.')
+        self.websocket.open(QUrl(self.url))
+
+    @pyqtSlot(str)
+    def on_text_message_received(self, frame):
+        self.stats.on_activity()
+        if self.pipeline.feed(frame):
+            self.pending.emit()
+
+
+class ReplayWorker(QObject):
+    """
+    Feeds (offset, frame) pairs from snookey3.core.replay into the pipeline on the chat thread,
+    exactly like ChatWorker does with websocket frames. A speed of 0 replays as fast as possible.
+    """
+
+    pending = pyqtSignal()
+    finished = pyqtSignal()
+
+    # Frames fed per event loop iteration when replaying as fast as possible.
+    CHUNK_SIZE = 200
+
+    def __init__(self, pipeline: ChatPipeline, frames, speed: float = 1.0):
+        super(ReplayWorker, self).__init__()
+        self.pipeline = pipeline
+        self.frames = iter(frames)
+        self.speed = speed
+        self.timer = None
+        self._next = None
+        self._started = 0
+
+    @pyqtSlot()
+    def start(self):
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.feed)
+        self._started = monotonic()
+        self._next = next(self.frames, None)
+        self.feed()
+
+    @pyqtSlot()
+    def stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+        self._next = None
+
+    @pyqtSlot()
+    def feed(self):
+        if self.speed > 0:
+            due = (monotonic() - self._started) * self.speed
+            limit = None
+        else:
+            due = float('inf')
+            limit = self.CHUNK_SIZE
+
+        fed = 0
+        while self._next is not None and self._next[0] <= due and (limit is None or fed < limit):
+            if self.pipeline.feed(self._next[1]):
+                self.pending.emit()
+            fed += 1
+            self._next = next(self.frames, None)
+
+        if self._next is None:
+            self.finished.emit()
+        elif self.speed > 0:
+            self.timer.start(max(int((self._next[0] - due) / self.speed * 1000), 0))
+        else:
+            self.timer.start(0)
+
+
+class AnalyticsWorker(QObject):
+    """Takes analytics snapshots on the chat thread, so the GUI thread only has to display them."""
+
+    snapshot_ready = pyqtSignal(dict)
+
+    def __init__(self, analytics: ChatAnalytics, interval: int = ANALYTICS_INTERVAL):
+        super(AnalyticsWorker, self).__init__()
+        self.analytics = analytics
+        self.interval = interval
+        self.timer = None
+
+    @pyqtSlot()
+    def start(self):
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.take_snapshot)
+        self.timer.start(self.interval)
+
+    @pyqtSlot()
+    def stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+
+    @pyqtSlot()
+    def take_snapshot(self):
+        self.snapshot_ready.emit(self.analytics.snapshot(TOP_TERMS_SHOWN))
+
+
+class Chat(QObject):
+
+    comments_received = pyqtSignal(list)
+    connect_requested = pyqtSignal(object)
+
+    def __init__(self, archive: ChatArchive = None, analytics: ChatAnalytics = None, filters: FilterEngine = None):
+        super(Chat, self).__init__()
+        self.pipeline = ChatPipeline(analytics=analytics, filters=filters)
+        self.archive = archive
+        self.connection_stats = ConnectionStats()
+        self.replay_worker = None
+        self._last_delivery = 0
+
+        self.batch_timer = QTimer(self)
+        self.batch_timer.setSingleShot(True)
+        self.batch_timer.timeout.connect(self.deliver)
+
+        self.worker = ChatWorker(self.pipeline, self.connection_stats)
+        self.worker.pending.connect(self.schedule_delivery)
+        self.connect_requested.connect(self.worker.connect_broadcast)
+        self.thread = QThread()
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.start)
+
+        self.analytics_worker = None
+        if analytics is not None:
+            self.analytics_worker = AnalyticsWorker(analytics, config.get('ANALYTICS_INTERVAL', ANALYTICS_INTERVAL))
+            self.analytics_worker.moveToThread(self.thread)
+            self.thread.started.connect(self.analytics_worker.start)
+
+        self.thread.start()
+        QCoreApplication.instance().aboutToQuit.connect(self.stop)
 
     def connect(self, broadcast: Broadcast):
+        """Starts following a broadcast's chat. The websocket address is fetched on the chat thread."""
+        self.connect_requested.emit(broadcast)
+
+    def replay(self, frames, speed: float = 1.0) -> ReplayWorker:
+        """Replays frames from snookey3.core.replay instead of a live websocket."""
+        self.replay_worker = ReplayWorker(self.pipeline, frames, speed)
+        self.replay_worker.pending.connect(self.schedule_delivery)
+        self.replay_worker.moveToThread(self.thread)
+        QMetaObject.invokeMethod(self.replay_worker, 'start', Qt.QueuedConnection)
+        return self.replay_worker
+
+    def stats(self) -> dict:
+        stats = self.pipeline.stats()
+        stats.update(self.connection_stats.as_dict())
+        return stats
+
+    def stop(self):
+        # The connection would otherwise keep this chat and its thread alive until the application quits.
         try:
-            live_comments_websocket = broadcast.live_comments_websocket()
-        except UnsuccessfulRequestException as e:
-            logger.error('Could not fetch the video json. Status code: %i. Response: %s', 
-                         e.status_code, e.response_content)
-            raise
-        except KeyError:
-            logger.exception('Could not fetch the chat websocket address.')
-            raise
-            
-        self.websocket.open(QUrl(live_comments_websocket))
+            QCoreApplication.instance().aboutToQuit.disconnect(self.stop)
+        except TypeError:
+            pass
+        if self.thread.isRunning():
+            QMetaObject.invokeMethod(self.worker, 'stop', Qt.BlockingQueuedConnection)
+            if self.replay_worker is not None:
+                QMetaObject.invokeMethod(self.replay_worker, 'stop', Qt.BlockingQueuedConnection)
+            if self.analytics_worker is not None:
+                QMetaObject.invokeMethod(self.analytics_worker, 'stop', Qt.BlockingQueuedConnection)
+            self.thread.quit()
+            self.thread.wait()
+        self.batch_timer.stop()
+        if self.archive is not None:
+            self.deliver()
+            self.archive.close()
+            self.archive = None
 
-    @pyqtSlot(str)
-    def on_text_message_received(self, response):
-        comment = json.loads(response)
-        if comment['type'] != 'new_comment':
+    @pyqtSlot()
+    def schedule_delivery(self):
+        if self.batch_timer.isActive():
             return
-        self.comment_received.emit(comment)
+        elapsed = (monotonic() - self._last_delivery) * 1000
+        self.batch_timer.start(max(int(BATCH_INTERVAL - elapsed), 0))
+
+    @pyqtSlot()
+    def deliver(self):
+        self._last_delivery = monotonic()
+        batch = self.pipeline.drain()
+        if batch:
+            if self.archive is not None:
+                self.archive.append(batch)
+            self.comments_received.emit(batch)
+
+
+class ChatModel(QAbstractListModel):
+    """Holds the most recent messages in a ring buffer, so memory stays flat however long the stream runs."""
+
+    MessageRole = Qt.UserRole
+
+    def __init__(self, capacity: int = DEFAULT_HISTORY):
+        super(ChatModel, self).__init__()
+        self.messages = RingBuffer(capacity)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.messages)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self.messages[index.row()]
+        if role == self.MessageRole:
+            return message
+        if role == Qt.DisplayRole:
+            return f'{message.author}: {message.body}'
+        if role == Qt.ToolTipRole:
+            if message.status == outbox.FAILED:
+                return "This message couldn't be posted."
+            return message.body
+        return None
+
+    def append_messages(self, messages: list):
+        if not messages:
+            return
+        capacity = self.messages.capacity
+        if len(messages) > capacity:
+            messages = messages[-capacity:]
+
+        overflow = len(messages) - self.messages.free()
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            self.messages.discard(overflow)
+            self.endRemoveRows()
+
+        first = len(self.messages)
+        self.beginInsertRows(QModelIndex(), first, first + len(messages) - 1)
+        for message in messages:
+            self.messages.append(message)
+        self.endInsertRows()
+
+    def refresh_message(self, message: ChatMessage, search_depth: int = 500):
+        # Messages being updated are recent ones, so the search starts from the newest row.
+        last = len(self.messages) - 1
+        for row in range(last, max(last - search_depth, -1), -1):
+            if self.messages[row] is message:
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+                return
+
+
+class ChatDelegate(QStyledItemDelegate):
+    """
+    Paints messages from cached text layouts. The view asks for the size of every row, so each message is
+    laid out once per viewport width to learn its height, which is memoised on the message; only the layouts
+    of recently painted rows are kept.
+    """
+
+    def __init__(self, view: QListView, cache_size: int = 256):
+        super(ChatDelegate, self).__init__(view)
+        self.view = view
+        self.cache_size = cache_size
+        self._layouts = OrderedDict()
+        self._text_option = QTextOption()
+        self._text_option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+
+    def _layout(self, message: ChatMessage, width: int) -> QStaticText:
+        static_text = self._layouts.get(message)
+        if static_text is not None and static_text.textWidth() == width:
+            self._layouts.move_to_end(message)
+            return static_text
+
+        static_text = QStaticText(f'<b>{html.escape(message.author)}</b>: {html.escape(message.body)}')
+        static_text.setTextFormat(Qt.RichText)
+        static_text.setTextOption(self._text_option)
+        static_text.setTextWidth(width)
+        self._layouts[message] = static_text
+        if len(self._layouts) > self.cache_size:
+            self._layouts.popitem(last=False)
+        return static_text
+
+    def sizeHint(self, option, index):
+        message = index.data(ChatModel.MessageRole)
+        width = max(self.view.viewport().width(), 1)
+        if message.layout_width != width:
+            message.height = int(self._layout(message, width).size().height()) + ROW_PADDING * 2
+            message.layout_width = width
+        return QSize(width, message.height)
+
+    def paint(self, painter, option, index):
+        message = index.data(ChatModel.MessageRole)
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        elif message.flags & ChatMessage.HIGHLIGHTED:
+            painter.fillRect(option.rect, HIGHLIGHTED_COLOR)
+        if message.status == outbox.FAILED:
+            painter.setPen(FAILED_COLOR)
+        else:
+            painter.setPen(option.palette.color(QPalette.Text))
+        if message.status == outbox.PENDING:
+            painter.setOpacity(0.5)
+        painter.drawStaticText(QPointF(option.rect.left(), option.rect.top() + ROW_PADDING),
+                               self._layout(message, max(self.view.viewport().width(), 1)))
+        painter.restore()
+
+
+class ChatView(QListView):
+
+    def __init__(self, model: ChatModel):
+        super(ChatView, self).__init__()
+        self.delegate = ChatDelegate(self)
+        self.setModel(model)
+        self.setItemDelegate(self.delegate)
+        self.setWordWrap(True)
+        self.setUniformItemSizes(False)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(100)
+        self.setResizeMode(QListView.Adjust)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setFocusPolicy(Qt.NoFocus)
+
+        # Stick to the newest message unless the user has scrolled up to read older ones.
+        self._follow = True
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+        self.verticalScrollBar().rangeChanged.connect(self._on_range_changed)
+
+    def _on_scrolled(self, value: int):
+        self._follow = value >= self.verticalScrollBar().maximum() - 4
+
+    def _on_range_changed(self, minimum: int, maximum: int):
+        if self._follow:
+            self.verticalScrollBar().setValue(maximum)
+
+
+class ChatAnalyticsPanel(QWidget):
+
+    def __init__(self):
+        super(ChatAnalyticsPanel, self).__init__()
+        self.rates_label = QLabel()
+        self.authors_label = QLabel()
+        self.terms_label = QLabel()
+        self.terms_label.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+
+        self.layout = QVBoxLayout()
+        self.layout.addWidget(self.rates_label)
+        self.layout.addWidget(self.authors_label)
+        self.layout.addWidget(self.terms_label, 1)
+        self.setLayout(self.layout)
+
+        self.setFixedWidth(160)
+        self.update_snapshot({'rates': {}, 'unique_authors': {}, 'top_terms': []})
+
+    @pyqtSlot(dict)
+    def update_snapshot(self, snapshot: dict):
+        rates = ''.join(f'<br>{window}: {rate:g}' for window, rate in snapshot['rates'].items())
+        self.rates_label.setText(f'<b>Messages/s</b>{rates}')
+        authors = ''.join(f'<br>{window}: {count}' for window, count in snapshot['unique_authors'].items())
+        self.authors_label.setText(f'<b>Chatters</b>{authors}')
+        terms = ''.join(f'<br>{html.escape(term)} ({count})' for term, count in snapshot['top_terms'])
+        self.terms_label.setText(f'<b>Top terms</b>{terms}')
 
 
 class ChatWidget(QWidget):
 
+    message_status_changed = pyqtSignal(object)
+
     def __init__(self, broadcast: Broadcast):
         super(ChatWidget, self).__init__()
 
         self.broadcast = broadcast
+        # Needed to recognize the websocket copy of a comment that arrives before its POST response.
+        profile = broadcast.reddit.cached_profile()
+        self.username = profile.get('name') if profile else None
+        if self.username is None:
+            run_task(broadcast.reddit.username, on_finished=self.on_username_loaded)
+        # Local echoes waiting for delivery, and ids of delivered ones, so the copy arriving through
+        # the websocket isn't shown a second time.
+        self._echoes = OrderedDict()
+        self._sent_ids = OrderedDict()
 
         self.setWindowTitle('Chat')
-        self.chat = Chat()
-        self.chat.comment_received.connect(self.on_comment_received)
-        try:
-            self.chat.connect(self.broadcast)
-        except (KeyError, UnsuccessfulRequestException):
-            raise
+        archive = None
+        if config.get('ARCHIVE_CHAT', True):
+            try:
+                archive = ChatArchive(broadcast.stream_id)
+            except OSError:
+                logger.exception('Could not open the chat archive.')
+        analytics = ChatAnalytics() if config.get('CHAT_ANALYTICS', True) else None
+        filters = FilterEngine() if config.get('CHAT_FILTERS', True) else None
+        self.chat = Chat(archive, analytics, filters)
+        self.chat.comments_received.connect(self.on_comments_received)
+        # Connects in the background, so the chat is usually live by the time the window is opened.
+        self.chat.connect(self.broadcast)
+
+        self.outbox = outbox.Outbox(self.broadcast)
+        self._on_status_changed = self.message_status_changed.emit
+        self.outbox.status_changed.subscribe(self._on_status_changed)
+        self.message_status_changed.connect(self.on_message_status_changed)
 
-        self.comments_area = QTextEdit()
-        self.comments_area.setReadOnly(True)
+        self.model = ChatModel(config.get('CHAT_HISTORY', DEFAULT_HISTORY))
+        self.comments_area = ChatView(self.model)
 
         self.post_comment_line = QLineEdit()
         self.post_comment_line.setPlaceholderText('Send message (ENTER to submit)')
         self.post_comment_line.returnPressed.connect(self.post_comment)
 
         self.layout = QGridLayout()
-        self.layout.addWidget(self.comments_area)
-        self.layout.addWidget(self.post_comment_line)
+        self.layout.addWidget(self.comments_area, 0, 0)
+        self.layout.addWidget(self.post_comment_line, 1, 0, 1, 2)
+        self.analytics_panel = None
+        if self.chat.analytics_worker is not None:
+            self.analytics_panel = ChatAnalyticsPanel()
+            self.chat.analytics_worker.snapshot_ready.connect(self.analytics_panel.update_snapshot)
+            self.layout.addWidget(self.analytics_panel, 0, 1)
         self.setLayout(self.layout)
 
         self.setMinimumSize(320, 280)
 
-    @pyqtSlot(dict)
-    def on_comment_received(self, comment):
-        payload = comment['payload']
-        author = payload['author']
-        body = payload['body']
-        self.comments_area.append(f'<b>{author}</b>: {body}')
+    def _is_own_echo(self, comment: ChatMessage) -> bool:
+        if comment.id is not None and comment.id in self._sent_ids:
+            return True
+        if self.username is None or comment.author != self.username:
+            return False
+        # The websocket can beat the POST response, in which case the echo is matched by its text.
+        for echo in self._echoes.values():
+            if echo.body == comment.body and echo.id is None:
+                echo.id = comment.id
+                return True
+        return False
+
+    def on_username_loaded(self, username):
+        if self.username is None:
+            self.username = username
+
+    @pyqtSlot(list)
+    def on_comments_received(self, comments):
+        if self._echoes or self._sent_ids:
+            comments = [comment for comment in comments if not self._is_own_echo(comment)]
+        self.model.append_messages(comments)
 
     def post_comment(self):
-        try:
-            self.broadcast.post_comment(self.post_comment_line.text())
-        except UnsuccessfulRequestException as e:
-            logger.warning('Comment could not be posted. Status code: %i. Response: %s',
-                           e.status_code, e.response_content)
-            QMessageBox(self, f"Your comment couldn't be posted.\nStatus code: {e.status_code}")
-        else:
-            self.post_comment_line.clear()
+        text = self.post_comment_line.text().strip()
+        if not text:
+            return
+
+        message = self.outbox.submit(text)
+        echo = ChatMessage(None, self.username or 'You', text, flags=ChatMessage.OWN, status=outbox.PENDING)
+        self._echoes[message.local_id] = echo
+        self.model.append_messages([echo])
+        self.post_comment_line.clear()
+
+    @pyqtSlot(object)
+    def on_message_status_changed(self, message: outbox.OutgoingMessage):
+        echo = self._echoes.pop(message.local_id, None)
+        if echo is None:
+            return
+
+        echo.status = message.status
+        if message.status == outbox.SENT and message.comment:
+            self.username = message.comment.get('author', self.username)
+            comment_id = message.comment.get('id')
+            if comment_id:
+                echo.id = comment_id
+                self._sent_ids[comment_id] = None
+                if len(self._sent_ids) > 100:
+                    self._sent_ids.popitem(last=False)
+        self.model.refresh_message(echo)
+
+    def shutdown(self):
+        self.outbox.status_changed.unsubscribe(self._on_status_changed)
+        self.outbox.stop()
+        self.chat.stop()
+        self.close()
@@ -16,17 +16,21 @@
 
 import logging
 import webbrowser
+from threading import Thread
 
 import pyperclip
-from PyQt5.QtCore import Qt, pyqtSignal, QTimer, pyqtSlot
+from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
 from PyQt5.QtWidgets import QWidget, QGridLayout, QStackedWidget, QPushButton, QLineEdit, QComboBox, QMessageBox, \
-    QLabel
+    QLabel, QCheckBox
 
 from snookey3 import config
-from snookey3.core import callbacks
-from snookey3.core.reddit import r, Broadcast
+from snookey3.core import states
+from snookey3.core.availability import AvailabilityTracker
+from snookey3.core.reddit import r, Broadcast, RTMP_URL
+from snookey3.core.streamstats import get_poller
 from snookey3.core.exceptions import UnsuccessfulRequestException
-from snookey3.gui.chat import ChatWidget
+from snookey3.gui.bridge import get_bridge
+from snookey3.gui.tasks import run_task
 from snookey3.gui.widgets import TitleWidget, FooterWidget, LabeledLineEdit
 
 logger = logging.getLogger(__name__)
@@ -35,6 +39,7 @@ logger = logging.getLogger(__name__)
 class BroadcastReadyWidget(QWidget):
 
     new_broadcast = pyqtSignal()
+    stats_updated = pyqtSignal(object)
 
     def __init__(self, broadcast: Broadcast):
         super(BroadcastReadyWidget, self).__init__()
@@ -52,7 +57,7 @@ class BroadcastReadyWidget(QWidget):
         self.copy_streamer_key_button = QPushButton('Copy')
         self.copy_streamer_key_button.clicked.connect(lambda: pyperclip.copy(self.streamer_key))
 
-        self.rtmp_address_line = LabeledLineEdit('Server address', 'rtmp://ingest.redd.it/inbound/')
+        self.rtmp_address_line = LabeledLineEdit('Server address', RTMP_URL)
         self.rtmp_address_line.line_edit.setPlaceholderText('RTMP address')
         self.rtmp_address_line.line_edit.setReadOnly(True)
 
@@ -70,16 +75,23 @@ class BroadcastReadyWidget(QWidget):
         self.instructions_label = QLabel(self.instructions)
         self.instructions_label.setAlignment(Qt.AlignCenter)
 
+        self.stats_label = QLabel('Waiting for stream stats...')
+        self.stats_label.setAlignment(Qt.AlignCenter)
+        # Samples arrive on the poller thread and are handed to the GUI thread through a queued signal.
+        self.stats = get_poller().watch(self.broadcast)
+        self.stats_updated.connect(self.on_stats_updated)
+        self._on_stats_updated = self.stats_updated.emit
+        self.stats.updated.subscribe(self._on_stats_updated)
+
         self.open_chat_window_button = QPushButton('Open chat window')
-        try:
-            self.chat = ChatWidget(self.broadcast)
-        except (KeyError, UnsuccessfulRequestException):
-            self.open_chat_window_button.setEnabled(False)
-        else:
-            self.open_chat_window_button.clicked.connect(self.chat.show)
+        # QtWebSockets is only loaded once a broadcast actually needs a chat. The chat starts connecting
+        # right away, on its own thread, while the user sets up their broadcasting software.
+        from snookey3.gui.chat import ChatWidget
+        self.chat = ChatWidget(self.broadcast)
+        self.open_chat_window_button.clicked.connect(self.chat.show)
 
         self.new_broadcast_button = QPushButton('New broadcast')
-        self.new_broadcast_button.clicked.connect(self.new_broadcast.emit)
+        self.new_broadcast_button.clicked.connect(self.on_new_broadcast_clicked)
 
         self.main_layout = QGridLayout()
         self.main_layout.addWidget(self.streamer_key_line, 0, 0, Qt.AlignVCenter)
@@ -87,13 +99,31 @@ class BroadcastReadyWidget(QWidget):
         self.main_layout.addWidget(self.rtmp_address_line, 1, 0, Qt.AlignVCenter)
         self.main_layout.addWidget(self.copy_rtmp_address_button, 1, 1, Qt.AlignVCenter)
         self.main_layout.addWidget(self.instructions_label, 2, 0, 1, 2, Qt.AlignVCenter)
-        self.main_layout.addWidget(self.open_browser_button, 3, 0, Qt.AlignBottom)
-        self.main_layout.addWidget(self.copy_stream_url_button, 3, 1, Qt.AlignBottom)
-        self.main_layout.addWidget(self.open_chat_window_button, 4, 0, 1, 2, Qt.AlignTop)
-        self.main_layout.addWidget(self.new_broadcast_button, 5, 0, 1, 2, Qt.AlignVCenter)
+        self.main_layout.addWidget(self.stats_label, 3, 0, 1, 2, Qt.AlignVCenter)
+        self.main_layout.addWidget(self.open_browser_button, 4, 0, Qt.AlignBottom)
+        self.main_layout.addWidget(self.copy_stream_url_button, 4, 1, Qt.AlignBottom)
+        self.main_layout.addWidget(self.open_chat_window_button, 5, 0, 1, 2, Qt.AlignTop)
+        self.main_layout.addWidget(self.new_broadcast_button, 6, 0, 1, 2, Qt.AlignVCenter)
 
         self.setLayout(self.main_layout)
 
+    def on_stats_updated(self, stats):
+        sample = stats.series.latest()
+        if sample is None:
+            return
+        parts = [sample['state'].replace('_', ' ').capitalize()]
+        if sample['viewers'] is not None:
+            parts.append(f"{sample['viewers']} watching")
+        if sample['upvotes'] is not None:
+            parts.append(f"{sample['upvotes']} upvotes")
+        self.stats_label.setText(' · '.join(parts))
+
+    def on_new_broadcast_clicked(self):
+        self.stats.updated.unsubscribe(self._on_stats_updated)
+        get_poller().unwatch(self.broadcast)
+        self.chat.shutdown()
+        self.new_broadcast.emit()
+
 
 class BroadcastSetupWidget(QWidget):
 
@@ -102,17 +132,30 @@ class BroadcastSetupWidget(QWidget):
     def __init__(self):
         super(BroadcastSetupWidget, self).__init__()
 
-        self.username = r.username()
+        self.username = None
 
-        self.username_line = QLineEdit(self.username)
+        self.username_line = QLineEdit()
         self.username_line.setPlaceholderText('u/username')
         self.username_line.setReadOnly(True)
 
+        # The profile is cached on the client, so coming back here after a broadcast costs no request.
+        profile = r.cached_profile()
+        if profile is not None:
+            self.on_profile_loaded(profile)
+        else:
+            self.username_line.setPlaceholderText('Loading...')
+            run_task(r.profile, on_finished=self.on_profile_loaded, on_failed=self.on_profile_failed)
+
         self.broadcast_title_line = QLineEdit()
         self.broadcast_title_line.setPlaceholderText('Broadcast title...')
 
         self.subreddit_combo = QComboBox()
         self.subreddit_combo.addItems(config['SUBREDDITS'])
+        get_bridge().subreddits_updated.connect(self.on_subreddits_updated)
+
+        self.availability = AvailabilityTracker(r)
+        self.fallback_checkbox = QCheckBox('Try the other subreddits if this one is unavailable')
+        self.fallback_checkbox.setChecked(config.get('FALLBACK_TO_AVAILABLE_SUBREDDIT', False))
 
         self.create_broadcast_button = QPushButton('Create broadcast')
         self.create_broadcast_button.clicked.connect(self.create_broadcast)
@@ -121,10 +164,31 @@ class BroadcastSetupWidget(QWidget):
         self.main_layout.addWidget(self.username_line, 0, 0)
         self.main_layout.addWidget(self.broadcast_title_line, 1, 0)
         self.main_layout.addWidget(self.subreddit_combo, 2, 0)
-        self.main_layout.addWidget(self.create_broadcast_button, 3, 0)
+        self.main_layout.addWidget(self.fallback_checkbox, 3, 0)
+        self.main_layout.addWidget(self.create_broadcast_button, 4, 0)
 
         self.setLayout(self.main_layout)
 
+    @pyqtSlot(object)
+    def on_profile_loaded(self, profile: dict):
+        self.username = profile['name']
+        self.username_line.setText(self.username)
+        self.username_line.setToolTip(f"{profile.get('link_karma', 0)} post karma, "
+                                      f"{profile.get('comment_karma', 0)} comment karma")
+
+    @pyqtSlot(object)
+    def on_profile_failed(self, exception: Exception):
+        logger.warning('Could not load the account profile: %r', exception)
+        self.username_line.setPlaceholderText('u/username')
+
+    @pyqtSlot(list)
+    def on_subreddits_updated(self, subreddits: list):
+        current = self.subreddit_combo.currentText()
+        self.subreddit_combo.clear()
+        self.subreddit_combo.addItems(subreddits)
+        if current in subreddits:
+            self.subreddit_combo.setCurrentText(current)
+
     def create_broadcast(self):
         title = self.broadcast_title_line.text().strip()
 
@@ -133,17 +197,47 @@ class BroadcastSetupWidget(QWidget):
             return
 
         subreddit = self.subreddit_combo.currentText()
-
-        try:
-            broadcast = r.broadcast.post(title, subreddit)
-        except UnsuccessfulRequestException as e:
-            message = 'Broadcast creation failed.'
-            if e.status_code == 503:
-                message += f'\n{subreddit} is currently unavailable.'
-            logger.warning(message + 'Status code: %i, full response: %s', e.status_code, e.response_content)
-            QMessageBox.warning(self, 'Broadcast creation unsuccessful', message)
+        if self.fallback_checkbox.isChecked():
+            # The chosen subreddit first, then the rest in the order they're listed.
+            listed = [self.subreddit_combo.itemText(i) for i in range(self.subreddit_combo.count())]
+            subreddits = [subreddit] + [listed_subreddit for listed_subreddit in listed
+                                        if listed_subreddit != subreddit]
+            run_task(self.availability.post_first_available, title, subreddits,
+                     on_finished=self.on_broadcast_posted, on_failed=self.on_broadcast_failed)
         else:
-            self.broadcast_created.emit(broadcast)
+            run_task(self.availability.post, title, subreddit,
+                     on_finished=self.on_broadcast_posted, on_failed=self.on_broadcast_failed)
+        self.set_creating(True)
+
+    def set_creating(self, creating: bool):
+        # The inputs stay locked while the request runs, so the error message matches what was asked for.
+        self.subreddit_combo.setEnabled(not creating)
+        self.fallback_checkbox.setEnabled(not creating)
+        self.create_broadcast_button.setEnabled(not creating)
+        self.create_broadcast_button.setText('Creating broadcast...' if creating else 'Create broadcast')
+
+    @pyqtSlot(object)
+    def on_broadcast_posted(self, broadcast: Broadcast):
+        self.broadcast_created.emit(broadcast)
+
+    @pyqtSlot(object)
+    def on_broadcast_failed(self, exception: Exception):
+        self.set_creating(False)
+        if not isinstance(exception, UnsuccessfulRequestException):
+            logger.error('Broadcast creation failed: %r', exception)
+            QMessageBox.warning(self, 'Broadcast creation unsuccessful',
+                                "Broadcast creation failed.\nCouldn't reach Reddit.")
+            return
+
+        message = 'Broadcast creation failed.'
+        if exception.status_code == 503:
+            if self.fallback_checkbox.isChecked():
+                message += '\nNone of the subreddits is currently available.'
+            else:
+                message += f'\n{self.subreddit_combo.currentText()} is currently unavailable.'
+        logger.warning(message + 'Status code: %i, full response: %s',
+                       exception.status_code, exception.response_content)
+        QMessageBox.warning(self, 'Broadcast creation unsuccessful', message)
 
 
 class AuthorizationWidget(QWidget):
@@ -168,19 +262,14 @@ class AuthorizationWidget(QWidget):
 
         self.setLayout(self.main_layout)
 
-        self.timer = QTimer()
-        self.timer.setInterval(1000)
-        self.timer.timeout.connect(self.look_for_token)
+        # Fires as soon as the token exchange finishes on the callback server (or a stored token is restored).
+        get_bridge().authorized.connect(self.authorized)
 
-    def authorize(self):
-        webbrowser.open(r.auth.url(callbacks.create_state()))
-        self.timer.start()
+        # Reading the stored credentials decrypts them, so even checking for them happens off the GUI thread.
+        Thread(target=r.auth.restore, daemon=True).start()
 
-    def look_for_token(self):
-        if r.auth.access_token:
-            self.authorized.emit()
-            self.timer.stop()
-            return
+    def authorize(self):
+        webbrowser.open(r.auth.url(states.store.create()))
 
 
 class MainWindow(QWidget):
@@ -224,7 +313,8 @@ class MainWindow(QWidget):
         self.switch_to_widget(broadcast_ready_widget)
 
     def switch_to_widget(self, widget: QWidget):
-        focus_widget = self.main_stacked.focusWidget()
+        old_widget = self.main_stacked.currentWidget()
         self.main_stacked.setCurrentIndex(self.main_stacked.addWidget(widget))
-        self.main_stacked.removeWidget(focus_widget)
-        focus_widget.deleteLater()
+        if old_widget is not None:
+            self.main_stacked.removeWidget(old_widget)
+            old_widget.deleteLater()
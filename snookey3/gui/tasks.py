@@ -0,0 +1,78 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module runs blocking calls, such as Reddit requests, on Qt's global thread pool and hands their
+results back to the GUI thread.
+"""
+
+import logging
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+logger = logging.getLogger(__name__)
+
+# Tasks are kept referenced until their result has been delivered on the GUI thread, so that their
+# signal object is never destroyed from a pool thread.
+_running = set()
+
+
+class TaskSignals(QObject):
+
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class Task(QRunnable):
+
+    def __init__(self, function, *args, **kwargs):
+        super(Task, self).__init__()
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = TaskSignals()
+        self.signals.finished.connect(self._done)
+        self.signals.failed.connect(self._done)
+
+    def run(self):
+        try:
+            result = self.function(*self.args, **self.kwargs)
+        except Exception as e:
+            logger.debug('Background task %r failed.', self.function, exc_info=True)
+            self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(result)
+
+    def _done(self, _):
+        _running.discard(self)
+
+
+def run_task(function, *args, on_finished=None, on_failed=None, **kwargs) -> Task:
+    """
+    Calls function(*args, **kwargs) on a pool thread. on_finished receives the result and on_failed
+    the exception, both on the GUI thread; bound methods of deleted widgets are not called.
+    """
+    task = Task(function, *args, **kwargs)
+    # Connected after the bookkeeping slot, so the callbacks run once the task is no longer tracked.
+    if on_finished is not None:
+        task.signals.finished.connect(on_finished)
+    if on_failed is not None:
+        task.signals.failed.connect(on_failed)
+    task.setAutoDelete(False)
+    _running.add(task)
+    QThreadPool.globalInstance().start(task)
+    return task
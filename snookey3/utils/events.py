@@ -0,0 +1,53 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides a minimal thread-safe publish/subscribe event.
+"""
+
+import logging
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class Event:
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = Lock()
+
+    def subscribe(self, callback):
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def emit(self, *args):
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        # Subscribers run on the emitting thread; GUI code has to hop threads through a Qt signal.
+        for callback in subscribers:
+            try:
+                callback(*args)
+            except Exception:
+                logger.exception('Event subscriber %r failed.', callback)
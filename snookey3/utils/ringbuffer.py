@@ -0,0 +1,73 @@
+#  Snookey3 - Unofficial streaming utility for the Reddit Public Access Network
+#  Copyright (C) 2020 warpspeedchic <https://github.com/warpspeedchic/>
+#
+#  Snookey3 is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Snookey3 is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Snookey3.  If not, see <https://www.gnu.org/licenses/>.
+
+
+"""
+This module provides a fixed-capacity ring buffer with O(1) indexed access.
+"""
+
+
+class RingBuffer:
+
+    __slots__ = ('capacity', '_items', '_start', '_size')
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError('capacity has to be positive')
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('ring buffer index out of range')
+        return self._items[(self._start + index) % self.capacity]
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self._items[(self._start + i) % self.capacity]
+
+    def free(self) -> int:
+        return self.capacity - self._size
+
+    def append(self, item):
+        """Appends an item, overwriting and returning the oldest one if the buffer is full."""
+        end = (self._start + self._size) % self.capacity
+        evicted = None
+        if self._size == self.capacity:
+            evicted = self._items[end]
+            self._start = (self._start + 1) % self.capacity
+        else:
+            self._size += 1
+        self._items[end] = item
+        return evicted
+
+    def discard(self, count: int):
+        """Drops the oldest count items."""
+        count = min(count, self._size)
+        for i in range(count):
+            self._items[(self._start + i) % self.capacity] = None
+        self._start = (self._start + count) % self.capacity
+        self._size -= count
+
+    def clear(self):
+        self.discard(self._size)
@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+import aiohttp
+import pytest
+
+from snookey3.core import aioreddit
+from snookey3.core.aioreddit import AsyncReddit
+
+
+class FakeResponse:
+
+    def __init__(self, status: int, body: dict):
+        self.status = status
+        self.headers = {}
+        self.content = json.dumps(body).encode()
+
+    async def read(self):
+        return self.content
+
+    async def json(self, content_type=None):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = 0
+
+    async def request(self, method: str, url: str, **kwargs):
+        self.requests += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else (200, {'access_token': 'access', 'expires_in': 3600})
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(*outcome)
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(aioreddit, 'RETRY_AFTER', 0.01)
+
+
+def refresh_in_background(*outcomes) -> AsyncReddit:
+    async def run():
+        reddit = AsyncReddit('client', 'http://localhost/callback', 'tests', session=FakeSession(*outcomes))
+        reddit.auth.refresh_token = 'stored'
+        reddit.auth.schedule_refresh(0)
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if reddit.auth._refresh_task is None or reddit.auth.access_token:
+                break
+        await reddit.close()
+        return reddit
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('rejection', [(400, {'error': 'invalid_grant'}), (401, {})])
+def test_rejected_refresh_tokens_are_forgotten(rejection):
+    reddit = refresh_in_background(rejection)
+    assert reddit.auth.refresh_token is None
+    assert reddit.auth.access_token is None
+    assert reddit.session.requests == 1
+
+
+@pytest.mark.parametrize('error', [(503, {}), aiohttp.ClientConnectionError('network down'), asyncio.TimeoutError()])
+def test_transient_failures_are_retried(error):
+    reddit = refresh_in_background(error, error)
+    assert reddit.auth.access_token == 'access'
+    assert reddit.auth.refresh_token == 'stored'
+    assert reddit.session.requests == 3
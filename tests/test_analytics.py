@@ -0,0 +1,68 @@
+from snookey3.core.analytics import ChatAnalytics, HyperLogLog, MisraGries, terms
+from snookey3.core.chat import ChatMessage
+
+
+def test_hyperloglog_estimate():
+    sketch = HyperLogLog()
+    for i in range(5000):
+        sketch.add('user%d' % i)
+        sketch.add('user%d' % i)
+
+    assert abs(sketch.estimate() - 5000) < 500
+
+
+def test_hyperloglog_merge():
+    first, second, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for i in range(300):
+        first.add('user%d' % i)
+        second.add('user%d' % (i + 200))
+    for i in range(500):
+        union.add('user%d' % i)
+    first.merge(second)
+
+    assert first.registers == union.registers
+    assert abs(first.estimate() - 500) < 50
+
+
+def test_misra_gries_keeps_heavy_hitters():
+    summary = MisraGries(capacity=4)
+    for i in range(100):
+        summary.add('hello')
+        summary.add('noise%d' % i)
+
+    assert summary.top(1)[0][0] == 'hello'
+
+
+def test_terms_skip_stopwords_and_short_words():
+    assert terms('The stream is LIVE, go watch it at 1080p') == {'stream', 'live', 'watch'}
+
+
+def stream(analytics: ChatAnalytics, start: int, seconds: int, per_second: int):
+    for second in range(start, start + seconds):
+        analytics.add([ChatMessage(None, 'author%d' % (i % 3), 'hello stream') for i in range(per_second)], second)
+
+
+def test_snapshot_rates():
+    analytics = ChatAnalytics()
+    stream(analytics, 1000, 20, 10)
+
+    snapshot = analytics.snapshot(now=1020)
+    assert snapshot['total'] == 200
+    # Early in a stream, rates are averaged over the time since the first comment.
+    assert snapshot['rates'] == {'10s': 10.0, '1m': 10.0, '5m': 10.0}
+    assert snapshot['unique_authors']['total'] == 3
+    assert sorted(snapshot['top_terms']) == [('hello', 200), ('stream', 200)]
+
+
+def test_snapshot_forgets_old_comments():
+    analytics = ChatAnalytics()
+    stream(analytics, 1000, 20, 10)
+
+    snapshot = analytics.snapshot(now=1400)
+    assert snapshot['rates'] == {'10s': 0.0, '1m': 0.0, '5m': 0.0}
+    assert snapshot['unique_authors']['total'] == 3
+    assert snapshot['top_terms'] == []
+
+
+def test_empty_snapshot():
+    assert ChatAnalytics().snapshot(now=0)['total'] == 0
@@ -0,0 +1,81 @@
+import json
+import os
+
+from snookey3.core.archive import ChatArchive, ChatArchiveReader
+from snookey3.core.chat import ChatMessage
+
+
+def started(directory, broadcast_id: str) -> float:
+    with open(os.path.join(directory, broadcast_id, 'meta.json')) as meta_file:
+        return json.load(meta_file)['started']
+
+
+def messages(start: float, offsets) -> list:
+    return [ChatMessage('c%d' % i, 'author%d' % (i % 3), 'comment %d ünïcode' % i, start + offset)
+            for i, offset in enumerate(offsets)]
+
+
+def write(directory, broadcast_id: str, offsets, compress: bool = True, batches: int = 1) -> list:
+    archive = ChatArchive(broadcast_id, str(directory), compress=compress, segment_size=3, flush_interval=0.01)
+    written = messages(started(directory, broadcast_id), offsets)
+    step = -(-len(written) // batches)
+    for i in range(0, len(written), step):
+        archive.append(written[i:i + step])
+    archive.close()
+    return written
+
+
+def summary(chat) -> list:
+    return [(message.id, message.author, message.body, message.created) for message in chat]
+
+
+def test_round_trip_across_segments(tmp_path):
+    written = write(tmp_path, 'abc', range(10))
+
+    with ChatArchiveReader('abc', str(tmp_path)) as reader:
+        assert reader.segments == 4
+        assert summary(reader.read()) == summary(written)
+
+
+def test_round_trip_uncompressed_in_batches(tmp_path):
+    written = write(tmp_path, 'abc', range(10), compress=False, batches=4)
+
+    with ChatArchiveReader('abc', str(tmp_path)) as reader:
+        assert reader.segments >= 4
+        assert summary(reader.read()) == summary(written)
+
+
+def test_read_time_range_across_segments(tmp_path):
+    written = write(tmp_path, 'abc', range(10))
+
+    with ChatArchiveReader('abc', str(tmp_path)) as reader:
+        # Both ends are inclusive and fall inside segments rather than on their boundaries.
+        assert summary(reader.read(4, 7)) == summary(written[4:8])
+        assert summary(reader.read(8)) == summary(written[8:])
+        assert summary(reader.read(0, 0)) == summary(written[:1])
+        assert list(reader.read(20)) == []
+
+
+def test_reopened_archive_appends(tmp_path):
+    first = write(tmp_path, 'abc', range(5))
+    second = write(tmp_path, 'abc', range(5, 8))
+
+    with ChatArchiveReader('abc', str(tmp_path)) as reader:
+        assert summary(reader.read()) == summary(first + second)
+
+
+def test_partial_index_entry_is_ignored(tmp_path):
+    written = write(tmp_path, 'abc', range(10))
+    with open(os.path.join(str(tmp_path), 'abc', 'chat.idx'), 'ab') as index_file:
+        index_file.write(b'\x00' * 5)
+
+    with ChatArchiveReader('abc', str(tmp_path)) as reader:
+        assert reader.segments == 4
+        assert summary(reader.read()) == summary(written)
+
+
+def test_empty_archive(tmp_path):
+    ChatArchive('abc', str(tmp_path)).close()
+
+    with ChatArchiveReader('abc', str(tmp_path)) as reader:
+        assert list(reader.read()) == []
@@ -0,0 +1,70 @@
+import pytest
+
+from snookey3.core.availability import AvailabilityCache, AvailabilityTracker
+from snookey3.core.exceptions import UnsuccessfulRequestException
+
+
+class FakeBroadcastManager:
+
+    def __init__(self, unavailable: set, status_code: int = 503):
+        self.unavailable = unavailable
+        self.status_code = status_code
+        self.attempts = []
+
+    def post(self, title: str, subreddit: str):
+        self.attempts.append(subreddit)
+        if subreddit in self.unavailable:
+            raise UnsuccessfulRequestException(self.status_code, b'')
+        return subreddit
+
+
+class FakeReddit:
+
+    def __init__(self, unavailable: set = frozenset(), status_code: int = 503):
+        self.broadcast = FakeBroadcastManager(unavailable, status_code)
+
+
+def test_falls_through_to_the_first_subreddit_that_accepts():
+    reddit = FakeReddit({'a', 'b'})
+    tracker = AvailabilityTracker(reddit, AvailabilityCache())
+    assert tracker.post_first_available('title', ['a', 'b', 'c', 'd']) == 'c'
+    assert reddit.broadcast.attempts == ['a', 'b', 'c']
+    assert tracker.unavailable(['a', 'b', 'c', 'd']) == {'a', 'b'}
+    assert tracker.cache.get('c') is True
+
+
+def test_recently_unavailable_subreddits_are_tried_last():
+    reddit = FakeReddit({'a'})
+    tracker = AvailabilityTracker(reddit, AvailabilityCache())
+    tracker.cache.put('a', False)
+    tracker.cache.put('b', False)
+    assert tracker.post_first_available('title', ['a', 'b', 'c']) == 'c'
+    assert reddit.broadcast.attempts == ['c']
+
+    reddit.broadcast.unavailable = {'a', 'c'}
+    tracker.cache.put('c', False)
+    assert tracker.post_first_available('title', ['a', 'b', 'c']) == 'b'
+
+
+def test_other_errors_are_not_cached_and_stop_the_search():
+    reddit = FakeReddit({'a'}, status_code=500)
+    tracker = AvailabilityTracker(reddit, AvailabilityCache())
+    with pytest.raises(UnsuccessfulRequestException):
+        tracker.post_first_available('title', ['a', 'b'])
+    assert reddit.broadcast.attempts == ['a']
+    assert tracker.cache.get('a') is None
+
+
+def test_raises_the_last_503_when_nothing_accepts():
+    tracker = AvailabilityTracker(FakeReddit({'a', 'b'}), AvailabilityCache())
+    with pytest.raises(UnsuccessfulRequestException) as error:
+        tracker.post_first_available('title', ['a', 'b'])
+    assert error.value.status_code == 503
+
+
+def test_cache_expiry():
+    cache = AvailabilityCache(ttl=0, negative_ttl=60)
+    cache.put('Available', True)
+    cache.put('Full', False)
+    assert cache.get('available') is None
+    assert cache.get('full') is False
@@ -0,0 +1,78 @@
+import json
+
+from snookey3.core.chat import ChatPipeline
+
+
+def frame(comment_id: str, body: str = 'hello') -> str:
+    return json.dumps({'type': 'new_comment',
+                       'payload': {'_id36': comment_id, 'author': 'someone', 'body': body, 'created_utc': 1.0}})
+
+
+def test_comments_are_delivered_in_batches():
+    pipeline = ChatPipeline()
+
+    # Only the first comment into an empty queue asks for a drain.
+    assert pipeline.feed(frame('a'))
+    assert not pipeline.feed(frame('b'))
+    assert len(pipeline.drain()) == 2
+    assert pipeline.drain() == []
+    assert pipeline.feed(frame('c'))
+    assert len(pipeline.drain()) == 1
+
+    stats = pipeline.stats()
+    assert (stats['received'], stats['delivered'], stats['batches'], stats['coalesced']) == (3, 3, 2, 1)
+    assert stats['queue_depth'] == 0
+
+
+def test_other_frames_are_counted_and_skipped():
+    pipeline = ChatPipeline()
+
+    assert not pipeline.feed('not json')
+    assert not pipeline.feed(json.dumps({'type': 'delete_comment', 'payload': {}}))
+    assert not pipeline.feed(json.dumps(['new_comment']))
+
+    stats = pipeline.stats()
+    assert (stats['received'], stats['malformed'], stats['ignored']) == (3, 1, 2)
+    assert pipeline.drain() == []
+
+
+def test_oldest_comments_are_dropped_when_the_queue_is_full():
+    pipeline = ChatPipeline(max_pending=3)
+    for i in range(5):
+        pipeline.feed(frame(str(i), f'comment {i}'))
+
+    assert pipeline.stats()['queue_depth'] == 3
+    assert pipeline.stats()['dropped'] == 2
+    assert len(pipeline.drain()) == 3
+
+
+def test_replayed_comments_are_dropped():
+    pipeline = ChatPipeline()
+    pipeline.feed(frame('a'))
+    pipeline.feed(frame('b'))
+    pipeline.drain()
+
+    # After a reconnect the server sends recent comments again.
+    pipeline.feed(frame('b'))
+    pipeline.feed(frame('c'))
+
+    assert [comment.id for comment in pipeline.drain()] == ['c']
+    assert pipeline.stats()['duplicates'] == 1
+
+
+def test_comments_without_an_id_are_deduplicated_by_content():
+    pipeline = ChatPipeline()
+    for body in ('same', 'same', 'other'):
+        pipeline.feed(json.dumps({'type': 'new_comment',
+                                  'payload': {'author': 'someone', 'body': body, 'created_utc': 1.0}}))
+
+    assert [comment.body for comment in pipeline.drain()] == ['same', 'other']
+
+
+def test_dedupe_window_is_bounded():
+    pipeline = ChatPipeline(dedupe_window=2)
+    for comment_id in ('a', 'b', 'c', 'a'):
+        pipeline.feed(frame(comment_id))
+
+    assert [comment.id for comment in pipeline.drain()] == ['a', 'b', 'c', 'a']
+    assert len(pipeline._seen) == 2
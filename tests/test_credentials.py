@@ -0,0 +1,49 @@
+import os
+import stat
+
+from snookey3.core.credentials import CredentialStore
+
+
+def test_round_trip(tmp_path):
+    store = CredentialStore(str(tmp_path / 'credentials'))
+    assert store.load('client') is None
+
+    store.save('client', 'token')
+    store.save('other', 'other token')
+
+    assert store.load('client')['refresh_token'] == 'token'
+    # A second instance, e.g. another running process, shares the store through the key file.
+    assert CredentialStore(str(tmp_path / 'credentials')).load('other')['refresh_token'] == 'other token'
+
+
+def test_tokens_are_encrypted_and_private(tmp_path):
+    store = CredentialStore(str(tmp_path))
+    store.save('client', 'secret-refresh-token')
+
+    with open(store.path, 'rb') as tokens_file:
+        assert b'secret-refresh-token' not in tokens_file.read()
+    if os.name != 'nt':
+        for path in (store.path, store.key_path):
+            assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_delete(tmp_path):
+    store = CredentialStore(str(tmp_path))
+    store.delete('client')
+    store.save('client', 'token')
+    store.save('other', 'other token')
+
+    store.delete('client')
+    assert store.load('client') is None
+    assert store.load('other')['refresh_token'] == 'other token'
+
+
+def test_store_encrypted_with_another_key_is_ignored(tmp_path):
+    from cryptography.fernet import Fernet
+
+    store = CredentialStore(str(tmp_path))
+    store.save('client', 'token')
+    with open(store.key_path, 'wb') as key_file:
+        key_file.write(Fernet.generate_key())
+
+    assert CredentialStore(str(tmp_path)).load('client') is None
@@ -0,0 +1,64 @@
+from threading import Event, Thread
+from time import sleep
+
+from snookey3.utils.filelock import FileLock
+
+
+def test_threads_sharing_a_lock_take_turns(tmp_path):
+    lock = FileLock(str(tmp_path / 'test.lock'))
+    holders = []
+    overlaps = []
+
+    def work():
+        for _ in range(50):
+            with lock:
+                holders.append(1)
+                if len(holders) > 1:
+                    overlaps.append(1)
+                holders.pop()
+
+    threads = [Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert not overlaps
+    assert lock._fd is None
+
+
+def test_waiting_thread_gets_the_lock_after_release(tmp_path):
+    lock = FileLock(str(tmp_path / 'test.lock'))
+    acquired = Event()
+
+    def wait():
+        with lock:
+            acquired.set()
+
+    lock.acquire()
+    waiter = Thread(target=wait, daemon=True)
+    waiter.start()
+    sleep(0.1)
+    assert not acquired.is_set()
+    lock.release()
+
+    assert acquired.wait(timeout=5)
+    with lock:
+        pass
+
+
+def test_release_without_acquire(tmp_path):
+    FileLock(str(tmp_path / 'test.lock')).release()
+
+
+def test_lock_is_reusable_after_a_failed_acquire(tmp_path):
+    lock = FileLock(str(tmp_path / 'missing' / 'test.lock'))
+    try:
+        lock.acquire()
+    except OSError:
+        pass
+    (tmp_path / 'missing').mkdir()
+
+    with lock:
+        pass
@@ -0,0 +1,117 @@
+import itertools
+import json
+import os
+
+from snookey3.core.chat import ChatMessage
+from snookey3.core.filters import Matcher, RuleFile, FilterEngine, WORD_PATTERN
+
+
+def matches(matcher: Matcher, text: str) -> bool:
+    return matcher.matches(text, WORD_PATTERN.findall(text.lower()))
+
+
+def test_keywords_match_whole_words_regardless_of_case():
+    matcher = Matcher(keywords=['spoiler', 'bad word', 'c++'])
+    assert matches(matcher, 'a SPOILER here')
+    assert not matches(matcher, 'spoilers are fine')
+    assert matches(matcher, 'a Bad Word here')
+    assert not matches(matcher, 'badword')
+    assert matches(matcher, 'I like c++ a lot')
+
+
+def test_patterns_ignore_case():
+    matcher = Matcher(patterns=['spoil'])
+    assert matches(matcher, 'SPOILER')
+
+
+def test_leading_inline_flags_are_kept():
+    assert matches(Matcher(patterns=['(?i)spoil']), 'Spoiler')
+    assert matches(Matcher(patterns=['(?s)a.b']), 'a\nb')
+    assert matches(Matcher(patterns=['(?x) a b  # a comment']), 'ab')
+
+
+def test_repeated_named_groups_in_different_rules():
+    matcher = Matcher(patterns=['(?P<word>foo)', '(?P<word>bar)'])
+    assert matches(matcher, 'foo')
+    assert matches(matcher, 'bar')
+    assert not matches(matcher, 'baz')
+
+
+def test_numbered_backreferences_keep_their_groups():
+    matcher = Matcher(patterns=['(x)y', r'(a)\1'])
+    assert matches(matcher, 'aa')
+    assert matches(matcher, 'xy')
+    assert not matches(matcher, 'ab')
+
+
+def test_named_backreferences():
+    matcher = Matcher(patterns=['(?P<c>z)(?P=c)'])
+    assert matches(matcher, 'zz')
+    assert not matches(matcher, 'z')
+
+
+def test_invalid_patterns_are_skipped():
+    matcher = Matcher(patterns=['[', 'a)|(b', 'ok'])
+    assert matches(matcher, 'ok')
+    assert not matches(matcher, 'a')
+    assert not matches(matcher, 'b')
+
+
+def test_empty_matcher():
+    matcher = Matcher()
+    assert not matcher
+    assert not matches(matcher, 'anything')
+
+
+_mtimes = itertools.count(1)
+
+
+def write_rules(path, rules):
+    path.write_text(rules if isinstance(rules, str) else json.dumps(rules))
+    # Coarse file system timestamps could otherwise hide quick successive writes.
+    mtime = next(_mtimes) * 10 ** 9
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_engine_mutes_blocks_and_highlights(tmp_path):
+    path = tmp_path / 'filters.json'
+    write_rules(path, {'mute': ['Spammer'],
+                       'block': {'keywords': ['spoiler'], 'patterns': [r'https?://\S+']},
+                       'highlight': {'keywords': ['question'], 'patterns': ['^!'], 'authors': ['Mod']}})
+    engine = FilterEngine(RuleFile(str(path)))
+
+    assert not engine.apply(ChatMessage(None, 'spammer', 'hello'))
+    assert not engine.apply(ChatMessage(None, 'someone', 'no Spoiler please'))
+    assert not engine.apply(ChatMessage(None, 'someone', 'see HTTP://example.com'))
+
+    plain = ChatMessage(None, 'someone', 'hello')
+    assert engine.apply(plain)
+    assert not plain.flags & ChatMessage.HIGHLIGHTED
+    for author, body in (('mod', 'hello'), ('someone', '!command'), ('someone', 'a question')):
+        message = ChatMessage(None, author, body)
+        assert engine.apply(message)
+        assert message.flags & ChatMessage.HIGHLIGHTED
+
+    stats = engine.stats()
+    assert stats['stages']['mute']['matched'] == 1
+    assert stats['stages']['block']['matched'] == 2
+    assert stats['stages']['highlight']['matched'] == 3
+
+
+def test_rules_reload_and_survive_broken_files(tmp_path):
+    path = tmp_path / 'filters.json'
+    rule_file = RuleFile(str(path))
+    engine = FilterEngine(rule_file)
+    assert engine.apply(ChatMessage(None, 'someone', 'spoiler'))
+
+    write_rules(path, {'block': {'keywords': ['spoiler']}})
+    assert rule_file.reload()
+    assert not engine.apply(ChatMessage(None, 'someone', 'spoiler'))
+
+    write_rules(path, '{broken')
+    assert not rule_file.reload()
+    assert not engine.apply(ChatMessage(None, 'someone', 'spoiler'))
+
+    path.unlink()
+    assert rule_file.reload()
+    assert engine.apply(ChatMessage(None, 'someone', 'spoiler'))
@@ -0,0 +1,32 @@
+from snookey3.core.livechat import ChatFeed
+
+
+def published(feed: ChatFeed, count: int) -> list:
+    messages = [f'message {index}' for index in range(count)]
+    feed.publish(messages)
+    return messages
+
+
+def test_reads_after_a_sequence_number():
+    feed = ChatFeed(10)
+    published(feed, 3)
+    assert feed.read(0) == [(1, 'message 0'), (2, 'message 1'), (3, 'message 2')]
+    assert feed.read(2) == [(3, 'message 2')]
+    assert feed.read(3) == []
+
+
+def test_readers_behind_the_history_skip_to_its_start():
+    feed = ChatFeed(3)
+    published(feed, 5)
+    assert [sequence for sequence, _ in feed.read(0)] == [3, 4, 5]
+
+
+def test_sequence_numbers_from_before_a_restart_read_from_the_start():
+    feed = ChatFeed(10)
+    published(feed, 2)
+    assert feed.read(500) == [(1, 'message 0'), (2, 'message 1')]
+
+
+def test_waits_for_new_messages_until_the_timeout():
+    feed = ChatFeed(10)
+    assert feed.read(0, timeout=0.01) == []
@@ -0,0 +1,89 @@
+from threading import Event as ThreadingEvent
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from snookey3.core import outbox
+from snookey3.core.exceptions import UnsuccessfulRequestException
+from snookey3.utils.backoff import Backoff
+
+
+class FakeBroadcast:
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def post_comment(self, text: str):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'id': 'abc', 'body': text, 'author': 'me'}
+
+
+@pytest.fixture(autouse=True)
+def no_delays(monkeypatch):
+    monkeypatch.setattr(outbox, 'Backoff', lambda **kwargs: Backoff(initial=0, maximum=0))
+
+
+def send(broadcast: FakeBroadcast, max_attempts: int = outbox.DEFAULT_MAX_ATTEMPTS) -> outbox.OutgoingMessage:
+    box = outbox.Outbox(broadcast, max_attempts=max_attempts)
+    done = ThreadingEvent()
+    box.status_changed.subscribe(lambda message: done.set())
+    message = box.submit('hello')
+    assert done.wait(5)
+    box.stop()
+    return message
+
+
+def connection_refused() -> requests.ConnectionError:
+    reason = NewConnectionError(None, 'Failed to establish a new connection')
+    return requests.ConnectionError(MaxRetryError(None, '/api/comment', reason))
+
+
+@pytest.mark.parametrize('error', [
+    UnsuccessfulRequestException(429, b''),
+    UnsuccessfulRequestException(200, b'{"json": {"errors": [["RATELIMIT", "try again"]]}}'),
+    connection_refused(),
+    requests.ConnectTimeout(),
+])
+def test_retries_failures_where_the_comment_was_not_taken(error):
+    broadcast = FakeBroadcast(error)
+    message = send(broadcast)
+    assert message.status == outbox.SENT
+    assert message.attempts == 2
+    assert broadcast.calls == 2
+
+
+@pytest.mark.parametrize('error', [
+    UnsuccessfulRequestException(500, b''),
+    UnsuccessfulRequestException(502, b''),
+    UnsuccessfulRequestException(503, b''),
+    UnsuccessfulRequestException(403, b''),
+    requests.ReadTimeout(),
+    requests.ConnectionError(ProtocolError('Connection aborted.')),
+    ValueError('unexpected'),
+])
+def test_does_not_retry_when_the_comment_may_have_been_posted(error):
+    broadcast = FakeBroadcast(error)
+    message = send(broadcast)
+    assert message.status == outbox.FAILED
+    assert message.error is error
+    assert broadcast.calls == 1
+
+
+def test_gives_up_after_max_attempts():
+    broadcast = FakeBroadcast(*[UnsuccessfulRequestException(429, b'')] * 5)
+    message = send(broadcast, max_attempts=3)
+    assert message.status == outbox.FAILED
+    assert broadcast.calls == 3
+
+
+def test_aiohttp_connect_errors():
+    key = SimpleNamespace(host='localhost', port=443, ssl=True)
+    assert outbox._is_connect_error(aiohttp.ClientConnectorError(key, OSError(111, 'refused')))
+    assert not outbox._is_connect_error(aiohttp.ServerDisconnectedError())
+    assert not outbox._is_connect_error(aiohttp.ServerTimeoutError())
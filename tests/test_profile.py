@@ -0,0 +1,81 @@
+import json
+from threading import Thread
+from types import SimpleNamespace
+
+from snookey3.core.reddit import Reddit
+
+
+class FakeTransport:
+
+    def __init__(self, *profiles):
+        self.profiles = list(profiles)
+        self.requests = 0
+
+    def request(self, method: str, url: str, **kwargs):
+        self.requests += 1
+        profile = self.profiles.pop(0) if self.profiles else {'name': 'someone'}
+        content = json.dumps(profile).encode()
+        return SimpleNamespace(status_code=200, headers={}, content=content, json=lambda: json.loads(content))
+
+    def close(self):
+        pass
+
+
+def client(*profiles) -> Reddit:
+    return Reddit('client', 'http://localhost/callback', 'tests', transport=FakeTransport(*profiles))
+
+
+def test_profile_is_cached():
+    r = client({'name': 'first'}, {'name': 'second'})
+    try:
+        assert r.cached_profile() is None
+        assert r.username() == 'first'
+        assert r.profile()['name'] == 'first'
+        assert r.cached_profile()['name'] == 'first'
+        assert r.transport.requests == 1
+    finally:
+        r.close()
+
+
+def test_profile_expires():
+    r = client({'name': 'first'}, {'name': 'second'})
+    r.profile_ttl = 0
+    try:
+        assert r.username() == 'first'
+        assert r.cached_profile() is None
+        assert r.username() == 'second'
+    finally:
+        r.close()
+
+
+def test_new_grant_invalidates_the_profile():
+    r = client({'name': 'first'}, {'name': 'second'})
+    try:
+        assert r.username() == 'first'
+        r.auth.forget()
+        assert r.cached_profile() is None
+        assert r.username() == 'second'
+    finally:
+        r.close()
+
+
+def test_concurrent_callers_share_one_request():
+    r = client()
+    try:
+        threads = [Thread(target=r.profile) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert r.transport.requests == 1
+    finally:
+        r.close()
+
+
+def test_unexpected_response_is_not_cached():
+    r = client({'error': 401})
+    try:
+        assert r.username() is None
+        assert r.cached_profile() is None
+    finally:
+        r.close()
@@ -0,0 +1,60 @@
+from time import monotonic
+
+from snookey3.core.ratelimit import Priority, RateLimiter
+
+
+def drain(limiter: RateLimiter, priority: Priority):
+    while limiter._delay(priority, monotonic()) <= 0:
+        limiter.acquire(priority)
+        limiter.release()
+
+
+def test_polling_leaves_a_reserve():
+    limiter = RateLimiter(limit=10)
+    drain(limiter, Priority.POLL)
+
+    assert limiter.budget()['remaining'] == 1
+    assert limiter._delay(Priority.POLL, monotonic()) > 0
+    limiter.acquire(Priority.REFRESH)
+    assert limiter.budget()['remaining'] == 0
+
+
+def test_window_refills():
+    limiter = RateLimiter(limit=10, period=0.05)
+    drain(limiter, Priority.REFRESH)
+
+    limiter.acquire(Priority.POLL)
+    assert limiter.budget()['remaining'] == 9
+
+
+def test_learns_from_headers():
+    limiter = RateLimiter()
+    limiter.acquire()
+    limiter.acquire()
+    limiter.release({'X-Ratelimit-Remaining': '95', 'X-Ratelimit-Reset': '30', 'X-Ratelimit-Used': '5'})
+
+    budget = limiter.budget()
+    assert budget['limit'] == 100
+    # The request still in flight is charged against what the server reported.
+    assert budget['remaining'] == 94
+    assert budget['in_flight'] == 1
+    assert 29 < budget['reset_in'] <= 30
+
+
+def test_too_many_requests_holds_requests():
+    limiter = RateLimiter()
+    limiter.acquire()
+    limiter.release({'Retry-After': '20'}, 429)
+
+    budget = limiter.budget()
+    assert budget['remaining'] == 0
+    assert 19 < budget['reset_in'] <= 20
+    assert limiter._delay(Priority.REFRESH, monotonic()) > 0
+
+
+def test_malformed_headers_are_ignored():
+    limiter = RateLimiter(limit=10)
+    limiter.acquire()
+    limiter.release({'X-Ratelimit-Remaining': 'many', 'X-Ratelimit-Reset': 'soon'})
+
+    assert limiter.budget()['limit'] == 10
@@ -0,0 +1,116 @@
+import json
+from threading import Event as ThreadingEvent
+from time import sleep
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from snookey3.core import reddit
+from snookey3.core.credentials import CredentialStore
+from snookey3.core.reddit import Reddit
+
+
+class FakeTransport:
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = []
+
+    def request(self, method: str, url: str, **kwargs):
+        self.requests.append((method, url, kwargs.get('data')))
+        outcome = self.outcomes.pop(0) if self.outcomes else (200, {'access_token': 'access', 'expires_in': 3600})
+        if isinstance(outcome, Exception):
+            raise outcome
+        status_code, body = outcome
+        content = json.dumps(body).encode()
+        return SimpleNamespace(status_code=status_code, headers={}, content=content, json=lambda: json.loads(content))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(reddit, 'RETRY_AFTER', 0.01)
+
+
+@pytest.fixture
+def credentials(tmp_path):
+    store = CredentialStore(str(tmp_path))
+    store.save('client', 'stored')
+    return store
+
+
+def client(credentials, *outcomes) -> Reddit:
+    return Reddit('client', 'http://localhost/callback', 'tests', transport=FakeTransport(*outcomes),
+                  credentials=credentials)
+
+
+def test_restore(credentials):
+    r = client(credentials)
+    authorized = ThreadingEvent()
+    r.auth.authorized.subscribe(authorized.set)
+    try:
+        assert r.auth.restore()
+        assert authorized.is_set()
+        assert r.auth.access_token == 'access'
+        assert r.transport.requests[0][2] == {'grant_type': 'refresh_token', 'refresh_token': 'stored'}
+    finally:
+        r.close()
+
+
+@pytest.mark.parametrize('error', [
+    requests.ConnectionError('network down'),
+    requests.Timeout('timed out'),
+    (503, {}),
+])
+def test_restore_retries_when_reddit_is_unavailable(credentials, error):
+    r = client(credentials, error)
+    authorized = ThreadingEvent()
+    r.auth.authorized.subscribe(authorized.set)
+    try:
+        assert not r.auth.restore()
+        assert r.auth.refresh_token == 'stored'
+        assert credentials.load('client') is not None
+        # The refresher retries in the background and the restore completes once Reddit answers.
+        assert authorized.wait(5)
+        assert r.auth.access_token == 'access'
+    finally:
+        r.close()
+
+
+@pytest.mark.parametrize('rejection', [(400, {'error': 'invalid_grant'}), (401, {})])
+def test_restore_forgets_rejected_credentials(credentials, rejection):
+    r = client(credentials, rejection)
+    try:
+        assert not r.auth.restore()
+        assert r.auth.refresh_token is None
+        assert credentials.load('client') is None
+    finally:
+        r.close()
+
+
+def test_restore_without_stored_credentials(tmp_path):
+    r = client(CredentialStore(str(tmp_path)))
+    try:
+        assert not r.auth.restore()
+        assert not r.transport.requests
+    finally:
+        r.close()
+
+
+def test_background_refresh_forgets_rejected_credentials(credentials):
+    r = client(credentials, (200, {'access_token': 'access', 'expires_in': 0.05}), (400, {'error': 'invalid_grant'}))
+    try:
+        assert r.auth.restore()
+        for _ in range(100):
+            if r.auth.refresh_token is None:
+                break
+            sleep(0.01)
+        assert r.auth.access_token is None
+        assert credentials.load('client') is None
+        sleep(0.1)
+        assert len(r.transport.requests) == 2
+    finally:
+        r.close()
@@ -0,0 +1,75 @@
+from threading import Event as ThreadingEvent
+from time import time
+
+import pytest
+
+from snookey3.core import refresher
+from snookey3.core.exceptions import UnsuccessfulRequestException
+
+
+class FakeAuth:
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.refreshes = 0
+        self.forgotten = ThreadingEvent()
+        self.refreshed = ThreadingEvent()
+        self.expires_in = 3600
+        self.authorized_time = time()
+
+    def refresh(self):
+        self.refreshes += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        self.refreshed.set()
+
+    def forget(self):
+        self.forgotten.set()
+
+
+@pytest.fixture
+def token_refresher(monkeypatch):
+    monkeypatch.setattr(refresher, 'RETRY_AFTER', 0.01)
+    token_refresher = refresher.TokenRefresher()
+    yield token_refresher
+    token_refresher.stop()
+
+
+@pytest.mark.parametrize('error', [
+    UnsuccessfulRequestException(500, b''),
+    UnsuccessfulRequestException(503, b''),
+    UnsuccessfulRequestException(429, b''),
+    ConnectionError('network down'),
+])
+def test_transient_failures_are_retried(token_refresher, error):
+    auth = FakeAuth(error, error)
+    token_refresher.schedule(auth, 0)
+    assert auth.refreshed.wait(5)
+    assert auth.refreshes == 3
+    assert not auth.forgotten.is_set()
+
+
+@pytest.mark.parametrize('error', [
+    UnsuccessfulRequestException(400, b'{"error": "invalid_grant"}'),
+    UnsuccessfulRequestException(401, b''),
+    UnsuccessfulRequestException(200, b'{"error": "invalid_grant"}'),
+])
+def test_rejected_refresh_tokens_are_forgotten(token_refresher, error):
+    auth = FakeAuth(error)
+    token_refresher.schedule(auth, 0)
+    assert auth.forgotten.wait(5)
+    assert not auth.refreshed.wait(0.2)
+    assert auth.refreshes == 1
+
+
+def test_cancelled_auths_are_not_refreshed(token_refresher):
+    auth = FakeAuth()
+    token_refresher.schedule(auth, 0.1)
+    token_refresher.cancel(auth)
+    assert not auth.refreshed.wait(0.3)
+
+
+def test_refresh_delay_leaves_part_of_the_lifetime():
+    delay = refresher.refresh_delay(3600)
+    longest = 3600 * (1 - refresher.REFRESH_AHEAD)
+    assert longest - 3600 * refresher.REFRESH_JITTER <= delay <= longest
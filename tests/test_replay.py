@@ -0,0 +1,60 @@
+import json
+import os
+
+from snookey3.core.archive import ChatArchive
+from snookey3.core.chat import ChatMessage
+from snookey3.core.replay import archived_frames, frame_for, recorded_frames, synthetic_frames
+
+
+def parse(frame: str) -> ChatMessage:
+    data = json.loads(frame)
+    assert data['type'] == 'new_comment'
+    return ChatMessage.from_payload(data['payload'])
+
+
+def test_frames_round_trip():
+    message = parse(frame_for(ChatMessage('abc', 'someone', 'hello', 1234.5)))
+    assert (message.id, message.author, message.body, message.created) == ('abc', 'someone', 'hello', 1234.5)
+
+
+def test_synthetic_frames_follow_the_rate():
+    frames = list(synthetic_frames(rate=100, duration=10, seed=1))
+    offsets = [offset for offset, _ in frames]
+
+    assert 900 < len(frames) < 1100
+    assert offsets == sorted(offsets)
+    assert offsets[-1] <= 10
+    assert len({parse(frame).id for _, frame in frames}) == len(frames)
+
+
+def test_synthetic_frames_are_reproducible():
+    first = [(offset, parse(frame).body) for offset, frame in synthetic_frames(duration=5, seed=7)]
+    second = [(offset, parse(frame).body) for offset, frame in synthetic_frames(duration=5, seed=7)]
+    assert first == second
+
+
+def test_evenly_spaced_frames():
+    offsets = [offset for offset, _ in synthetic_frames(rate=10, duration=1, burstiness=0)]
+    assert len(offsets) in (9, 10)
+    assert all(abs(later - earlier - 0.1) < 1e-9 for earlier, later in zip(offsets, offsets[1:]))
+
+
+def test_recorded_frames(tmp_path):
+    path = tmp_path / 'recording.jsonl'
+    frame = frame_for(ChatMessage('abc', 'someone', 'hello', 1.0))
+    path.write_text(json.dumps({'t': 0.5, 'frame': frame}) + '\n\n' + json.dumps({'t': '2', 'frame': frame}) + '\n',
+                    encoding='utf-8')
+
+    assert list(recorded_frames(str(path))) == [(0.5, frame), (2.0, frame)]
+
+
+def test_archived_frames_keep_the_pacing(tmp_path):
+    archive = ChatArchive('abc', str(tmp_path), segment_size=2, flush_interval=0.01)
+    with open(os.path.join(str(tmp_path), 'abc', 'meta.json')) as meta_file:
+        started = json.load(meta_file)['started']
+    archive.append([ChatMessage(f'c{i}', 'someone', f'comment {i}', started + 10 + i * 1.5) for i in range(5)])
+    archive.close()
+
+    frames = list(archived_frames('abc', start=11, directory=str(tmp_path)))
+    assert [offset for offset, _ in frames] == [0, 1.5, 3.0, 4.5]
+    assert [parse(frame).id for _, frame in frames] == ['c1', 'c2', 'c3', 'c4']
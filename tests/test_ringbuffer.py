@@ -0,0 +1,46 @@
+import pytest
+
+from snookey3.utils.ringbuffer import RingBuffer
+
+
+def test_capacity_has_to_be_positive():
+    with pytest.raises(ValueError):
+        RingBuffer(0)
+
+
+def test_append_evicts_oldest():
+    buffer = RingBuffer(3)
+
+    assert [buffer.append(i) for i in range(5)] == [None, None, None, 0, 1]
+    assert list(buffer) == [2, 3, 4]
+    assert len(buffer) == 3
+    assert buffer.free() == 0
+
+
+def test_indexing_wraps_around():
+    buffer = RingBuffer(3)
+    for i in range(5):
+        buffer.append(i)
+
+    assert [buffer[0], buffer[2], buffer[-1], buffer[-3]] == [2, 4, 4, 2]
+    with pytest.raises(IndexError):
+        buffer[3]
+    with pytest.raises(IndexError):
+        buffer[-4]
+
+
+def test_discard_and_clear():
+    buffer = RingBuffer(4)
+    for i in range(6):
+        buffer.append(i)
+
+    buffer.discard(3)
+    assert list(buffer) == [5]
+    buffer.append(6)
+    assert list(buffer) == [5, 6]
+    buffer.discard(10)
+    assert len(buffer) == 0
+    buffer.append(7)
+    buffer.clear()
+    assert list(buffer) == []
+    assert buffer.free() == 4
@@ -0,0 +1,96 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from snookey3.core.credentials import CredentialStore
+from snookey3.core.reddit import Reddit
+from snookey3.core.sessions import SessionManager
+
+
+class FakeTransport:
+
+    def __init__(self):
+        self.refresh_tokens = []
+
+    def request(self, method: str, url: str, **kwargs):
+        refresh_token = (kwargs.get('data') or {}).get('refresh_token')
+        self.refresh_tokens.append(refresh_token)
+        if refresh_token == 'revoked':
+            status_code, body = 400, {'error': 'invalid_grant'}
+        else:
+            status_code, body = 200, {'access_token': f'access for {refresh_token}', 'expires_in': 3600}
+        content = json.dumps(body).encode()
+        return SimpleNamespace(status_code=status_code, headers={}, content=content, json=lambda: json.loads(content))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def credentials(tmp_path):
+    return CredentialStore(str(tmp_path))
+
+
+@pytest.fixture
+def manager(credentials):
+    default = Reddit('client', 'http://localhost/callback', 'tests', transport=FakeTransport(), credentials=credentials)
+    manager = SessionManager(default)
+    yield manager
+    manager.close()
+    default.close()
+
+
+def test_accounts_share_the_default_client_resources(manager):
+    account = manager.account('alt')
+
+    assert manager.account('alt') is account
+    assert account.name == 'alt'
+    assert not account.authorized
+    assert account.reddit is not manager.default
+    assert account.reddit.transport is manager.default.transport
+    assert account.reddit.refresher is manager.default.refresher
+    assert account.reddit.credentials is manager.credentials
+    assert account.reddit.auth.credentials_key == 'client:alt'
+    assert manager.account() is manager.accounts[None]
+
+
+def test_restore_accounts(manager, credentials):
+    credentials.save('client', 'default token')
+    credentials.save('client:alt', 'alt token')
+    credentials.save('client:gone', 'revoked')
+    credentials.save('other client:alt', 'other token')
+
+    restored = manager.restore_accounts()
+
+    assert [account.name for account in restored] == ['alt']
+    assert restored[0].authorized
+    assert restored[0].reddit.auth.access_token == 'access for alt token'
+    assert 'other token' not in manager.default.transport.refresh_tokens
+    assert credentials.load('client:gone') is None
+
+
+def test_remove_account(manager, credentials):
+    credentials.save('client:alt', 'alt token')
+    manager.restore_accounts()
+
+    manager.remove_account('alt')
+    assert 'alt' not in manager.accounts
+    assert credentials.load('client:alt') is not None
+
+    manager.restore_accounts()
+    manager.remove_account('alt', forget=True)
+    assert credentials.load('client:alt') is None
+    manager.remove_account('alt')
+
+
+def test_default_account_cant_be_removed(manager):
+    with pytest.raises(ValueError):
+        manager.remove_account(None)
+
+
+def test_credentials_keys(credentials):
+    assert credentials.keys() == []
+    credentials.save('client', 'token')
+    credentials.save('client:alt', 'token')
+    assert sorted(credentials.keys()) == ['client', 'client:alt']
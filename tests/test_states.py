@@ -0,0 +1,38 @@
+from time import sleep
+
+import pytest
+
+from snookey3.core.states import StateStore
+
+
+def test_states_are_single_use():
+    store = StateStore()
+    state = store.create('account')
+
+    assert store.claim(state) == 'account'
+    with pytest.raises(KeyError):
+        store.claim(state)
+    assert not store.consume(state)
+
+
+def test_unknown_state():
+    assert not StateStore().consume('unknown')
+
+
+def test_states_expire():
+    store = StateStore(ttl=0.01)
+    state = store.create()
+    sleep(0.02)
+
+    assert len(store) == 0
+    assert not store.consume(state)
+
+
+def test_oldest_state_is_evicted():
+    store = StateStore(max_size=2)
+    first, second, third = store.create(), store.create(), store.create()
+
+    assert len(store) == 2
+    assert not store.consume(first)
+    assert store.consume(second)
+    assert store.consume(third)
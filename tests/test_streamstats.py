@@ -0,0 +1,126 @@
+from time import sleep
+from types import SimpleNamespace
+
+import pytest
+
+from snookey3.core import streamstats
+from snookey3.core.streamstats import StatsPoller, StatsSeries, StreamStats, parse_video
+
+
+def video(state: str = 'IS_LIVE', viewers=10, upvotes=3) -> dict:
+    return {'data': {'continuous_watchers': viewers, 'unique_watchers': 20, 'upvotes': upvotes, 'downvotes': 1,
+                     'post': {'commentCount': 5}, 'stream': {'state': state}}}
+
+
+class FakeReddit:
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.endpoints = SimpleNamespace(video_url=lambda stream_id: f'/videos/{stream_id}')
+
+    def get(self, url: str, priority=None, headers: dict = None):
+        self.requests.append((url, headers))
+        status_code, body, response_headers = self.responses.pop(0)
+        return SimpleNamespace(status_code=status_code, headers=response_headers, json=lambda: body)
+
+
+def broadcast(reddit=None, stream_id: str = 'abc'):
+    return SimpleNamespace(reddit=reddit or FakeReddit(), stream_id=stream_id)
+
+
+def test_parse_video():
+    assert parse_video(video()) == (1, 10, 20, 3, 1, 5)
+    assert parse_video({'data': {'stream': {'state': 'SOMETHING_NEW'}, 'upvotes': 'many'}}) == (0, -1, -1, -1, -1, -1)
+    assert parse_video({}) == (0, -1, -1, -1, -1, -1)
+
+
+def test_series_only_records_changes():
+    series = StatsSeries(capacity=3)
+    assert series.append(1, parse_video(video(viewers=1)))
+    assert not series.append(2, parse_video(video(viewers=1)))
+    for time, viewers in ((3, 2), (4, 3), (5, 4)):
+        series.append(time, parse_video(video(viewers=viewers)))
+
+    assert len(series) == 3
+    assert [sample['viewers'] for sample in series.since()] == [2, 3, 4]
+    assert [sample['time'] for sample in series.since(3)] == [4, 5]
+    latest = series.latest()
+    assert latest['state'] == 'IS_LIVE'
+    assert latest['comments'] == 5
+
+
+def test_missing_numbers_read_as_none():
+    series = StatsSeries()
+    series.append(1, parse_video(video(viewers=None)))
+    assert series.latest()['viewers'] is None
+
+
+def test_poll_uses_conditional_requests():
+    reddit = FakeReddit((200, video(), {'ETag': '"1"', 'Last-Modified': 'then'}),
+                        (304, None, {}),
+                        (500, None, {}))
+    stats = StreamStats(broadcast(reddit))
+
+    assert stats.poll()
+    assert not stats.poll()
+    assert not stats.poll()
+    assert reddit.requests[0] == ('/videos/abc', {})
+    assert reddit.requests[1] == ('/videos/abc', {'If-None-Match': '"1"', 'If-Modified-Since': 'then'})
+    assert (stats.polls, stats.not_modified, stats.errors) == (3, 1, 1)
+    assert stats.as_dict()['samples'] == 1
+
+
+def test_interval_backs_off_while_nothing_changes():
+    stats = StreamStats(broadcast())
+    intervals = [stats.next_interval(False) for _ in range(20)]
+
+    assert intervals == sorted(intervals)
+    assert intervals[-1] == streamstats.MAX_INTERVAL
+    assert stats.next_interval(True) == streamstats.MIN_INTERVAL
+
+
+@pytest.fixture
+def poller():
+    poller = StatsPoller()
+    yield poller
+    poller.stop()
+
+
+def test_watching_a_broadcast_twice_shares_the_stats(poller):
+    reddit = FakeReddit(*[(200, video(), {})] * 10)
+    first = poller.watch(broadcast(reddit))
+    assert poller.watch(broadcast(reddit)) is first
+    assert poller.get('abc') is first
+
+    poller.unwatch(broadcast(reddit))
+    poller.unwatch(broadcast(reddit))
+    assert poller.get('abc') is None
+
+
+def test_poller_polls_watched_broadcasts(poller):
+    reddit = FakeReddit((200, video(), {}), *[(304, None, {})] * 10)
+    stats = poller.watch(broadcast(reddit))
+
+    for _ in range(100):
+        if stats.series.latest() is not None:
+            break
+        sleep(0.01)
+    assert stats.series.latest()['viewers'] == 10
+    assert reddit.requests[0][0] == '/videos/abc'
+
+
+def test_broadcast_is_polled_until_the_last_watcher_leaves(poller):
+    reddit = FakeReddit(*[(200, video(), {})] * 10)
+    stats = poller.watch(broadcast(reddit))
+    poller.watch(broadcast(reddit))
+
+    poller.unwatch(broadcast(reddit))
+    assert poller.get('abc') is stats
+    poller.unwatch(broadcast(reddit))
+    assert poller.get('abc') is None
+
+    # Unwatching more often than watching doesn't affect a later watcher.
+    poller.unwatch(broadcast(reddit))
+    assert poller.watch(broadcast(reddit)) is not stats
+    assert poller.get('abc') is not None